@@ -1,4 +1,5 @@
 from flask import Flask, render_template, jsonify, request, send_file
+from werkzeug.serving import is_running_from_reloader
 from datetime import datetime, timedelta
 import json
 import io
@@ -6,18 +7,64 @@ import csv
 import os
 
 from database.database import init_db, create_snapshot
+from database import connection
 from services.account_service import *
 from services.transaction_service import *
 from services.category_service import *
 from services.analytics_service import *
+from services.import_service import import_statement, get_import_job
+from services.snapshot_service import start_scheduler, get_snapshot_breakdown
+from services.balance_service import balance_as_of, balances_as_of_dates
+from services.ledger_cache import ledger_cache
+from services.api_manager import api_manager
+from services.chart_warmup import start_warmup, notify_write
+from config import BACKGROUND_LOCK_PATH, CHART_WARMUP, SNAPSHOT_SCHEDULER
+from utils.api_response import APIResponse
+from utils.process_lock import ProcessLock
 
 app = Flask(__name__)
 app.config['JSON_AS_ASCII'] = False
+connection.init_app(app)
 
 # 初始化数据库
 print("正在初始化数据库...")
 init_db()
 
+# 启用交易列式缓存时在后台加载，加载完成前分析查询使用SQL
+ledger_cache.load_async()
+
+background_lock = ProcessLock(BACKGROUND_LOCK_PATH)
+
+
+def start_background_tasks():
+    """
+    启动后台定时快照与图表缓存预热
+    多个工作进程导入应用时只在取得进程锁的一个进程中启动，其余进程只处理请求
+    """
+    if not (SNAPSHOT_SCHEDULER or CHART_WARMUP):
+        return
+    if not background_lock.acquire():
+        app.logger.info("后台任务已在其他进程中运行")
+        return
+    # 后台定时生成资产快照
+    if SNAPSHOT_SCHEDULER:
+        start_scheduler()
+    # 后台预热图表缓存，写入请求完成后提前唤醒
+    if CHART_WARMUP:
+        start_warmup()
+
+
+# 调试模式下重载器的父进程只监视文件变化，后台任务在实际处理请求的子进程中启动
+if __name__ != '__main__' and (not app.debug or is_running_from_reloader()):
+    start_background_tasks()
+
+
+@app.after_request
+def notify_chart_warmup(response):
+    if request.method in ('POST', 'PUT', 'DELETE') and response.status_code < 400:
+        notify_write()
+    return response
+
 
 @app.route('/')
 def index():
@@ -39,7 +86,7 @@ def api_list_accounts():
 def api_get_account(account_id):
     account = get_account(account_id)
     if account:
-        return jsonify(dict(account))
+        return APIResponse.conditional(dict(account), account['updated_at'])
     return jsonify({'error': '账户不存在'}), 404
 
 
@@ -89,6 +136,20 @@ def api_accounts_by_type():
     return jsonify(result)
 
 
+@app.route('/api/accounts/balance-as-of', methods=['GET'])
+def api_balance_as_of():
+    dates = request.args.getlist('date')
+    account_ids = request.args.getlist('account_id', type=int) or None
+    try:
+        if len(dates) > 1:
+            result = balances_as_of_dates(account_ids, dates)
+        else:
+            result = balance_as_of(account_ids, dates[0] if dates else None)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(result)
+
+
 # ===== 交易相关API =====
 @app.route('/api/transactions', methods=['GET'])
 def api_list_transactions():
@@ -96,24 +157,69 @@ def api_list_transactions():
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
     transaction_type = request.args.get('type')
-    limit = request.args.get('limit', type=int)
+    per_page = max(1, min(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), MAX_PAGE_SIZE))
+    cursor = request.args.get('cursor')
+    direction = request.args.get('direction', 'next')
+
+    try:
+        page = list_transactions_page(
+            account_id=account_id,
+            start_date=start_date,
+            end_date=end_date,
+            transaction_type=transaction_type,
+            per_page=per_page,
+            cursor=cursor,
+            direction=direction
+        )
+    except ValueError as e:
+        return APIResponse.error(message=str(e), code=400, error_code="INVALID_CURSOR")
+
+    return APIResponse.paginated(
+        [dict(t) for t in page['items']],
+        per_page=per_page,
+        next_cursor=page['next_cursor'],
+        prev_cursor=page['prev_cursor']
+    )
 
-    transactions = list_transactions(
-        account_id=account_id,
-        start_date=start_date,
-        end_date=end_date,
-        transaction_type=transaction_type,
-        limit=limit
+
+@app.route('/api/transactions/search', methods=['GET'])
+def api_search_transactions():
+    keyword = request.args.get('q', '').strip()
+    if not keyword:
+        return APIResponse.error(message="缺少搜索关键词", code=400, error_code="MISSING_QUERY")
+
+    per_page = max(1, min(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), MAX_PAGE_SIZE))
+    try:
+        page = search_transactions(
+            keyword,
+            account_id=request.args.get('account_id', type=int),
+            start_date=request.args.get('start_date'),
+            end_date=request.args.get('end_date'),
+            transaction_type=request.args.get('type'),
+            per_page=per_page,
+            cursor=request.args.get('cursor'),
+            order=request.args.get('order', 'relevance')
+        )
+    except ValueError as e:
+        return APIResponse.error(message=str(e), code=400, error_code="INVALID_SEARCH")
+
+    return APIResponse.paginated(
+        page['items'],
+        per_page=per_page,
+        next_cursor=page['next_cursor'],
+        prev_cursor=page['prev_cursor']
     )
-    return jsonify([dict(t) for t in transactions])
 
 
 @app.route('/api/transactions/<int:tx_id>', methods=['GET'])
 def api_get_transaction(tx_id):
-    transactions = list_transactions()
-    transaction = next((dict(t) for t in transactions if t['id'] == tx_id), None)
+    transaction = get_transaction(tx_id)
     if transaction:
-        return jsonify(transaction)
+        transaction = dict(transaction)
+        # 关联账户改名等也会改变响应内容，取两者中较晚的修改时间
+        last_modified = max(transaction['updated_at'] or transaction['created_at'],
+                            transaction.pop('account_updated_at') or '')
+        return APIResponse.conditional(transaction, last_modified)
     return jsonify({'error': '交易不存在'}), 404
 
 
@@ -154,6 +260,35 @@ def api_delete_transaction(tx_id):
     return jsonify({'success': True})
 
 
+@app.route('/api/transactions/import', methods=['POST'])
+def api_import_transactions():
+    upload = request.files.get('file')
+    account_id = request.form.get('account_id', type=int)
+    if upload is None or not account_id:
+        return jsonify({'error': '缺少账单文件或账户'}), 400
+
+    mapping = request.form.get('mapping')
+    try:
+        result = import_statement(
+            upload.stream,
+            account_id,
+            fmt=request.form.get('format'),
+            filename=upload.filename,
+            mapping=json.loads(mapping) if mapping else None
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(result), 201
+
+
+@app.route('/api/imports/<int:job_id>', methods=['GET'])
+def api_get_import_job(job_id):
+    job = get_import_job(job_id)
+    if job:
+        return jsonify(dict(job))
+    return jsonify({'error': '导入任务不存在'}), 404
+
+
 # ===== 分类相关API =====
 @app.route('/api/categories', methods=['GET'])
 def api_list_categories():
@@ -209,7 +344,10 @@ def api_asset_distribution():
 def api_income_expense():
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
-    data = get_income_expense_summary(start_date, end_date)
+    try:
+        data = get_income_expense_summary(start_date, end_date, request.args.get('resolution', 'auto'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     return jsonify(data)
 
 
@@ -225,10 +363,24 @@ def api_asset_trend():
     elif period == '90d':
         days = 90
 
-    trend = get_asset_trend(days)
+    try:
+        trend = get_asset_trend(days, request.args.get('end_date'), request.args.get('resolution', 'auto'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     return jsonify(trend)
 
 
+@app.route('/api/analytics/rolling', methods=['GET'])
+def api_rolling_cashflow():
+    window = request.args.get('window', 30, type=int)
+    days = request.args.get('days', 90, type=int)
+    try:
+        data = get_rolling_cashflow(window, days, request.args.get('end_date'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(data)
+
+
 @app.route('/api/analytics/monthly-stats', methods=['GET'])
 def api_monthly_stats():
     stats = get_monthly_statistics()
@@ -241,12 +393,35 @@ def api_financial_ratios():
     return jsonify(ratios)
 
 
+@app.route('/api/analytics/snapshot', methods=['GET'])
+def api_get_snapshot():
+    snapshot_date = request.args.get('date')
+    try:
+        breakdown = get_snapshot_breakdown(snapshot_date)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if breakdown is None:
+        return jsonify({'error': '该日期之前没有资产快照'}), 404
+    return jsonify(breakdown)
+
+
 @app.route('/api/analytics/snapshot', methods=['POST'])
 def api_create_snapshot():
-    create_snapshot()
+    create_snapshot(manual=True)
     return jsonify({'success': True}), 201
 
 
+# ===== 图表相关API =====
+@app.route('/api/charts/<chart_name>', methods=['GET'])
+def api_chart_data(chart_name):
+    return api_manager.handle_chart_request(chart_name)
+
+
+@app.route('/api/info', methods=['GET'])
+def api_info():
+    return APIResponse.success(data=api_manager.get_api_info())
+
+
 @app.route('/api/analytics/export-report', methods=['GET'])
 def api_export_report():
     # 这里简化处理，实际应该生成PDF报告
@@ -286,4 +461,6 @@ def api_export_report():
 
 
 if __name__ == '__main__':
+    if is_running_from_reloader():
+        start_background_tasks()
     app.run(debug=True)
\ No newline at end of file
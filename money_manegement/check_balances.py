@@ -0,0 +1,150 @@
+# check_balances.py
+"""
+交易后余额重算回归检查
+在临时数据库中随机改写部分交易的 balance_after（改成错误值、清空、或写回相同的值），
+再调用 recompute_balances() / rebuild_all_balances()，核对：
+  - 返回的行数等于 balance_after 实际发生变化的行数，
+    不含 data_versions 等触发器写入的行，也不含写回相同值的行
+  - 重算后每笔交易的 balance_after 与全量重算的结果一致
+
+用法: python check_balances.py [--rounds 200] [--seed 1]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+from datetime import date, timedelta
+
+from database import connection
+from database.connection import ConnectionPool
+from database.migrations import migrate
+from services.balance_service import rebuild_all_balances, recompute_balances
+
+DAYS = 365
+
+
+def build_dataset(conn, accounts=5, rows=2000):
+    """若干账户与按整数金额随机分布的交易，返回 {账户ID: 账户余额}"""
+    category_ids = [row[0] for row in conn.execute('SELECT id FROM categories')]
+    balances = {}
+    for i in range(accounts):
+        balance = random.randint(0, 100000)
+        aid = conn.execute('INSERT INTO accounts (name, category_id, balance) VALUES (?, ?, ?)',
+                           (f'测试账户{i}', random.choice(category_ids), balance)).lastrowid
+        balances[aid] = balance
+
+    first_day = date.today() - timedelta(days=DAYS)
+    conn.executemany('''
+        INSERT INTO transactions (account_id, date, description, type, amount)
+        VALUES (?, ?, '测试交易', ?, ?)
+    ''', ((random.choice(list(balances)),
+           (first_day + timedelta(days=random.randint(0, DAYS))).isoformat(),
+           random.choice(['收入', '支出', '支出', '转账']), random.randint(1, 500))
+          for _ in range(rows)))
+    for aid in balances:
+        recompute_balances(conn, aid)
+    conn.commit()
+    return balances
+
+
+def read_balances(conn, account_id=None):
+    """{交易ID: balance_after}"""
+    if account_id is None:
+        return dict(conn.execute('SELECT id, balance_after FROM transactions'))
+    return dict(conn.execute('SELECT id, balance_after FROM transactions WHERE account_id = ?',
+                             (account_id,)))
+
+
+def corrupt(conn, account_id, from_date):
+    """随机改写账户自 from_date 起的部分交易，返回被改写的交易数（含写回相同值的）"""
+    ids = [row[0] for row in conn.execute(
+        'SELECT id FROM transactions WHERE account_id = ? AND date >= ?', (account_id, from_date))]
+    touched = random.sample(ids, random.randint(0, len(ids)))
+    for tx_id in touched:
+        action = random.choice(['wrong', 'null', 'same'])
+        if action == 'wrong':
+            conn.execute('UPDATE transactions SET balance_after = balance_after + ? WHERE id = ?',
+                         (random.randint(1, 100), tx_id))
+        elif action == 'null':
+            conn.execute('UPDATE transactions SET balance_after = NULL WHERE id = ?', (tx_id,))
+        else:
+            conn.execute('UPDATE transactions SET balance_after = balance_after WHERE id = ?', (tx_id,))
+    return len(touched)
+
+
+def changed_rows(before, after):
+    return sum(1 for tx_id, value in after.items() if before.get(tx_id) != value)
+
+
+def run_checks(path, rounds, verbose=False):
+    """随机改写并重算，返回第一个出错的步骤的问题列表"""
+    connection.pool = ConnectionPool(path, pool_size=2)
+
+    conn = sqlite3.connect(path)
+    migrate(conn)
+    balances = build_dataset(conn)
+    expected = read_balances(conn)
+
+    for step in range(rounds):
+        problems = []
+        if random.random() < 0.2:
+            # 全量重算走连接池并提交，在另一个连接上核对
+            for aid in random.sample(list(balances), random.randint(1, len(balances))):
+                corrupt(conn, aid, '')
+            conn.commit()
+            before = read_balances(conn)
+            reported = sum(rebuild_all_balances().values())
+            detail = '全量重算'
+        else:
+            aid = random.choice(list(balances))
+            from_date = (date.today() - timedelta(days=random.randint(0, DAYS))).isoformat()
+            touched = corrupt(conn, aid, from_date)
+            before = read_balances(conn)
+            reported = recompute_balances(conn, aid, from_date)
+            conn.commit()
+            detail = f'账户 {aid} 自 {from_date} 起改写 {touched} 笔后重算'
+
+        after = read_balances(conn)
+        actual = changed_rows(before, after)
+        if reported != actual:
+            problems.append(f'报告改写 {reported} 行，实际改变 {actual} 行')
+        wrong = [tx_id for tx_id, value in after.items() if value != expected[tx_id]]
+        if wrong:
+            problems.append(f'{len(wrong)} 笔交易的余额与全量重算不一致，如交易 {wrong[0]}')
+
+        if verbose or problems:
+            print(f'[{"失败" if problems else "通过"}] 第 {step + 1} 步: {detail}，改写 {reported} 行')
+        if problems:
+            conn.close()
+            connection.pool.close_all()
+            return problems
+
+    conn.close()
+    connection.pool.close_all()
+    return []
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='交易后余额重算回归检查')
+    parser.add_argument('--rounds', type=int, default=200, help='随机改写与重算的次数')
+    parser.add_argument('--seed', type=int, help='随机数种子，用于复现失败')
+    parser.add_argument('--verbose', action='store_true', help='打印每一步的操作')
+    args = parser.parse_args()
+
+    seed = args.seed if args.seed is not None else random.randrange(1 << 30)
+    random.seed(seed)
+
+    workdir = tempfile.mkdtemp(prefix='finance-balances-')
+    try:
+        problems = run_checks(os.path.join(workdir, 'balances.db'), args.rounds, args.verbose)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for problem in problems:
+        print(f'        {problem}')
+    print(f'\n余额重算检查失败（--seed {seed}）' if problems else f'\n余额重算检查通过（--seed {seed}）')
+    sys.exit(1 if problems else 0)
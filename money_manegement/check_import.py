@@ -0,0 +1,162 @@
+# check_import.py
+"""
+账单导入去重回归检查
+在临时数据库中生成包含大量完全相同的行的 CSV 账单，按日期升序、降序和乱序排列，核对：
+  - 首次导入后每种行的笔数与账单一致：重复的行（包括相隔很远、晚出现在文件末尾的）既不丢失也不重复
+  - 导入中途中断后重新导入、以及完整地再次导入同一账单，都不会产生新的交易
+  - 按日期排列的账单在日期变化后清空出现次数，计数只与单日的行数有关
+
+用法: python check_import.py [--rows 50000] [--seed 1]
+"""
+
+import argparse
+import io
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+from collections import Counter
+from datetime import date, timedelta
+
+from database import connection
+from database.connection import ConnectionPool
+from database.migrations import migrate
+from services.import_service import RowHasher, import_statement
+
+CHUNK_SIZE = 1000
+
+
+class Interrupted(Exception):
+    pass
+
+
+def build_rows(count, days=60):
+    """生成账单行，约一半的行与之前某一行完全相同"""
+    first_day = date.today() - timedelta(days=days)
+    rows = []
+    for _ in range(count):
+        if rows and random.random() < 0.5:
+            rows.append(random.choice(rows))
+        else:
+            rows.append(((first_day + timedelta(days=random.randint(0, days))).isoformat(),
+                         random.choice(['收入', '支出']), f'{random.randint(1, 20)}.00',
+                         random.choice(['早餐', '午餐', '地铁', '工资'])))
+    return rows
+
+
+def to_csv(rows):
+    lines = ['日期,类型,金额,说明'] + [','.join(row) for row in rows]
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def imported_rows(conn, account_id):
+    return Counter(conn.execute('''
+        SELECT date, type, printf('%.2f', amount), description FROM transactions WHERE account_id = ?
+    ''', (account_id,)).fetchall())
+
+
+def check_order(conn, account_id, name, rows):
+    """导入（中途中断一次）后再完整导入一次，返回问题列表"""
+    problems = []
+    data = to_csv(rows)
+    expected = Counter(rows)
+
+    # 第一次导入在若干个分块之后中断
+    stop_after = random.randint(1, max(len(rows) // CHUNK_SIZE - 1, 1))
+    chunks = 0
+
+    def interrupt(result):
+        nonlocal chunks
+        chunks += 1
+        if chunks == stop_after:
+            raise Interrupted()
+
+    try:
+        import_statement(io.BytesIO(data), account_id, fmt='csv', filename=f'{name}.csv',
+                         chunk_size=CHUNK_SIZE, progress=interrupt)
+    except Interrupted:
+        pass
+
+    result = import_statement(io.BytesIO(data), account_id, fmt='csv', filename=f'{name}.csv',
+                              chunk_size=CHUNK_SIZE)
+    actual = imported_rows(conn, account_id)
+    if actual != expected:
+        missing = sum((expected - actual).values())
+        extra = sum((actual - expected).values())
+        problems.append(f'{name}: 缺少 {missing} 笔，多出 {extra} 笔')
+    if result['rows_processed'] != len(rows) or result['error_count']:
+        problems.append(f"{name}: 处理 {result['rows_processed']} 行，错误 {result['error_count']} 行")
+
+    again = import_statement(io.BytesIO(data), account_id, fmt='csv', filename=f'{name}.csv',
+                             chunk_size=CHUNK_SIZE)
+    if again['inserted'] or again['skipped'] != len(rows):
+        problems.append(f"{name}: 再次导入新增 {again['inserted']} 笔，跳过 {again['skipped']} 笔")
+    return problems
+
+
+def check_memory(rows):
+    """按日期排列时出现次数的计数不超过单日的行数"""
+    hasher = RowHasher(1)
+    largest = 0
+    for day, ttype, amount, description in rows:
+        hasher({'date': day, 'type': ttype, 'amount': float(amount),
+                'description': description, 'reference': None})
+        largest = max(largest, len(hasher._seen))
+    per_day = max(Counter(row[0] for row in rows).values())
+    return [] if largest <= per_day else [f'出现次数计数 {largest} 项，超过单日的 {per_day} 行']
+
+
+def run_checks(path, count, verbose=False):
+    connection.pool = ConnectionPool(path, pool_size=2)
+    conn = sqlite3.connect(path)
+    migrate(conn)
+    category_id = conn.execute('SELECT id FROM categories LIMIT 1').fetchone()[0]
+
+    rows = build_rows(count)
+    # 乱序账单：再把第一行复制到末尾，确保最后一行与很早的行重复且日期已出现过
+    shuffled = rows + [rows[0]]
+    ordered = {
+        '升序': sorted(rows),
+        '降序': sorted(rows, reverse=True),
+        '乱序': shuffled,
+    }
+
+    problems = []
+    for name, statement in ordered.items():
+        account_id = conn.execute('INSERT INTO accounts (name, category_id, balance) VALUES (?, ?, 0)',
+                                  (f'测试账户{name}', category_id)).lastrowid
+        conn.commit()
+        found = check_order(conn, account_id, name, statement)
+        if name != '乱序':
+            found += check_memory(statement)
+        if verbose or found:
+            print(f'[{"失败" if found else "通过"}] {name}账单 {len(statement)} 行')
+        problems += found
+
+    conn.close()
+    connection.pool.close_all()
+    return problems
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='账单导入去重回归检查')
+    parser.add_argument('--rows', type=int, default=50000, help='每份账单的行数')
+    parser.add_argument('--seed', type=int, help='随机数种子，用于复现失败')
+    parser.add_argument('--verbose', action='store_true', help='打印每份账单的结果')
+    args = parser.parse_args()
+
+    seed = args.seed if args.seed is not None else random.randrange(1 << 30)
+    random.seed(seed)
+
+    workdir = tempfile.mkdtemp(prefix='finance-import-')
+    try:
+        problems = run_checks(os.path.join(workdir, 'import.db'), args.rows, args.verbose)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for problem in problems:
+        print(f'        {problem}')
+    print(f'\n账单导入检查失败（--seed {seed}）' if problems else f'\n账单导入检查通过（--seed {seed}）')
+    sys.exit(1 if problems else 0)
@@ -0,0 +1,250 @@
+# check_query_plans.py
+"""
+查询计划回归检查
+在临时数据库中生成大量交易数据，执行各服务函数并记录其发出的SQL，
+对每条查询运行 EXPLAIN QUERY PLAN，出现以下情况即判定失败：
+  - 对交易表做没有范围条件的扫描（SCAN，包括按索引顺序的 SCAN ... USING [COVERING] INDEX）
+  - 对交易表原始行使用临时B树排序/分组（对聚合结果排序除外）
+
+个别调用按索引顺序扫描并在 LIMIT 行后停止，在 service_calls() 中注明原因后不判定失败
+
+用法: python check_query_plans.py [--rows 1000000] [--keep 路径]
+"""
+
+import argparse
+import os
+import random
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from database import connection
+from database.connection import ConnectionPool
+from database.migrations import migrate
+
+# 数据量大、必须走索引的表
+LARGE_TABLES = ('transactions', 'transaction_daily')
+# 其中存放原始明细、不允许临时B树排序/分组的表（汇总表的行已经过聚合）
+RAW_TABLES = ('transactions',)
+
+
+class TracingPool(ConnectionPool):
+    """记录所有执行过的SQL的连接池"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.statements = []
+
+    def _connect(self):
+        conn = super()._connect()
+        conn.set_trace_callback(self.statements.append)
+        return conn
+
+
+def build_dataset(path, rows, accounts=20, years=10):
+    """生成测试数据库：若干账户和 rows 条分布在 years 年内的交易"""
+    conn = sqlite3.connect(path)
+    migrate(conn)
+
+    category_ids = [row[0] for row in conn.execute('SELECT id FROM categories')]
+    conn.executemany(
+        'INSERT INTO accounts (name, category_id, balance, platform) VALUES (?, ?, ?, ?)',
+        [(f'测试账户{i}', random.choice(category_ids), random.uniform(0, 100000),
+          random.choice(['工商银行', '支付宝', '微信', None])) for i in range(accounts)]
+    )
+
+    tx_categories = ['餐饮', '购物', '交通', '生活缴费', '娱乐', '医疗', '教育', '工资', '奖金', None]
+    first_day = date.today() - timedelta(days=365 * years)
+    conn.executemany('''
+        INSERT INTO transactions (account_id, date, description, type, category, amount)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (
+        (random.randint(1, accounts),
+         (first_day + timedelta(days=random.randint(0, 365 * years))).isoformat(),
+         '测试交易', random.choice(['收入', '支出', '支出', '转账']),
+         random.choice(tx_categories), round(random.uniform(1, 500), 2))
+        for _ in range(rows)
+    ))
+    conn.commit()
+    conn.execute('ANALYZE')
+    conn.close()
+
+
+def service_calls():
+    """
+    需要检查的服务函数调用，参数取页面实际使用的形态
+    :return: [(名称, 调用)] 或 [(名称, 调用, 允许按索引顺序扫描的原因)]
+    """
+    from services import (account_service, analytics_service, balance_service, category_service,
+                          snapshot_service, transaction_service)
+
+    today = date.today()
+    month_ago = (today - timedelta(days=30)).isoformat()
+
+    return [
+        ('list_accounts', lambda: account_service.list_accounts()),
+        ('list_accounts(category_id)', lambda: account_service.list_accounts(category_id=2)),
+        ('get_account', lambda: account_service.get_account(1)),
+        ('get_accounts_by_type', lambda: account_service.get_accounts_by_type()),
+        ('get_platform_summary', lambda: account_service.get_platform_summary()),
+        ('balance_as_of', lambda: balance_service.balance_as_of(None, month_ago)),
+        ('balances_as_of_dates(365)',
+         lambda: balance_service.balances_as_of_dates(
+             None, [(today - timedelta(days=i)).isoformat() for i in range(365)])),
+        ('list_transactions(limit)', lambda: transaction_service.list_transactions(limit=50),
+         '没有筛选条件，按日期索引倒序读取 LIMIT 行即停止'),
+        ('list_transactions(account_id)',
+         lambda: transaction_service.list_transactions(account_id=1, limit=20)),
+        ('list_transactions(account_id, date range)',
+         lambda: transaction_service.list_transactions(account_id=1, start_date=month_ago,
+                                                       end_date=today.isoformat())),
+        ('list_transactions(type)',
+         lambda: transaction_service.list_transactions(transaction_type='收入', limit=50)),
+        ('list_transactions(date range)',
+         lambda: transaction_service.list_transactions(start_date=month_ago, end_date=today.isoformat())),
+        ('list_transactions_page(cursor)',
+         lambda: transaction_service.list_transactions_page(
+             cursor=transaction_service.encode_cursor(month_ago, 10 ** 9))),
+        ('list_transactions_page(account_id, prev)',
+         lambda: transaction_service.list_transactions_page(
+             account_id=1, cursor=transaction_service.encode_cursor(month_ago, 1), direction='prev')),
+        ('search_transactions', lambda: transaction_service.search_transactions('测试交易')),
+        ('search_transactions(order=date)',
+         lambda: transaction_service.search_transactions('测试交易', order='date')),
+        ('search_transactions(short)', lambda: transaction_service.search_transactions('测试'),
+         '命中很多的两个字符的词按日期倒序扫描，很快凑满一页；命中少的词走二元组索引'),
+        ('search_transactions(rare short)', lambda: transaction_service.search_transactions('罕见')),
+        ('search_transactions(short, account_id)',
+         lambda: transaction_service.search_transactions('测试', account_id=1)),
+        ('get_transaction_categories', lambda: transaction_service.get_transaction_categories()),
+        ('list_categories', lambda: category_service.list_categories()),
+        ('get_categories_with_stats', lambda: category_service.get_categories_with_stats()),
+        ('get_asset_summary', lambda: analytics_service.get_asset_summary()),
+        ('get_asset_distribution', lambda: analytics_service.get_asset_distribution()),
+        ('get_income_expense_summary', lambda: analytics_service.get_income_expense_summary()),
+        # 先补齐快照，之后的趋势查询走快照区间读取
+        ('backfill_snapshots', lambda: snapshot_service.backfill_snapshots()),
+        ('get_asset_trend', lambda: analytics_service.get_asset_trend(30)),
+        ('get_snapshot_breakdown', lambda: snapshot_service.get_snapshot_breakdown()),
+        ('get_asset_trend(3650)', lambda: analytics_service.get_asset_trend(3650)),
+        ('get_monthly_statistics', lambda: analytics_service.get_monthly_statistics()),
+        ('get_income_expense_summary(10 years)',
+         lambda: analytics_service.get_income_expense_summary(
+             (today - timedelta(days=3650)).isoformat(), today.isoformat())),
+        ('calculate_financial_ratios', lambda: analytics_service.calculate_financial_ratios()),
+        ('get_category_totals(year)',
+         lambda: transaction_service.get_category_totals(
+             '支出', (today - timedelta(days=365)).isoformat(), today.isoformat(), limit=10)),
+        ('get_category_totals(category_type)',
+         lambda: transaction_service.get_category_totals('支出', month_ago, today.isoformat(), '流动资产')),
+        ('get_daily_totals', lambda: transaction_service.get_daily_totals('收入', month_ago, today.isoformat())),
+        ('get_weekday_totals',
+         lambda: transaction_service.get_weekday_totals(
+             '支出', (today - timedelta(days=83)).isoformat(), today.isoformat())),
+        ('get_monthly_totals', lambda: analytics_service.get_monthly_totals(12)),
+        ('get_month_category_totals',
+         lambda: transaction_service.get_month_category_totals(today.strftime('%Y-%m'))),
+    ]
+
+
+def _large_table_aliases(sql, tables=LARGE_TABLES):
+    """找出语句中大表使用的名称（表名或别名）"""
+    aliases = set()
+    for table in tables:
+        for match in re.finditer(rf'\b(?:FROM|JOIN)\s+{table}\b(?:\s+(?:AS\s+)?(\w+))?', sql, re.I):
+            alias = match.group(1)
+            if alias and alias.upper() not in ('WHERE', 'JOIN', 'LEFT', 'INNER', 'ON', 'GROUP', 'ORDER', 'LIMIT'):
+                aliases.add(alias)
+            aliases.add(table)
+    return aliases
+
+
+def check_plan(conn, sql, allow_ordered_scan=False):
+    """
+    检查单条查询的执行计划，返回 (计划文本列表, 问题列表)
+    :param allow_ordered_scan: 是否允许按索引顺序扫描（SCAN ... USING INDEX），不带索引的全表扫描始终不允许
+    """
+    aliases = _large_table_aliases(sql)
+    plan = [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql)]
+    if not aliases:
+        return plan, []
+
+    problems = []
+    reads_raw_rows = bool(_large_table_aliases(sql, RAW_TABLES))
+    has_group_by = re.search(r'\bGROUP\s+BY\b', sql, re.I) is not None
+    is_fts = re.search(r'\bMATCH\b|\btransaction_bigrams\b', sql, re.I) is not None
+    for detail in plan:
+        # 有范围条件的访问显示为 SEARCH；SCAN 即使按索引顺序（USING [COVERING] INDEX）也会读到整张表
+        scan = re.match(r'SCAN (\w+)\b', detail)
+        if scan and scan.group(1) in aliases:
+            if not (allow_ordered_scan and ' USING ' in detail):
+                problems.append(f'全表扫描: {detail}')
+        if 'USE TEMP B-TREE' in detail and reads_raw_rows:
+            if 'FOR ORDER BY' in detail and has_group_by:
+                continue  # 对聚合后的结果排序，行数与分组数相同
+            if 'FOR ORDER BY' in detail and is_fts:
+                continue  # 只对全文索引或二元组索引命中的行排序
+            problems.append(f'临时B树: {detail}')
+
+    return plan, problems
+
+
+def run_checks(path, verbose=False):
+    """执行所有服务调用并检查其查询计划，返回失败数量"""
+    pool = TracingPool(path, pool_size=4)
+    connection.pool = pool
+
+    plan_conn = sqlite3.connect(path)
+    migrate(plan_conn)
+    failures = 0
+
+    for name, call, *allowance in service_calls():
+        pool.statements.clear()
+        start = time.perf_counter()
+        call()
+        elapsed = (time.perf_counter() - start) * 1000
+
+        queries = [s for s in pool.statements if s.lstrip().upper().startswith(('SELECT', 'WITH'))]
+        problems = []
+        for sql in dict.fromkeys(queries):
+            plan, sql_problems = check_plan(plan_conn, sql, allow_ordered_scan=bool(allowance))
+            problems.extend(sql_problems)
+            if verbose or sql_problems:
+                print(f'    {" ".join(sql.split())[:120]}')
+                for detail in plan:
+                    print(f'        {detail}')
+
+        status = '失败' if problems else '通过'
+        print(f'[{status}] {name} ({len(queries)} 条查询, {elapsed:.1f}ms)')
+        for problem in problems:
+            print(f'        {problem}')
+        failures += bool(problems)
+
+    plan_conn.close()
+    pool.close_all()
+    return failures
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='服务查询执行计划回归检查')
+    parser.add_argument('--rows', type=int, default=1000000, help='生成的交易数量')
+    parser.add_argument('--keep', help='把生成的测试数据库保存到该路径（已存在则直接复用）')
+    parser.add_argument('--verbose', action='store_true', help='打印所有查询计划')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='finance-plans-')
+    db_path = args.keep or os.path.join(workdir, 'plans.db')
+    try:
+        if not os.path.exists(db_path):
+            print(f'生成 {args.rows:,} 条交易的测试数据库...')
+            build_dataset(db_path, args.rows)
+        failed = run_checks(db_path, args.verbose)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f'\n共 {failed} 个服务函数的查询计划不符合要求' if failed else '\n所有查询计划检查通过')
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,178 @@
+# check_snapshot_items.py
+"""
+快照账户明细回归检查
+在临时数据库中按随机顺序写入手动快照、补齐自动快照、补录历史交易，
+每一步之后从关键帧与增量还原每个快照的账户余额并与预期核对，
+覆盖在已有快照之间插入快照时对其后增量快照的重写（rebase）：
+  - 自动快照的余额等于由当前余额与之后的交易倒推的余额，合计与各账户余额一致
+  - 手动快照的余额保持写入时的值，不被之后的补齐与重建改变
+  - 补录历史交易后已过期（stale_from 之后）的自动快照不参与核对，补齐后恢复一致
+
+用法: python check_snapshot_items.py [--rounds 200] [--seed 1] [--keyframe-interval 7]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+from collections import defaultdict
+from datetime import date, timedelta
+
+from database import connection, snapshot_items
+from database.connection import ConnectionPool
+from database.migrations import migrate
+from services.analytics_service import ASSET_TYPES
+from services.snapshot_service import backfill_snapshots
+
+DAYS = 120
+
+
+class Ledger:
+    """测试数据库中的账户与交易，按写入的数据计算各日期的预期余额"""
+
+    def __init__(self, conn, accounts=6):
+        self.conn = conn
+        self.first_day = date.today() - timedelta(days=DAYS + 1)
+        self.types = dict(conn.execute('SELECT id, type FROM categories'))
+        category_ids = list(self.types)
+        self.balances = {}
+        self.categories = {}
+        for i in range(accounts):
+            category_id = random.choice(category_ids)
+            aid = conn.execute('INSERT INTO accounts (name, category_id, balance) VALUES (?, ?, ?)',
+                               (f'测试账户{i}', category_id, 0)).lastrowid
+            self.balances[aid] = 0
+            self.categories[aid] = category_id
+        self.changes = defaultdict(lambda: defaultdict(int))  # 日期 -> 账户 -> 当天收支合计
+        self.manual = {}  # 日期 -> 手动快照写入的余额
+
+    def random_day(self):
+        return (self.first_day + timedelta(days=random.randint(0, DAYS))).isoformat()
+
+    def add_transaction(self, day):
+        """按整数金额写入一笔交易并同步账户当前余额"""
+        aid = random.choice(list(self.balances))
+        ttype = random.choice(['收入', '支出'])
+        amount = random.randint(1, 500)
+        signed = amount if ttype == '收入' else -amount
+        self.conn.execute('''
+            INSERT INTO transactions (account_id, date, description, type, amount)
+            VALUES (?, ?, '测试交易', ?, ?)
+        ''', (aid, day, ttype, amount))
+        self.conn.execute('UPDATE accounts SET balance = balance + ? WHERE id = ?', (signed, aid))
+        self.balances[aid] += signed
+        self.changes[day][aid] += signed
+        self.conn.commit()
+
+    def add_manual_snapshot(self):
+        """写入一个余额随机的手动快照，偶尔缺少某个账户"""
+        day = self.random_day()
+        balances = {aid: random.randint(-1000, 10000) for aid in self.balances}
+        if random.random() < 0.3:
+            del balances[random.choice(list(balances))]
+        self.conn.execute('''
+            INSERT INTO asset_snapshots (snapshot_date, total_assets, is_manual) VALUES (?, ?, 1)
+            ON CONFLICT (snapshot_date) DO UPDATE SET total_assets = excluded.total_assets, is_manual = 1
+        ''', (day, sum(balances.values())))
+        snapshot_items.save_snapshot_items(self.conn, day, balances)
+        self.conn.commit()
+        self.manual[day] = balances
+
+    def expected(self, day):
+        """day 日终各账户的余额：当前余额减去之后的收支"""
+        balances = dict(self.balances)
+        for change_day, changes in self.changes.items():
+            if change_day > day:
+                for aid, amount in changes.items():
+                    balances[aid] -= amount
+        return balances
+
+
+def check_snapshots(conn, ledger):
+    """核对全部快照，返回问题列表"""
+    stale_from = conn.execute('SELECT stale_from FROM snapshot_state WHERE id = 1').fetchone()[0]
+    problems = []
+    for day, total, is_manual in conn.execute(
+            'SELECT snapshot_date, total_assets, is_manual FROM asset_snapshots ORDER BY snapshot_date').fetchall():
+        state = snapshot_items.load_snapshot_state(conn, day)
+        if is_manual:
+            expected = ledger.manual[day]
+        elif stale_from is not None and day >= stale_from:
+            continue
+        else:
+            expected = ledger.expected(day)
+            assets = sum(balance for aid, balance in expected.items()
+                         if ledger.types[ledger.categories[aid]] in ASSET_TYPES)
+            if abs(total - assets) > 0.005:
+                problems.append(f'{day} 合计 {total} != {assets}')
+        if state != expected:
+            problems.append(f'{day} {"手动" if is_manual else "自动"}快照余额 {state} != {expected}')
+    return problems
+
+
+def run_checks(path, rounds, verbose=False):
+    """随机执行写入操作并在每一步之后核对，返回第一个出错的步骤的问题列表"""
+    connection.pool = ConnectionPool(path, pool_size=2)
+
+    conn = sqlite3.connect(path)
+    migrate(conn)
+    ledger = Ledger(conn)
+    for _ in range(DAYS * 2):
+        ledger.add_transaction(ledger.random_day())
+
+    for step in range(rounds):
+        action = random.choice(['manual', 'backfill', 'backfill', 'transaction'])
+        if action == 'manual':
+            ledger.add_manual_snapshot()
+            detail = '手动快照'
+        elif action == 'backfill':
+            start, end = sorted([ledger.random_day(), ledger.random_day()])
+            written = backfill_snapshots(start, end)
+            detail = f'补齐 {start} ~ {end}，写入 {written} 个'
+        else:
+            day = ledger.random_day()
+            ledger.add_transaction(day)
+            detail = f'补录 {day} 的交易'
+
+        problems = check_snapshots(conn, ledger)
+        if verbose or problems:
+            print(f'[{"失败" if problems else "通过"}] 第 {step + 1} 步: {detail}')
+        if problems:
+            return problems
+
+    # 最后补齐全部区间，所有自动快照都应恢复一致
+    backfill_snapshots(ledger.first_day.isoformat())
+    problems = check_snapshots(conn, ledger)
+    count = conn.execute('SELECT COUNT(*), SUM(is_keyframe) FROM asset_snapshots').fetchone()
+    print(f'共 {count[0]} 个快照，其中关键帧 {count[1]} 个')
+    conn.close()
+    connection.pool.close_all()
+    return problems
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='快照账户明细回归检查')
+    parser.add_argument('--rounds', type=int, default=200, help='随机写入操作的次数')
+    parser.add_argument('--seed', type=int, help='随机数种子，用于复现失败')
+    parser.add_argument('--keyframe-interval', type=int, default=7,
+                        help='关键帧间隔天数，取较小的值以覆盖更多关键帧边界')
+    parser.add_argument('--verbose', action='store_true', help='打印每一步的操作')
+    args = parser.parse_args()
+
+    seed = args.seed if args.seed is not None else random.randrange(1 << 30)
+    random.seed(seed)
+    snapshot_items.SNAPSHOT_KEYFRAME_INTERVAL = args.keyframe_interval
+
+    workdir = tempfile.mkdtemp(prefix='finance-snapshots-')
+    try:
+        problems = run_checks(os.path.join(workdir, 'snapshots.db'), args.rounds, args.verbose)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for problem in problems:
+        print(f'        {problem}')
+    print(f'\n快照明细检查失败（--seed {seed}）' if problems else f'\n快照明细检查通过（--seed {seed}）')
+    sys.exit(1 if problems else 0)
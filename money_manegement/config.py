@@ -2,4 +2,53 @@
 import os
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DATABASE_PATH = os.path.join(BASE_DIR, 'finance.db')  # 数据库文件路径
+DATABASE_PATH = os.environ.get('FINANCE_DB_PATH', os.path.join(BASE_DIR, 'finance.db'))  # 数据库文件路径
+
+# 数据库连接池配置
+DB_POOL_SIZE = int(os.environ.get('FINANCE_DB_POOL_SIZE', 4))  # 每个线程最多保留的空闲连接数
+
+# 数据库性能配置档：durable / balanced / bulk-load，见 database/connection.py
+DB_PROFILE = os.environ.get('FINANCE_DB_PROFILE', 'balanced')
+# 在配置档基础上单独覆盖的PRAGMA，例如 {'synchronous': 'FULL'}
+DB_PRAGMAS = {}
+if os.environ.get('FINANCE_DB_SYNCHRONOUS'):
+    DB_PRAGMAS['synchronous'] = os.environ['FINANCE_DB_SYNCHRONOUS']
+if os.environ.get('FINANCE_DB_CACHE_SIZE'):
+    DB_PRAGMAS['cache_size'] = int(os.environ['FINANCE_DB_CACHE_SIZE'])
+if os.environ.get('FINANCE_DB_MMAP_SIZE'):
+    DB_PRAGMAS['mmap_size'] = int(os.environ['FINANCE_DB_MMAP_SIZE'])
+if os.environ.get('FINANCE_DB_TIMEOUT'):
+    # 等待数据库锁的秒数，换算为 busy_timeout 的毫秒数
+    DB_PRAGMAS['busy_timeout'] = int(float(os.environ['FINANCE_DB_TIMEOUT']) * 1000)
+
+# 资产快照定时任务：每隔 SNAPSHOT_INTERVAL 秒生成当天快照并补齐最近 SNAPSHOT_BACKFILL_DAYS 天缺失的快照
+SNAPSHOT_SCHEDULER = os.environ.get('FINANCE_SNAPSHOT_SCHEDULER', '1') == '1'
+SNAPSHOT_INTERVAL = int(os.environ.get('FINANCE_SNAPSHOT_INTERVAL', 3600))
+SNAPSHOT_BACKFILL_DAYS = int(os.environ.get('FINANCE_SNAPSHOT_BACKFILL_DAYS', 31))
+# 快照账户明细每隔多少天保存一次完整的关键帧，其余快照只保存变化的账户
+SNAPSHOT_KEYFRAME_INTERVAL = int(os.environ.get('FINANCE_SNAPSHOT_KEYFRAME_INTERVAL', 30))
+
+# 交易表的进程内列式缓存，供分析查询使用；超出内存预算时分析查询回退到SQL
+LEDGER_CACHE = os.environ.get('FINANCE_LEDGER_CACHE', '0') == '1'
+LEDGER_CACHE_MAX_MB = int(os.environ.get('FINANCE_LEDGER_CACHE_MAX_MB', 256))
+
+# 图表数据缓存的容量上限，过期时间取各图表配置的 cache_duration
+CHART_CACHE_MAX_ENTRIES = int(os.environ.get('FINANCE_CHART_CACHE_MAX_ENTRIES', 512))
+CHART_CACHE_MAX_MB = int(os.environ.get('FINANCE_CHART_CACHE_MAX_MB', 32))
+# 图表缓存预热：启动时以及数据写入后（等待 CHART_WARMUP_DELAY 秒内没有新写入）按默认参数计算全部图表
+CHART_WARMUP = os.environ.get('FINANCE_CHART_WARMUP', '1') == '1'
+CHART_WARMUP_CONCURRENCY = int(os.environ.get('FINANCE_CHART_WARMUP_CONCURRENCY', 2))
+CHART_WARMUP_DELAY = float(os.environ.get('FINANCE_CHART_WARMUP_DELAY', 2))
+CHART_WARMUP_POLL_INTERVAL = float(os.environ.get('FINANCE_CHART_WARMUP_POLL_INTERVAL', 5))  # 检查数据版本号的间隔秒数
+
+# 分析接口结果缓存：缓存键包含依赖表的数据版本号，写入后自动失效，过期时间只用于回收内存
+RESPONSE_CACHE_TTL = int(os.environ.get('FINANCE_RESPONSE_CACHE_TTL', 3600))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('FINANCE_RESPONSE_CACHE_MAX_ENTRIES', 256))
+
+# 缓存后端：memory 为进程内缓存；sqlite 保存在同一主机的共享文件中，多个工作进程共用计算结果
+CACHE_BACKEND = os.environ.get('FINANCE_CACHE_BACKEND', 'memory')
+CACHE_PATH = os.environ.get('FINANCE_CACHE_PATH', os.path.splitext(DATABASE_PATH)[0] + '-cache.db')
+
+# 后台任务（快照定时任务、图表预热）的进程锁文件，多个工作进程中只有取得锁的一个启动后台任务
+BACKGROUND_LOCK_PATH = os.environ.get('FINANCE_BACKGROUND_LOCK_PATH',
+                                      os.path.splitext(DATABASE_PATH)[0] + '-background.lock')
@@ -0,0 +1,151 @@
+# database/benchmark.py
+"""
+数据库性能配置档基准测试
+对比各配置档下单条提交的延迟，以及写入进行中时的并发读吞吐量
+
+用法: python -m database.benchmark [--commits 500] [--readers 4] [--seconds 3]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+
+from database.connection import PERFORMANCE_PROFILES, apply_pragmas, get_profile_pragmas
+
+
+def _connect(path, pragmas):
+    conn = sqlite3.connect(path, check_same_thread=False)
+    apply_pragmas(conn, pragmas)
+    return conn
+
+
+def _prepare_database(path, pragmas, rows=20000):
+    """建立与交易表结构一致的测试表并填充数据"""
+    conn = _connect(path, pragmas)
+    conn.execute('''
+        CREATE TABLE transactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            account_id INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            description TEXT,
+            type TEXT,
+            category TEXT,
+            amount REAL NOT NULL,
+            balance_after REAL,
+            note TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('CREATE INDEX idx_transactions_date ON transactions(date)')
+    conn.executemany(
+        'INSERT INTO transactions (account_id, date, description, type, amount) VALUES (?, ?, ?, ?, ?)',
+        ((random.randint(1, 10), f'2024-{random.randint(1, 12):02d}-{random.randint(1, 28):02d}',
+          '测试交易', random.choice(['收入', '支出']), round(random.uniform(1, 500), 2))
+         for _ in range(rows))
+    )
+    conn.commit()
+    conn.close()
+
+
+def measure_commit_latency(path, pragmas, commits):
+    """逐条插入并提交，返回每次提交的耗时（毫秒）"""
+    conn = _connect(path, pragmas)
+    latencies = []
+    for _ in range(commits):
+        start = time.perf_counter()
+        conn.execute(
+            'INSERT INTO transactions (account_id, date, description, type, amount) VALUES (?, ?, ?, ?, ?)',
+            (1, '2024-06-01', '基准测试', '支出', 12.5)
+        )
+        conn.commit()
+        latencies.append((time.perf_counter() - start) * 1000)
+    conn.close()
+    return latencies
+
+
+def measure_concurrent_reads(path, pragmas, readers, seconds):
+    """一个线程持续写入的同时，多个线程执行范围查询，返回每秒完成的读查询数和写入次数"""
+    stop = threading.Event()
+    read_counts = [0] * readers
+    write_count = [0]
+
+    def writer():
+        conn = _connect(path, pragmas)
+        while not stop.is_set():
+            conn.execute(
+                'INSERT INTO transactions (account_id, date, description, type, amount) VALUES (?, ?, ?, ?, ?)',
+                (2, '2024-07-01', '并发写入', '收入', 99.0)
+            )
+            conn.commit()
+            write_count[0] += 1
+        conn.close()
+
+    def reader(index):
+        conn = _connect(path, pragmas)
+        while not stop.is_set():
+            conn.execute('''
+                SELECT type, SUM(amount) FROM transactions
+                WHERE date BETWEEN '2024-03-01' AND '2024-03-31'
+                GROUP BY type
+            ''').fetchall()
+            read_counts[index] += 1
+        conn.close()
+
+    threads = [threading.Thread(target=writer)]
+    threads += [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    return sum(read_counts) / seconds, write_count[0] / seconds
+
+
+def run_benchmark(commits=500, readers=4, seconds=3.0, profiles=None):
+    """对每个配置档运行基准测试，返回结果列表"""
+    results = []
+    workdir = tempfile.mkdtemp(prefix='finance-bench-')
+
+    try:
+        for name in profiles or PERFORMANCE_PROFILES:
+            pragmas = get_profile_pragmas(name)
+            path = os.path.join(workdir, f'{name}.db')
+            _prepare_database(path, pragmas)
+
+            latencies = measure_commit_latency(path, pragmas, commits)
+            reads_per_sec, writes_per_sec = measure_concurrent_reads(path, pragmas, readers, seconds)
+
+            results.append({
+                'profile': name,
+                'commit_mean_ms': statistics.mean(latencies),
+                'commit_p95_ms': sorted(latencies)[int(len(latencies) * 0.95) - 1],
+                'reads_per_sec': reads_per_sec,
+                'writes_per_sec': writes_per_sec,
+            })
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='SQLite性能配置档基准测试')
+    parser.add_argument('--commits', type=int, default=500, help='测量提交延迟的提交次数')
+    parser.add_argument('--readers', type=int, default=4, help='并发读线程数')
+    parser.add_argument('--seconds', type=float, default=3.0, help='并发读测试持续秒数')
+    parser.add_argument('--profile', action='append', choices=list(PERFORMANCE_PROFILES),
+                        help='只测试指定配置档，可重复')
+    args = parser.parse_args()
+
+    print(f"{'配置档':<12}{'提交均值(ms)':>14}{'提交P95(ms)':>14}{'并发读(次/秒)':>16}{'并发写(次/秒)':>16}")
+    for r in run_benchmark(args.commits, args.readers, args.seconds, args.profile):
+        print(f"{r['profile']:<12}{r['commit_mean_ms']:>14.3f}{r['commit_p95_ms']:>14.3f}"
+              f"{r['reads_per_sec']:>16.1f}{r['writes_per_sec']:>16.1f}")
@@ -0,0 +1,714 @@
+# database/migrations.py
+"""
+数据库结构迁移
+以 PRAGMA user_version 记录当前结构版本，按顺序执行未应用的迁移步骤
+每个迁移步骤在单独的事务中执行，失败时整体回滚
+"""
+
+MIGRATIONS = []
+
+
+def migration(version, description):
+    """
+    注册迁移步骤的装饰器，版本号必须连续递增
+    :raises ValueError: 版本号重复或跳号，模块导入时即报出，避免已发布的数据库跳过某一步迁移
+    """
+
+    def decorator(func):
+        expected = latest_version() + 1
+        if version != expected:
+            raise ValueError(f"迁移 {func.__name__} 的版本号应为 v{expected}，实际为 v{version}")
+        MIGRATIONS.append((version, description, func))
+        return func
+
+    return decorator
+
+
+def latest_version():
+    """最新的结构版本号"""
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+def get_schema_version(conn):
+    """读取数据库当前的结构版本号"""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn):
+    """
+    把数据库升级到最新版本
+    已是最新版本时只需一次 PRAGMA 读取
+    :return: 本次执行的迁移步骤列表 [(version, description)]
+    """
+    if get_schema_version(conn) >= latest_version():
+        return []
+
+    applied = []
+    for version, description, func in MIGRATIONS:
+        # IMMEDIATE 事务先取得写锁，避免多个进程同时执行同一步迁移
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if get_schema_version(conn) >= version:
+                conn.rollback()
+                continue
+
+            func(conn)
+            conn.execute(f'PRAGMA user_version = {version}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        applied.append((version, description))
+        print(f"数据库迁移 v{version}: {description}")
+
+    return applied
+
+
+# ===== 迁移步骤 =====
+
+@migration(1, '初始表结构与默认分类')
+def _initial_schema(conn):
+    # 兼容旧版 init_db() 创建的数据库，所有语句均可重复执行
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS categories (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            type TEXT NOT NULL CHECK(type IN ('流动资产', '投资资产', '固定资产', '其他资产')),
+            icon TEXT,
+            color TEXT,
+            description TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS accounts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            category_id INTEGER,
+            balance REAL NOT NULL DEFAULT 0,
+            initial_balance REAL NOT NULL DEFAULT 0,
+            currency TEXT DEFAULT 'CNY',
+            platform TEXT,
+            account_number TEXT,
+            description TEXT,
+            is_active INTEGER DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (category_id) REFERENCES categories (id)
+        )
+    ''')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS transactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            account_id INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            description TEXT,
+            type TEXT CHECK(type IN ('收入', '支出', '转账')),
+            category TEXT,
+            amount REAL NOT NULL,
+            balance_after REAL,
+            note TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (account_id) REFERENCES accounts (id) ON DELETE CASCADE
+        )
+    ''')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS asset_snapshots (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            snapshot_date TEXT NOT NULL,
+            total_assets REAL NOT NULL,
+            total_liquid REAL DEFAULT 0,
+            total_investment REAL DEFAULT 0,
+            total_fixed REAL DEFAULT 0,
+            details TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_transactions_date ON transactions(date)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_transactions_account ON transactions(account_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_accounts_category ON accounts(category_id)')
+
+    default_categories = [
+        ('现金', '流动资产', '💵', '#4CAF50', '现金及现金等价物'),
+        ('银行存款', '流动资产', '🏦', '#2196F3', '各类银行账户'),
+        ('电子钱包', '流动资产', '📱', '#FF9800', '支付宝、微信等'),
+        ('股票', '投资资产', '📈', '#F44336', '股票投资账户'),
+        ('基金', '投资资产', '💹', '#9C27B0', '基金投资账户'),
+        ('债券', '投资资产', '📊', '#3F51B5', '债券投资账户'),
+        ('房产', '固定资产', '🏠', '#795548', '房地产资产'),
+        ('车辆', '固定资产', '🚗', '#607D8B', '汽车等交通工具'),
+        ('其他', '其他资产', '📦', '#9E9E9E', '其他类型资产')
+    ]
+    conn.executemany('''
+        INSERT OR IGNORE INTO categories (name, type, icon, color, description)
+        VALUES (?, ?, ?, ?, ?)
+    ''', default_categories)
+
+
+@migration(2, '按查询形态设计的交易表复合索引')
+def _transaction_query_indexes(conn):
+    # list_transactions(account_id=...) 按 (date, id) 倒序翻页，单列账户索引被复合索引取代
+    conn.execute('DROP INDEX IF EXISTS idx_transactions_account')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_transactions_account_date ON transactions(account_id, date, id)')
+    # 收支汇总按 (date, type) 分组的覆盖索引
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_transactions_date_type ON transactions(date, type, amount)')
+    # 按分类汇总的覆盖索引，有统计信息时可跳跃扫描 date 范围
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_transactions_category ON transactions(category, type, date, amount)')
+    # 月度统计按月份分组的表达式索引
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_transactions_month
+        ON transactions(strftime('%Y-%m', date), type, amount)
+    ''')
+    # 为查询规划器收集统计信息
+    conn.execute('PRAGMA analysis_limit = 1000')
+    conn.execute('ANALYZE')
+
+
+@migration(3, '账单导入：交易行哈希与导入任务表')
+def _statement_import(conn):
+    # 导入行的内容哈希，同一账单重复导入时由唯一索引去重；手工录入的交易为 NULL
+    conn.execute('ALTER TABLE transactions ADD COLUMN import_hash TEXT')
+    conn.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_transactions_import_hash
+        ON transactions(import_hash) WHERE import_hash IS NOT NULL
+    ''')
+
+    # 导入任务进度，每提交一个分块更新一次，中断后从 rows_committed 处继续
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS import_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            file_hash TEXT NOT NULL,
+            account_id INTEGER NOT NULL,
+            filename TEXT,
+            format TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'running' CHECK(status IN ('running', 'completed', 'failed')),
+            rows_committed INTEGER NOT NULL DEFAULT 0,
+            inserted INTEGER NOT NULL DEFAULT 0,
+            skipped INTEGER NOT NULL DEFAULT 0,
+            error_count INTEGER NOT NULL DEFAULT 0,
+            message TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (file_hash, account_id),
+            FOREIGN KEY (account_id) REFERENCES accounts (id)
+        )
+    ''')
+
+
+@migration(4, '交易表增加更新时间')
+def _transaction_updated_at(conn):
+    # ALTER TABLE 不支持 CURRENT_TIMESTAMP 默认值，未修改过的交易以 created_at 为准
+    conn.execute('ALTER TABLE transactions ADD COLUMN updated_at TIMESTAMP')
+
+
+@migration(5, '交易说明、备注与分类的全文索引')
+def _transaction_search_index(conn):
+    # 外部内容表只保存倒排索引，正文仍从 transactions 读取；trigram 分词对中文无需词典，
+    # 任意连续三个字符即可命中，并同时支持 LIKE/GLOB 走索引
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS transactions_fts USING fts5(
+            description, note, category,
+            content='transactions', content_rowid='id', tokenize='trigram'
+        )
+    ''')
+    # 排序权重：说明 > 备注 > 分类
+    conn.execute("INSERT INTO transactions_fts(transactions_fts, rank) VALUES ('rank', 'bm25(10.0, 5.0, 2.0)')")
+
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS transactions_fts_insert AFTER INSERT ON transactions BEGIN
+            INSERT INTO transactions_fts(rowid, description, note, category)
+            VALUES (new.id, new.description, new.note, new.category);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS transactions_fts_delete AFTER DELETE ON transactions BEGIN
+            INSERT INTO transactions_fts(transactions_fts, rowid, description, note, category)
+            VALUES ('delete', old.id, old.description, old.note, old.category);
+        END
+    ''')
+    # 只在文本列变化时重建该行索引，余额等字段的更新不触发
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS transactions_fts_update
+        AFTER UPDATE OF description, note, category ON transactions BEGIN
+            INSERT INTO transactions_fts(transactions_fts, rowid, description, note, category)
+            VALUES ('delete', old.id, old.description, old.note, old.category);
+            INSERT INTO transactions_fts(rowid, description, note, category)
+            VALUES (new.id, new.description, new.note, new.category);
+        END
+    ''')
+
+    # 为已有交易建立索引
+    conn.execute("INSERT INTO transactions_fts(transactions_fts) VALUES ('rebuild')")
+
+
+@migration(6, '导入任务记录最早的交易日期')
+def _import_job_first_date(conn):
+    # 导入完成时从该日期起重算账户的 balance_after
+    conn.execute('ALTER TABLE import_jobs ADD COLUMN first_date TEXT')
+
+
+@migration(7, '由触发器维护的资产汇总表')
+def _asset_summary_tables(conn):
+    # 每个分类下启用账户的数量与余额合计
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS category_summary (
+            category_id INTEGER PRIMARY KEY,
+            account_count INTEGER NOT NULL DEFAULT 0,
+            total_balance REAL NOT NULL DEFAULT 0
+        )
+    ''')
+    # 每个平台下启用账户的数量与余额合计，未填写平台的账户归入"未分类"
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS platform_summary (
+            platform TEXT PRIMARY KEY,
+            account_count INTEGER NOT NULL DEFAULT 0,
+            total_balance REAL NOT NULL DEFAULT 0
+        )
+    ''')
+    # 全局计数，只有一行
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS ledger_stats (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            account_count INTEGER NOT NULL DEFAULT 0,
+            transaction_count INTEGER NOT NULL DEFAULT 0,
+            last_update TIMESTAMP
+        )
+    ''')
+
+    # 账户变动时按受影响的分类/平台重新聚合（账户数量很少，聚合比增量加减更不易累积误差）
+    refresh_category = '''
+        INSERT INTO category_summary (category_id, account_count, total_balance)
+        SELECT {row}.category_id, COUNT(*), COALESCE(SUM(balance), 0)
+        FROM accounts WHERE category_id = {row}.category_id AND is_active = 1
+        HAVING {row}.category_id IS NOT NULL
+        ON CONFLICT (category_id) DO UPDATE
+        SET account_count = excluded.account_count, total_balance = excluded.total_balance;
+    '''
+    refresh_platform = '''
+        INSERT INTO platform_summary (platform, account_count, total_balance)
+        SELECT COALESCE({row}.platform, '未分类'), COUNT(*), COALESCE(SUM(balance), 0)
+        FROM accounts WHERE COALESCE(platform, '未分类') = COALESCE({row}.platform, '未分类') AND is_active = 1
+        ON CONFLICT (platform) DO UPDATE
+        SET account_count = excluded.account_count, total_balance = excluded.total_balance;
+    '''
+    refresh_stats = '''
+        UPDATE ledger_stats SET
+            account_count = (SELECT COUNT(*) FROM accounts WHERE is_active = 1),
+            last_update = (SELECT MAX(updated_at) FROM accounts)
+        WHERE id = 1;
+    '''
+
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS accounts_summary_insert AFTER INSERT ON accounts BEGIN
+            {refresh_category.format(row='new')}
+            {refresh_platform.format(row='new')}
+            {refresh_stats}
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS accounts_summary_update
+        AFTER UPDATE OF balance, is_active, category_id, platform, updated_at ON accounts BEGIN
+            {refresh_category.format(row='old')}
+            {refresh_category.format(row='new')}
+            {refresh_platform.format(row='old')}
+            {refresh_platform.format(row='new')}
+            {refresh_stats}
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS accounts_summary_delete AFTER DELETE ON accounts BEGIN
+            {refresh_category.format(row='old')}
+            {refresh_platform.format(row='old')}
+            {refresh_stats}
+        END
+    ''')
+
+    # 交易只影响计数，逐行加减
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS transactions_summary_insert AFTER INSERT ON transactions BEGIN
+            UPDATE ledger_stats SET transaction_count = transaction_count + 1 WHERE id = 1;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS transactions_summary_delete AFTER DELETE ON transactions BEGIN
+            UPDATE ledger_stats SET transaction_count = transaction_count - 1 WHERE id = 1;
+        END
+    ''')
+
+    # 按现有数据填充
+    conn.execute('''
+        INSERT OR REPLACE INTO category_summary (category_id, account_count, total_balance)
+        SELECT category_id, COUNT(*), SUM(balance)
+        FROM accounts WHERE is_active = 1 AND category_id IS NOT NULL
+        GROUP BY category_id
+    ''')
+    conn.execute('''
+        INSERT OR REPLACE INTO platform_summary (platform, account_count, total_balance)
+        SELECT COALESCE(platform, '未分类'), COUNT(*), SUM(balance)
+        FROM accounts WHERE is_active = 1
+        GROUP BY COALESCE(platform, '未分类')
+    ''')
+    conn.execute('''
+        INSERT OR REPLACE INTO ledger_stats (id, account_count, transaction_count, last_update)
+        VALUES (1,
+                (SELECT COUNT(*) FROM accounts WHERE is_active = 1),
+                (SELECT COUNT(*) FROM transactions),
+                (SELECT MAX(updated_at) FROM accounts))
+    ''')
+
+
+@migration(8, '按日、按月预聚合的收支汇总表')
+def _transaction_rollups(conn):
+    # 分类为空的交易以空字符串存放，使其能作为主键的一部分
+    for table, period, expr in (('transaction_daily', 'day', 'substr({row}.date, 1, 10)'),
+                                ('transaction_monthly', 'month', 'substr({row}.date, 1, 7)')):
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                {period} TEXT NOT NULL,
+                type TEXT NOT NULL,
+                account_id INTEGER NOT NULL,
+                category TEXT NOT NULL DEFAULT '',
+                total REAL NOT NULL DEFAULT 0,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY ({period}, type, account_id, category)
+            ) WITHOUT ROWID
+        ''')
+
+        add = f'''
+            INSERT INTO {table} ({period}, type, account_id, category, total, count)
+            VALUES ({expr.format(row='new')}, COALESCE(new.type, ''), new.account_id,
+                    COALESCE(new.category, ''), new.amount, 1)
+            ON CONFLICT ({period}, type, account_id, category) DO UPDATE
+            SET total = total + excluded.total, count = count + 1;
+        '''
+        # 计数归零时删除该行，顺带清除浮点加减累积的误差
+        remove = f'''
+            UPDATE {table} SET total = total - old.amount, count = count - 1
+            WHERE {period} = {expr.format(row='old')} AND type = COALESCE(old.type, '')
+              AND account_id = old.account_id AND category = COALESCE(old.category, '');
+            DELETE FROM {table}
+            WHERE {period} = {expr.format(row='old')} AND type = COALESCE(old.type, '')
+              AND account_id = old.account_id AND category = COALESCE(old.category, '')
+              AND count <= 0;
+        '''
+
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_insert AFTER INSERT ON transactions BEGIN
+                {add}
+            END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_delete AFTER DELETE ON transactions BEGIN
+                {remove}
+            END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_update
+            AFTER UPDATE OF date, account_id, type, category, amount ON transactions BEGIN
+                {remove}
+                {add}
+            END
+        ''')
+
+        conn.execute(f'''
+            INSERT INTO {table} ({period}, type, account_id, category, total, count)
+            SELECT {expr.format(row='transactions')}, COALESCE(type, ''), account_id,
+                   COALESCE(category, ''), SUM(amount), COUNT(*)
+            FROM transactions
+            GROUP BY 1, 2, 3, 4
+        ''')
+
+    # 收支汇总、月度统计和分类统计改读汇总表后，为它们建立的覆盖索引不再使用，删除以减少写入开销
+    conn.execute('DROP INDEX IF EXISTS idx_transactions_date_type')
+    conn.execute('DROP INDEX IF EXISTS idx_transactions_category')
+    conn.execute('DROP INDEX IF EXISTS idx_transactions_month')
+
+
+@migration(9, '资产快照按日期唯一，交易变动时作废受影响的快照')
+def _snapshot_per_date(conn):
+    # 同一天的多次快照只保留最后一次
+    conn.execute('''
+        DELETE FROM asset_snapshots
+        WHERE id NOT IN (SELECT MAX(id) FROM asset_snapshots GROUP BY snapshot_date)
+    ''')
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_asset_snapshots_date ON asset_snapshots(snapshot_date)')
+
+    # 补录或修改历史交易后，该日期及之后的快照已不再准确，删除后由定时任务按交易记录重建
+    invalidate = '''
+        DELETE FROM asset_snapshots WHERE snapshot_date >= substr({date}, 1, 10);
+    '''
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS transactions_snapshot_insert AFTER INSERT ON transactions
+        WHEN new.type IN ('收入', '支出') BEGIN
+            {invalidate.format(date='new.date')}
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS transactions_snapshot_delete AFTER DELETE ON transactions
+        WHEN old.type IN ('收入', '支出') BEGIN
+            {invalidate.format(date='old.date')}
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS transactions_snapshot_update
+        AFTER UPDATE OF date, account_id, type, amount ON transactions BEGIN
+            {invalidate.format(date='MIN(old.date, new.date)')}
+        END
+    ''')
+
+
+@migration(10, '快照账户明细改为增量存储')
+def _snapshot_items(conn):
+    import json
+    from datetime import date
+    from config import SNAPSHOT_KEYFRAME_INTERVAL
+
+    # 关键帧保存全部账户余额，其余快照只保存相对上一个快照变化的账户，余额为 NULL 表示账户不再计入
+    conn.execute('ALTER TABLE asset_snapshots ADD COLUMN is_keyframe INTEGER DEFAULT 0')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_asset_snapshots_keyframe
+        ON asset_snapshots(snapshot_date) WHERE is_keyframe = 1
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS snapshot_items (
+            snapshot_date TEXT NOT NULL,
+            account_id INTEGER NOT NULL,
+            balance REAL,
+            PRIMARY KEY (snapshot_date, account_id)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS asset_snapshots_items_delete AFTER DELETE ON asset_snapshots BEGIN
+            DELETE FROM snapshot_items WHERE snapshot_date = old.snapshot_date;
+        END
+    ''')
+
+    # 旧快照的 details 按账户名称记录，名称唯一的账户才能对应到账户ID；
+    # details 列原样保留，无法对应的账户（重名、已删除）仍可从中查到
+    account_ids = {}
+    for row in conn.execute('SELECT name, MIN(id) FROM accounts GROUP BY name HAVING COUNT(*) = 1'):
+        account_ids[row[0]] = row[1]
+
+    previous = None
+    keyframe_date = None
+    # 由交易记录补齐的快照没有账户明细，只保留总额，不写入明细也不作为增量的基准
+    for snapshot_date, details in conn.execute(
+            'SELECT snapshot_date, details FROM asset_snapshots WHERE details IS NOT NULL '
+            'ORDER BY snapshot_date').fetchall():
+        balances = {}
+        for item in json.loads(details):
+            if item.get('name') in account_ids:
+                balances[account_ids[item['name']]] = item['balance']
+
+        day = date.fromisoformat(snapshot_date[:10])
+        is_keyframe = keyframe_date is None or (day - keyframe_date).days >= SNAPSHOT_KEYFRAME_INTERVAL
+        if is_keyframe:
+            keyframe_date = day
+            items = list(balances.items())
+        else:
+            items = [(aid, balance) for aid, balance in balances.items() if previous.get(aid) != balance]
+            items += [(aid, None) for aid in previous if aid not in balances]
+        conn.executemany('INSERT INTO snapshot_items (snapshot_date, account_id, balance) VALUES (?, ?, ?)',
+                         [(snapshot_date, aid, balance) for aid, balance in items])
+        conn.execute('UPDATE asset_snapshots SET is_keyframe = ? WHERE snapshot_date = ?',
+                     (int(is_keyframe), snapshot_date))
+        previous = balances
+
+
+@migration(11, '账户日终余额索引')
+def _account_daily_balances(conn):
+    # 每个账户每个有交易的日期一行日终余额，day 为空串的行保存第一笔交易之前的期初余额
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS account_daily_balances (
+            account_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            balance REAL NOT NULL,
+            PRIMARY KEY (account_id, day)
+        ) WITHOUT ROWID
+    ''')
+
+    # 以账户当前余额为终点倒推，与 balance_service.recompute_balances() 的口径一致
+    delta = "CASE t.type WHEN '收入' THEN t.amount WHEN '支出' THEN -t.amount ELSE 0 END"
+    conn.execute(f'''
+        INSERT OR REPLACE INTO account_daily_balances (account_id, day, balance)
+        SELECT account_id, day, balance FROM (
+            SELECT
+                t.account_id,
+                substr(t.date, 1, 10) as day,
+                a.balance - COALESCE(SUM({delta}) OVER (
+                    PARTITION BY t.account_id ORDER BY t.date DESC, t.id DESC
+                    ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+                ), 0) as balance,
+                LAG(substr(t.date, 1, 10)) OVER (
+                    PARTITION BY t.account_id ORDER BY t.date DESC, t.id DESC
+                ) as next_day
+            FROM transactions t
+            JOIN accounts a ON a.id = t.account_id
+        )
+        WHERE next_day IS NOT day
+    ''')
+    conn.execute(f'''
+        INSERT OR REPLACE INTO account_daily_balances (account_id, day, balance)
+        SELECT a.id, '', a.balance - COALESCE(
+            (SELECT SUM({delta}) FROM transactions t WHERE t.account_id = a.id), 0)
+        FROM accounts a
+    ''')
+
+
+@migration(12, '按表记录数据版本号')
+def _data_versions(conn):
+    # 每次写入使对应表的版本号加一，缓存键带上依赖表的版本号即可在数据变化后自动失效
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS data_versions (
+            table_name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    for table in ('accounts', 'categories', 'transactions', 'asset_snapshots'):
+        conn.execute('INSERT OR IGNORE INTO data_versions (table_name, version) VALUES (?, 0)', (table,))
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            conn.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_version_{event.lower()} AFTER {event} ON {table} BEGIN
+                    UPDATE data_versions SET version = version + 1 WHERE table_name = '{table}';
+                END
+            ''')
+
+
+@migration(13, '交易变动时标记快照过期而不是删除')
+def _snapshot_stale_marker(conn):
+    # 手动创建的快照记录的是当时的实际余额，无法由交易记录重建，重建时保持不变
+    # 只有手动创建快照的接口写入 is_manual = 1；此前交易变动时快照会被整体删除重建，
+    # 已有快照都视为可重建的自动快照
+    conn.execute('ALTER TABLE asset_snapshots ADD COLUMN is_manual INTEGER NOT NULL DEFAULT 0')
+
+    # stale_from 之后（含）的自动快照已不准确，由定时任务原地重建后推进；每笔交易只改这一行
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS snapshot_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            stale_from TEXT
+        )
+    ''')
+    conn.execute('INSERT OR IGNORE INTO snapshot_state (id, stale_from) VALUES (1, NULL)')
+
+    mark = '''
+        UPDATE snapshot_state SET stale_from = substr({date}, 1, 10)
+        WHERE id = 1 AND (stale_from IS NULL OR stale_from > substr({date}, 1, 10));
+    '''
+    for event in ('insert', 'delete', 'update'):
+        conn.execute(f'DROP TRIGGER IF EXISTS transactions_snapshot_{event}')
+    conn.execute(f'''
+        CREATE TRIGGER transactions_snapshot_insert AFTER INSERT ON transactions
+        WHEN new.type IN ('收入', '支出') BEGIN
+            {mark.format(date='new.date')}
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER transactions_snapshot_delete AFTER DELETE ON transactions
+        WHEN old.type IN ('收入', '支出') BEGIN
+            {mark.format(date='old.date')}
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER transactions_snapshot_update
+        AFTER UPDATE OF date, account_id, type, amount ON transactions BEGIN
+            {mark.format(date='MIN(old.date, new.date)')}
+        END
+    ''')
+
+
+@migration(14, '两个字符搜索词的二元组索引')
+def _transaction_bigram_index(conn):
+    # trigram 全文索引无法匹配两个字符的词（如"外卖"），另建 (二元组, 交易) 索引；
+    # 二元组按 lower() 保存，与 LIKE 一样只对 ASCII 字母不区分大小写
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS transaction_bigrams (
+            gram TEXT NOT NULL,
+            transaction_id INTEGER NOT NULL,
+            PRIMARY KEY (gram, transaction_id)
+        ) WITHOUT ROWID
+    ''')
+    # 触发器中不能使用递归 CTE，用位置表拆分文本；超过 1000 个字符的文本只索引前 1000 个字符，
+    # 并额外记录空二元组，搜索时这些交易总是作为候选行再由 LIKE 过滤
+    conn.execute('CREATE TABLE IF NOT EXISTS search_positions (n INTEGER PRIMARY KEY)')
+    conn.execute('''
+        INSERT OR IGNORE INTO search_positions (n)
+        WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < 999)
+        SELECT n FROM seq
+    ''')
+
+    def grams(row):
+        return f'''
+            SELECT lower(substr(v.text, p.n, 2)) AS gram, {row}.id AS transaction_id
+            FROM (SELECT {row}.description AS text UNION ALL SELECT {row}.note
+                  UNION ALL SELECT {row}.category) v
+            JOIN search_positions p ON p.n < length(v.text)
+            UNION ALL
+            SELECT '', {row}.id
+            WHERE max(length(COALESCE({row}.description, '')), length(COALESCE({row}.note, '')),
+                      length(COALESCE({row}.category, ''))) > 1000
+        '''
+
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS transaction_bigrams_insert AFTER INSERT ON transactions BEGIN
+            INSERT OR IGNORE INTO transaction_bigrams (gram, transaction_id) {grams('new')};
+        END
+    ''')
+    delete = f'''
+        DELETE FROM transaction_bigrams
+        WHERE transaction_id = old.id AND gram IN (SELECT gram FROM ({grams('old')}));
+    '''
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS transaction_bigrams_delete AFTER DELETE ON transactions BEGIN
+            {delete}
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS transaction_bigrams_update
+        AFTER UPDATE OF description, note, category ON transactions BEGIN
+            {delete}
+            INSERT OR IGNORE INTO transaction_bigrams (gram, transaction_id) {grams('new')};
+        END
+    ''')
+
+    # 为已有交易建立索引
+    conn.execute('''
+        INSERT OR IGNORE INTO transaction_bigrams (gram, transaction_id)
+        SELECT lower(substr(v.text, p.n, 2)), v.id
+        FROM (SELECT id, description AS text FROM transactions UNION ALL SELECT id, note FROM transactions
+              UNION ALL SELECT id, category FROM transactions) v
+        JOIN search_positions p ON p.n < length(v.text)
+        UNION ALL
+        SELECT '', id FROM transactions
+        WHERE max(length(COALESCE(description, '')), length(COALESCE(note, '')),
+                  length(COALESCE(category, ''))) > 1000
+    ''')
+
+
+@migration(15, '交易修改计数')
+def _ledger_modification_count(conn):
+    # 新增交易可以按 id 追加到进程内的交易缓存，修改与删除只能重新加载；
+    # 单独计数缓存所保存字段的修改，其他进程的修改同样能被发现，余额等字段的更新不计入
+    conn.execute('ALTER TABLE ledger_stats ADD COLUMN modification_count INTEGER NOT NULL DEFAULT 0')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS transactions_modification_update
+        AFTER UPDATE OF id, date, account_id, type, category, amount ON transactions BEGIN
+            UPDATE ledger_stats SET modification_count = modification_count + 1 WHERE id = 1;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS transactions_modification_delete AFTER DELETE ON transactions BEGIN
+            UPDATE ledger_stats SET modification_count = modification_count + 1 WHERE id = 1;
+        END
+    ''')
+
+
+@migration(16, '按交易类型翻页的复合索引')
+def _transaction_type_index(conn):
+    # list_transactions(transaction_type=...) 按 (date, id) 倒序翻页，
+    # 否则按日期索引倒序扫描并逐行过滤类型，类型少见时会读完整张表
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_transactions_type_date ON transactions(type, date, id)')
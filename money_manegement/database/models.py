@@ -63,8 +63,9 @@ class AssetSnapshot:
     total_liquid: float = 0.0
     total_investment: float = 0.0
     total_fixed: float = 0.0
-    details: Optional[str] = None  # JSON格式
+    details: Optional[str] = None  # 旧版JSON明细，账户余额已改存 snapshot_items
     created_at: Optional[datetime] = None
+    is_keyframe: bool = False  # snapshot_items 中是否保存了全部账户
 
 
 @dataclass
@@ -0,0 +1,93 @@
+# database/snapshot_items.py
+"""
+快照账户明细的存储格式
+各账户余额保存在 snapshot_items：关键帧保存全部账户，其余快照只保存相对上一个快照
+变化的账户（余额为 NULL 表示账户不再计入）；读取时从最近的关键帧起逐个账户取最后一次记录的余额。
+在已有快照之间插入或重写快照时，其后的第一个增量快照按新的基准重写
+"""
+
+from datetime import date
+
+from config import SNAPSHOT_KEYFRAME_INTERVAL
+
+
+def load_snapshot_state(conn, snapshot_date):
+    """
+    还原不晚于 snapshot_date 的最近一个快照中各账户的余额
+    从最近的关键帧起，每个账户取最后一次记录的余额
+    :return: {账户ID: 余额}，没有快照时为空
+    """
+    keyframe_date = conn.execute('''
+        SELECT MAX(snapshot_date) FROM asset_snapshots
+        WHERE is_keyframe = 1 AND snapshot_date <= ?
+    ''', (snapshot_date,)).fetchone()[0]
+    if keyframe_date is None:
+        return {}
+
+    # 聚合查询中与 MAX() 同行的裸列取最后一次记录的余额
+    rows = conn.execute('''
+        SELECT account_id, balance, MAX(snapshot_date)
+        FROM snapshot_items
+        WHERE snapshot_date BETWEEN ? AND ?
+        GROUP BY account_id
+    ''', (keyframe_date, snapshot_date))
+    return {row[0]: row[1] for row in rows if row[1] is not None}
+
+
+def diff_items(base, balances):
+    """balances 相对 base 变化的账户 [(账户ID, 余额)]，base 中有而 balances 中没有的账户余额为 None"""
+    items = [(aid, balance) for aid, balance in balances.items() if base.get(aid) != balance]
+    items += [(aid, None) for aid in base if aid not in balances]
+    return items
+
+
+def is_keyframe_due(day, keyframe_date):
+    return keyframe_date is None or (day - date.fromisoformat(keyframe_date)).days >= SNAPSHOT_KEYFRAME_INTERVAL
+
+
+def write_items(conn, snapshot_date, is_keyframe, items):
+    conn.execute('DELETE FROM snapshot_items WHERE snapshot_date = ?', (snapshot_date,))
+    conn.executemany('INSERT INTO snapshot_items (snapshot_date, account_id, balance) VALUES (?, ?, ?)',
+                     [(snapshot_date, aid, balance) for aid, balance in items])
+    conn.execute('UPDATE asset_snapshots SET is_keyframe = ? WHERE snapshot_date = ?',
+                 (int(is_keyframe), snapshot_date))
+
+
+def rebase_next(conn, snapshot_date, balances):
+    """
+    snapshot_date 之后的第一个快照若是增量快照，其基准变为 balances，按新基准重写增量
+    须在 snapshot_date 的明细写入之前读取其原有余额，返回稍后执行的写入函数
+    """
+    row = conn.execute('''
+        SELECT snapshot_date, is_keyframe FROM asset_snapshots
+        WHERE snapshot_date > ? ORDER BY snapshot_date LIMIT 1
+    ''', (snapshot_date,)).fetchone()
+    if row is None or row[1]:
+        return lambda: None
+    next_state = load_snapshot_state(conn, row[0])
+    return lambda: write_items(conn, row[0], False, diff_items(balances, next_state))
+
+
+def save_snapshot_items(conn, snapshot_date, balances):
+    """
+    在调用方的事务中写入一个快照的账户明细，asset_snapshots 中须已有该日期的快照
+    :param balances: {账户ID: 余额}
+    """
+    balances = {aid: round(balance, 2) for aid, balance in balances.items()}
+    rebase = rebase_next(conn, snapshot_date, balances)
+
+    keyframe_date = conn.execute('''
+        SELECT MAX(snapshot_date) FROM asset_snapshots
+        WHERE is_keyframe = 1 AND snapshot_date < ?
+    ''', (snapshot_date,)).fetchone()[0]
+    is_keyframe = is_keyframe_due(date.fromisoformat(snapshot_date), keyframe_date)
+    if is_keyframe:
+        items = list(balances.items())
+    else:
+        previous_date = conn.execute(
+            'SELECT MAX(snapshot_date) FROM asset_snapshots WHERE snapshot_date < ?', (snapshot_date,)
+        ).fetchone()[0]
+        items = diff_items(load_snapshot_state(conn, previous_date), balances)
+
+    write_items(conn, snapshot_date, is_keyframe, items)
+    rebase()
\ No newline at end of file
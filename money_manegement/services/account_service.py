@@ -1,5 +1,6 @@
 # services/account_service.py
 from database.database import get_db_connection
+from services.balance_service import recompute_balances
 from datetime import datetime
 
 
@@ -79,12 +80,16 @@ def update_account(account_id, name, category_id, balance,
                    platform=None, account_number=None, description=None):
     """更新账户信息"""
     conn = get_db_connection()
+    old = conn.execute('SELECT balance FROM accounts WHERE id = ?', (account_id,)).fetchone()
     conn.execute('''
         UPDATE accounts 
         SET name = ?, category_id = ?, balance = ?, platform = ?, 
             account_number = ?, description = ?, updated_at = CURRENT_TIMESTAMP
         WHERE id = ?
     ''', (name, category_id, balance, platform, account_number, description, account_id))
+    # 手工校正余额后，该账户全部交易的 balance_after 都以新余额为终点
+    if old is not None and old['balance'] != balance:
+        recompute_balances(conn, account_id)
     conn.commit()
     conn.close()
 
@@ -97,6 +102,7 @@ def update_account_balance(account_id, new_balance):
         SET balance = ?, updated_at = CURRENT_TIMESTAMP
         WHERE id = ?
     ''', (new_balance, account_id))
+    recompute_balances(conn, account_id)
     conn.commit()
     conn.close()
 
@@ -129,22 +135,25 @@ def delete_account(account_id):
 def get_accounts_by_type():
     """按类型分组获取账户"""
     conn = get_db_connection()
-    result = {}
-
     types = ['流动资产', '投资资产', '固定资产', '其他资产']
-    for asset_type in types:
-        accounts = conn.execute('''
-            SELECT 
-                a.*,
-                c.name as category_name,
-                c.icon as category_icon,
-                c.color as category_color
-            FROM accounts a
-            JOIN categories c ON a.category_id = c.id
-            WHERE c.type = ? AND a.is_active = 1
-            ORDER BY a.balance DESC
-        ''', (asset_type,)).fetchall()
-        result[asset_type] = accounts
+    result = {asset_type: [] for asset_type in types}
+
+    # 一次查询取出所有启用账户，按余额顺序分到各类型下
+    accounts = conn.execute('''
+        SELECT 
+            a.*,
+            c.type as category_type,
+            c.name as category_name,
+            c.icon as category_icon,
+            c.color as category_color
+        FROM accounts a
+        JOIN categories c ON a.category_id = c.id
+        WHERE a.is_active = 1
+        ORDER BY a.balance DESC
+    ''').fetchall()
+    for account in accounts:
+        if account['category_type'] in result:
+            result[account['category_type']].append(account)
 
     conn.close()
     return result
@@ -154,14 +163,19 @@ def get_platform_summary():
     """获取各平台资产汇总"""
     conn = get_db_connection()
     summary = conn.execute('''
-        SELECT 
-            COALESCE(platform, '未分类') as platform,
-            COUNT(*) as account_count,
-            SUM(balance) as total_balance
-        FROM accounts
-        WHERE is_active = 1
-        GROUP BY platform
+        SELECT platform, account_count, total_balance
+        FROM platform_summary
+        WHERE account_count > 0
         ORDER BY total_balance DESC
     ''').fetchall()
     conn.close()
-    return summary
\ No newline at end of file
+    return summary
+
+
+class AccountService:
+    """账户服务的对象接口，供图表服务使用，方法委托给本模块的函数"""
+
+    list_accounts = staticmethod(list_accounts)
+    get_account = staticmethod(get_account)
+    get_accounts_by_type = staticmethod(get_accounts_by_type)
+    get_platform_summary = staticmethod(get_platform_summary)
\ No newline at end of file
@@ -1,21 +1,83 @@
 # services/analytics_service.py
 from database.database import get_db_connection
 from database.models import AssetSummary
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import json
 
-
+import numpy as np
+
+from services.data_version import versioned_cache
+from services.ledger_cache import ledger_cache, day_ordinal
+from utils.downsample import MAX_POINTS, downsample_series, validate_resolution
+
+ASSET_TYPES = ('流动资产', '投资资产', '固定资产', '其他资产')
+# 趋势数据中各资产类型对应的字段名
+TREND_KEYS = ('liquid', 'investment', 'fixed', 'other')
+
+
+def split_period(start_date, end_date):
+    """
+    把日期区间拆成整月部分和首尾不足一月的部分
+    :return: ((首个整月, 末个整月) 或 None, [(起始日, 结束日), ...])
+    """
+    start = date.fromisoformat(start_date)
+    end = date.fromisoformat(end_date)
+    if start > end:
+        return None, []
+
+    first_full = start if start.day == 1 else (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    next_month = (end.replace(day=28) + timedelta(days=4)).replace(day=1)
+    last_full_end = end if end + timedelta(days=1) == next_month else end.replace(day=1) - timedelta(days=1)
+
+    if first_full > last_full_end:
+        return None, [(start_date, end_date)]
+
+    day_ranges = []
+    if start < first_full:
+        day_ranges.append((start_date, (first_full - timedelta(days=1)).isoformat()))
+    if last_full_end < end:
+        day_ranges.append(((last_full_end + timedelta(days=1)).isoformat(), end_date))
+    return (first_full.strftime('%Y-%m'), last_full_end.strftime('%Y-%m')), day_ranges
+
+
+def rollup_totals(conn, start_date, end_date, group_by=('type',)):
+    """
+    从按月/按日汇总表读取区间内的收支合计
+    整月部分读月汇总，首尾不足一月的部分读日汇总，读取的行数与区间长度基本无关
+    :param group_by: 分组列，可选 type / category / account_id
+    :return: 每组一行，包含分组列以及 total、count
+    """
+    months, day_ranges = split_period(start_date, end_date)
+    columns = ', '.join(group_by)
+    parts, params = [], []
+    if months:
+        parts.append(f'SELECT {columns}, total, count FROM transaction_monthly WHERE month BETWEEN ? AND ?')
+        params.extend(months)
+    for day_range in day_ranges:
+        parts.append(f'SELECT {columns}, total, count FROM transaction_daily WHERE day BETWEEN ? AND ?')
+        params.extend(day_range)
+    if not parts:
+        return []
+
+    return conn.execute(f'''
+        SELECT {columns}, SUM(total) as total, SUM(count) as count
+        FROM ({' UNION ALL '.join(parts)})
+        GROUP BY {columns}
+    ''', params).fetchall()
+
+
+@versioned_cache('accounts', 'categories', 'transactions')
 def get_asset_summary():
-    """获取资产汇总信息"""
+    """获取资产汇总信息（读取触发器维护的汇总表，与账户和交易数量无关）"""
     conn = get_db_connection()
 
     # 获取各类资产总额
     type_totals = conn.execute('''
         SELECT 
             c.type,
-            COALESCE(SUM(a.balance), 0) as total
+            COALESCE(SUM(s.total_balance), 0) as total
         FROM categories c
-        LEFT JOIN accounts a ON c.id = a.category_id AND a.is_active = 1
+        LEFT JOIN category_summary s ON s.category_id = c.id
         GROUP BY c.type
     ''').fetchall()
 
@@ -23,10 +85,8 @@ def get_asset_summary():
 
     # 获取账户和交易数量
     counts = conn.execute('''
-        SELECT 
-            (SELECT COUNT(*) FROM accounts WHERE is_active = 1) as account_count,
-            (SELECT COUNT(*) FROM transactions) as transaction_count,
-            (SELECT MAX(updated_at) FROM accounts) as last_update
+        SELECT account_count, transaction_count, last_update
+        FROM ledger_stats WHERE id = 1
     ''').fetchone()
 
     conn.close()
@@ -43,6 +103,7 @@ def get_asset_summary():
     )
 
 
+@versioned_cache('accounts', 'categories')
 def get_asset_distribution():
     """获取资产分布数据"""
     conn = get_db_connection()
@@ -51,11 +112,11 @@ def get_asset_distribution():
     by_type = conn.execute('''
         SELECT 
             c.type,
-            SUM(a.balance) as total,
-            COUNT(a.id) as count
-        FROM accounts a
-        JOIN categories c ON a.category_id = c.id
-        WHERE a.is_active = 1
+            SUM(s.total_balance) as total,
+            SUM(s.account_count) as count
+        FROM category_summary s
+        JOIN categories c ON s.category_id = c.id
+        WHERE s.account_count > 0
         GROUP BY c.type
         ORDER BY total DESC
     ''').fetchall()
@@ -67,24 +128,22 @@ def get_asset_distribution():
             c.type,
             c.icon,
             c.color,
-            SUM(a.balance) as total,
-            COUNT(a.id) as count
-        FROM accounts a
-        JOIN categories c ON a.category_id = c.id
-        WHERE a.is_active = 1
-        GROUP BY c.id
+            s.total_balance as total,
+            s.account_count as count
+        FROM category_summary s
+        JOIN categories c ON s.category_id = c.id
+        WHERE s.account_count > 0
         ORDER BY total DESC
     ''').fetchall()
 
     # 按平台分布
     by_platform = conn.execute('''
         SELECT 
-            COALESCE(platform, '未分类') as platform,
-            SUM(balance) as total,
-            COUNT(*) as count
-        FROM accounts
-        WHERE is_active = 1
-        GROUP BY platform
+            platform,
+            total_balance as total,
+            account_count as count
+        FROM platform_summary
+        WHERE account_count > 0
         ORDER BY total DESC
     ''').fetchall()
 
@@ -97,8 +156,13 @@ def get_asset_distribution():
     }
 
 
-def get_income_expense_summary(start_date=None, end_date=None):
-    """获取收支汇总"""
+@versioned_cache('transactions')
+def get_income_expense_summary(start_date=None, end_date=None, resolution='auto'):
+    """
+    获取收支汇总
+    :param resolution: daily 的分辨率，见 utils.downsample.RESOLUTIONS
+    """
+    resolution = validate_resolution(resolution)
     conn = get_db_connection()
 
     # 默认获取最近30天
@@ -107,155 +171,287 @@ def get_income_expense_summary(start_date=None, end_date=None):
     if not start_date:
         start_date = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
 
-    # 总收支
-    summary = conn.execute('''
-        SELECT 
-            type,
-            SUM(amount) as total,
-            COUNT(*) as count
-        FROM transactions
-        WHERE date BETWEEN ? AND ?
-        GROUP BY type
-    ''', (start_date, end_date)).fetchall()
+    # 列式缓存可用时直接在内存中分组
+    columns = ledger_cache.columns(conn)
+    if columns is not None:
+        conn.close()
+        result = _income_expense_from_columns(columns, start_date, end_date)
+        result['daily'] = downsample_daily(result['daily'], resolution)
+        return result
 
-    # 按日期分组的收支
+    # 按日期分组的收支（读日汇总表，每天的行数只与账户和分类数有关）
     daily = conn.execute('''
         SELECT 
-            date,
+            day as date,
             type,
-            SUM(amount) as total
-        FROM transactions
-        WHERE date BETWEEN ? AND ?
-        GROUP BY date, type
-        ORDER BY date
-    ''', (start_date, end_date)).fetchall()
-
-    # 按分类分组的收支
-    by_category = conn.execute('''
-        SELECT 
-            category,
-            type,
-            SUM(amount) as total,
-            COUNT(*) as count
-        FROM transactions
-        WHERE date BETWEEN ? AND ? AND category IS NOT NULL
-        GROUP BY category, type
-        ORDER BY total DESC
+            SUM(total) as total
+        FROM transaction_daily
+        WHERE day BETWEEN ? AND ?
+        GROUP BY day, type
+        ORDER BY day, type
     ''', (start_date, end_date)).fetchall()
 
+    # 总收支与分类收支：整月读月汇总，首尾零散日期读日汇总
+    by_type_category = rollup_totals(conn, start_date, end_date, ('type', 'category'))
     conn.close()
 
+    summary, by_category = _summarize_categories(
+        (row['type'], row['category'], row['total'], row['count']) for row in by_type_category)
+
     return {
-        'summary': {row['type']: {'total': row['total'], 'count': row['count']}
-                    for row in summary},
-        'daily': [dict(row) for row in daily],
-        'by_category': [dict(row) for row in by_category]
+        'summary': summary,
+        'daily': downsample_daily([dict(row) for row in daily], resolution),
+        'by_category': by_category
     }
 
 
-def get_asset_trend(days=30):
-    """获取资产趋势数据"""
-    conn = get_db_connection()
+def _summarize_categories(rows):
+    """
+    把 (类型, 分类, 合计, 笔数) 汇总为按类型的合计与按分类的列表
+    分类为空的交易归入"未分类"，与按分类图表一致，保证分类合计与类型合计相符
+    """
+    summary = {}
+    categories = {}
+    for ttype, category, total, count in rows:
+        item = summary.setdefault(ttype, {'total': 0, 'count': 0})
+        item['total'] += total
+        item['count'] += count
+        key = (category or '未分类', ttype)
+        item = categories.setdefault(key, {'category': key[0], 'type': ttype, 'total': 0, 'count': 0})
+        item['total'] += total
+        item['count'] += count
+    by_category = sorted(categories.values(), key=lambda item: item['total'], reverse=True)
+    return summary, by_category
+
+
+def downsample_daily(daily, resolution):
+    """
+    按类型分别对每日收支降采样，各类型独立选点以保留各自的峰值
+    :param daily: [{date, type, total}]，按日期升序
+    """
+    if resolution == 'day' or (resolution == 'auto' and len(daily) <= MAX_POINTS):
+        return daily
+
+    by_type = {}
+    for item in daily:
+        by_type.setdefault(item['type'], []).append(item)
+
+    result = []
+    for ttype, items in by_type.items():
+        dates, values = downsample_series([item['date'] for item in items],
+                                          {'total': [item['total'] for item in items]}, resolution)
+        result.extend({'date': day, 'type': ttype, 'total': total}
+                      for day, total in zip(dates, values['total']))
+    result.sort(key=lambda item: (item['date'], item['type']))
+    return result
 
-    # 获取最近的快照数据
-    snapshots = conn.execute('''
-        SELECT * FROM asset_snapshots
-        WHERE snapshot_date >= date('now', '-' || ? || ' days')
-        ORDER BY snapshot_date
-    ''', (days,)).fetchall()
 
-    # 如果快照数据不足，通过交易记录推算
-    if len(snapshots) < days / 7:  # 假设每周至少一个快照
-        trend_data = calculate_trend_from_transactions(conn, days)
-    else:
-        trend_data = [
-            {
-                'date': s['snapshot_date'],
-                'total_assets': s['total_assets'],
-                'liquid': s['total_liquid'],
-                'investment': s['total_investment'],
-                'fixed': s['total_fixed']
-            }
-            for s in snapshots
-        ]
+def _income_expense_from_columns(columns, start_date, end_date):
+    """get_income_expense_summary() 的列式缓存实现，返回格式相同"""
+    mask = columns.between(start_date, end_date)
+
+    (days, types), totals, _ = columns.group_by(mask, 'day', 'type')
+    daily = [{'date': day, 'type': ttype, 'total': total}
+             for day, ttype, total in zip(columns.decode('day', days), columns.decode('type', types),
+                                          totals.tolist())]
+    daily.sort(key=lambda item: (item['date'], item['type']))
+
+    (types, categories), totals, counts = columns.group_by(mask, 'type', 'category')
+    summary, by_category = _summarize_categories(zip(columns.decode('type', types),
+                                                     columns.decode('category', categories),
+                                                     totals.tolist(), counts.tolist()))
+
+    return {
+        'summary': summary,
+        'daily': daily,
+        'by_category': by_category
+    }
 
-    # 如果还是没有数据，生成模拟数据
-    if not trend_data:
-        current_total = get_asset_summary().total_assets
-        trend_data = []
-        for i in range(days):
-            date = (datetime.now() - timedelta(days=days - i - 1)).strftime('%Y-%m-%d')
-            trend_data.append({
-                'date': date,
-                'total_assets': current_total
-            })
 
+@versioned_cache('accounts', 'categories', 'transactions', 'asset_snapshots')
+def get_asset_trend(days=30, end_date=None, resolution='auto'):
+    """
+    获取资产趋势数据
+    :param days: 截止日（含）往前的天数
+    :param end_date: 截止日，默认今天
+    :param resolution: 分辨率，按周/月聚合时取每个周期最后一天的余额
+    """
+    resolution = validate_resolution(resolution)
+    end = date.fromisoformat(end_date) if end_date else date.today()
+    start = end - timedelta(days=max(days, 1) - 1)
+    # 今天的余额仍在变化，只有昨天及以前的日期读快照
+    last_closed = min(end, date.today() - timedelta(days=1))
+
+    conn = get_db_connection()
+    # 历史交易变动后尚未重建的快照不可用，这部分日期按交易记录计算
+    stale_from = conn.execute('SELECT stale_from FROM snapshot_state WHERE id = 1').fetchone()
+    if stale_from and stale_from[0]:
+        last_closed = min(last_closed, date.fromisoformat(stale_from[0]) - timedelta(days=1))
+    trend_data = None
+    if start <= last_closed:
+        trend_data = read_snapshot_trend(conn, start.isoformat(), last_closed.isoformat())
+        # 快照不完整（尚未补齐）时整段按交易记录重建
+        if len(trend_data) != (last_closed - start).days + 1:
+            trend_data = None
+
+    if trend_data is None:
+        trend_data = calculate_trend_from_transactions(conn, start.isoformat(), end.isoformat())
+    elif last_closed < end:
+        trend_data += calculate_trend_from_transactions(
+            conn, (last_closed + timedelta(days=1)).isoformat(), end.isoformat())
     conn.close()
-    return trend_data
+    return downsample_trend(trend_data, resolution)
 
 
-def calculate_trend_from_transactions(conn, days):
-    """通过交易记录计算资产趋势"""
-    end_date = datetime.now()
-    start_date = end_date - timedelta(days=days)
+def downsample_trend(trend_data, resolution):
+    """对资产趋势降采样，所有资产类型取相同的日期，按总资产选点"""
+    if resolution == 'day' or (resolution == 'auto' and len(trend_data) <= MAX_POINTS):
+        return trend_data
 
-    # 获取当前余额
-    current_balances = conn.execute('''
-        SELECT 
-            a.id,
-            a.balance,
-            c.type
-        FROM accounts a
-        JOIN categories c ON a.category_id = c.id
-        WHERE a.is_active = 1
-    ''').fetchall()
+    keys = ('total_assets',) + TREND_KEYS
+    dates, values = downsample_series([item['date'] for item in trend_data],
+                                      {key: [item[key] for item in trend_data] for key in keys},
+                                      resolution, how='last', key='total_assets')
+    return [dict(date=day, **{key: values[key][i] for key in keys}) for i, day in enumerate(dates)]
 
-    # 获取期间内的所有交易
-    transactions = conn.execute('''
-        SELECT 
-            t.*,
-            c.type as category_type
-        FROM transactions t
-        JOIN accounts a ON t.account_id = a.id
-        JOIN categories c ON a.category_id = c.id
-        WHERE t.date >= ?
-        ORDER BY t.date DESC
-    ''', (start_date.strftime('%Y-%m-%d'),)).fetchall()
 
-    # 反向计算每日余额
-    trend_data = []
-    current_date = end_date
+def read_snapshot_trend(conn, start_date, end_date):
+    """按 snapshot_date 唯一索引区间读取快照，返回格式同 calculate_trend_from_transactions()"""
+    rows = conn.execute('''
+        SELECT snapshot_date, total_assets, total_liquid, total_investment, total_fixed
+        FROM asset_snapshots
+        WHERE snapshot_date BETWEEN ? AND ?
+        ORDER BY snapshot_date
+    ''', (start_date, end_date)).fetchall()
 
-    while current_date >= start_date:
-        date_str = current_date.strftime('%Y-%m-%d')
-        # 简化处理，使用当前余额
-        total = sum(b['balance'] for b in current_balances)
+    trend_data = []
+    for row in rows:
+        other = row['total_assets'] - row['total_liquid'] - row['total_investment'] - row['total_fixed']
         trend_data.append({
-            'date': date_str,
-            'total_assets': total
+            'date': row['snapshot_date'],
+            'total_assets': row['total_assets'],
+            'liquid': row['total_liquid'],
+            'investment': row['total_investment'],
+            'fixed': row['total_fixed'],
+            'other': round(other, 2),
         })
-        current_date -= timedelta(days=1)
+    return trend_data
+
+
+def reconstruct_daily_balances(conn, start_date, end_date):
+    """
+    由账户当前余额倒推 [start_date, end_date] 内每天日终的各类资产余额
+    某天日终余额 = 当前余额 - 该天之后所有收支的余额变动；把按天汇总的变动
+    按 (天, 资产类型) 装桶后做一次后缀累加，即可得到整个区间的结果
+    :return: (日期数组 datetime64[D], 余额矩阵 shape=(天数, len(ASSET_TYPES)))
+    """
+    start = np.datetime64(start_date, 'D')
+    end = np.datetime64(end_date, 'D')
+    n_days = int((end - start) // np.timedelta64(1, 'D')) + 1
+    n_types = len(ASSET_TYPES)
+    dates = start + np.arange(n_days)
+
+    # 启用账户的当前余额及其资产类型
+    accounts = conn.execute('''
+        SELECT a.id, a.balance, c.type
+        FROM accounts a
+        JOIN categories c ON a.category_id = c.id
+        WHERE a.is_active = 1
+    ''').fetchall()
+    accounts = [row for row in accounts if row['type'] in ASSET_TYPES]
+    current = np.zeros(n_types)
+    if not accounts:
+        return dates, np.zeros((n_days, n_types))
+
+    type_lookup = np.full(max(row['id'] for row in accounts) + 1, -1, dtype=np.int64)
+    for row in accounts:
+        type_index = ASSET_TYPES.index(row['type'])
+        type_lookup[row['id']] = type_index
+        current[type_index] += row['balance']
+
+    # 区间起点之后的收支变动：列式缓存可用时直接过滤，否则读日汇总表
+    columns = ledger_cache.columns(conn)
+    if columns is not None:
+        mask = (columns.day > day_ordinal(start_date)) & columns.type_mask('收入', '支出')
+        day_index = columns.day[mask].astype(np.int64) - day_ordinal(start_date)
+        account_ids = columns.account[mask].astype(np.int64)
+        amounts = columns.signed_amount()[mask]
+    else:
+        # 每天每个账户的收支合计，按日汇总表主键顺序分组，无需排序
+        rows = conn.execute('''
+            SELECT day, account_id, SUM(CASE type WHEN '收入' THEN total ELSE -total END)
+            FROM transaction_daily
+            WHERE day > ? AND type IN ('收入', '支出')
+            GROUP BY day, type, account_id
+        ''', (start_date,)).fetchall()
+        days, account_ids, amounts = zip(*rows) if rows else ((), (), ())
+        day_index = (np.array(days, dtype='datetime64[D]') - start).astype(np.int64)
+        account_ids = np.array(account_ids, dtype=np.int64)
+        amounts = np.array(amounts, dtype=float)
+
+    # 第 n_days 个桶收集区间结束之后的变动
+    deltas = np.zeros((n_days + 1) * n_types)
+    if len(account_ids):
+        in_lookup = account_ids < len(type_lookup)
+        type_index = np.full(len(account_ids), -1, dtype=np.int64)
+        type_index[in_lookup] = type_lookup[account_ids[in_lookup]]
+
+        # 停用账户与未归类账户不计入资产
+        keep = type_index >= 0
+        bucket = np.minimum(day_index[keep], n_days) * n_types + type_index[keep]
+        deltas = np.bincount(bucket, weights=amounts[keep], minlength=(n_days + 1) * n_types)
+    deltas = deltas.reshape(n_days + 1, n_types)
+
+    # later[d] = 第 d 天之后的变动合计（后缀和去掉当天）
+    suffix = np.cumsum(deltas[::-1], axis=0)[::-1]
+    return dates, current - suffix[1:]
+
+
+def calculate_trend_from_transactions(conn, start_date, end_date):
+    """通过交易记录计算区间内每天的资产总额及各类资产余额"""
+    dates, balances = reconstruct_daily_balances(conn, start_date, end_date)
+    balances = np.round(balances, 2)
+    totals = np.round(balances.sum(axis=1), 2)
 
-    return list(reversed(trend_data))
+    trend_data = []
+    for day, total, row in zip(dates.astype(str).tolist(), totals.tolist(), balances.tolist()):
+        item = {'date': day, 'total_assets': total}
+        item.update(zip(TREND_KEYS, row))
+        trend_data.append(item)
+    return trend_data
 
 
+@versioned_cache('transactions')
 def get_monthly_statistics():
     """获取月度统计数据"""
     conn = get_db_connection()
 
-    # 最近12个月的收支统计
-    monthly_stats = conn.execute('''
-        SELECT 
-            strftime('%Y-%m', date) as month,
-            type,
-            SUM(amount) as total,
-            COUNT(*) as count,
-            AVG(amount) as average
-        FROM transactions
-        WHERE date >= date('now', '-12 months')
-        GROUP BY strftime('%Y-%m', date), type
-        ORDER BY month DESC
-    ''').fetchall()
+    columns = ledger_cache.columns(conn)
+    if columns is not None:
+        # 与SQL中 strftime('%Y-%m', 'now', '-11 months') 一致，按UTC计算
+        first_month = np.datetime64(datetime.utcnow().strftime('%Y-%m'), 'M') - 11
+        mask = columns.between(str(first_month.astype('datetime64[D]')))
+        (months, types), totals, counts = columns.group_by(mask, 'month', 'type')
+        monthly_stats = [
+            {'month': month, 'type': ttype, 'total': total, 'count': count}
+            for month, ttype, total, count in zip(columns.decode('month', months), columns.decode('type', types),
+                                                  totals.tolist(), counts.tolist())
+        ]
+        monthly_stats.sort(key=lambda row: row['month'], reverse=True)
+    else:
+        # 最近12个月的收支统计（读月汇总表）
+        monthly_stats = conn.execute('''
+            SELECT 
+                month,
+                type,
+                SUM(total) as total,
+                SUM(count) as count,
+                SUM(total) / SUM(count) as average
+            FROM transaction_monthly
+            WHERE month >= strftime('%Y-%m', 'now', '-11 months')
+            GROUP BY month, type
+            ORDER BY month DESC
+        ''').fetchall()
 
     # 按月份整理数据
     result = {}
@@ -277,6 +473,95 @@ def get_monthly_statistics():
     return result
 
 
+@versioned_cache('transactions')
+def get_rolling_cashflow(window=30, days=90, end_date=None):
+    """
+    截止日往前 days 天中每天之前 window 天（含当天）的收入、支出滚动合计
+    :return: [{date, income, expense, net}]
+    """
+    window = max(window, 1)
+    end = date.fromisoformat(end_date) if end_date else date.today()
+    start = end - timedelta(days=max(days, 1) - 1)
+    first = start - timedelta(days=window - 1)
+    n_days = (end - first).days + 1
+
+    conn = get_db_connection()
+    daily = {}
+    columns = ledger_cache.columns(conn)
+    if columns is not None:
+        mask = columns.between(first.isoformat(), end.isoformat())
+        for ttype in ('收入', '支出'):
+            selected = mask & columns.type_mask(ttype)
+            daily[ttype] = np.bincount(columns.day[selected] - day_ordinal(first.isoformat()),
+                                       weights=columns.amount[selected], minlength=n_days)
+    else:
+        for ttype in ('收入', '支出'):
+            daily[ttype] = np.zeros(n_days)
+        for row in conn.execute('''
+            SELECT day, type, SUM(total) as total
+            FROM transaction_daily
+            WHERE day BETWEEN ? AND ? AND type IN ('收入', '支出')
+            GROUP BY day, type
+        ''', (first.isoformat(), end.isoformat())):
+            daily[row['type']][(date.fromisoformat(row['day']) - first).days] = row['total']
+    conn.close()
+
+    def rolling(values):
+        sums = np.cumsum(values)
+        sums[window:] -= sums[:-window].copy()
+        return np.round(sums[window - 1:], 2)
+
+    income = rolling(daily['收入'])
+    expense = rolling(daily['支出'])
+    dates = (np.datetime64(start.isoformat(), 'D') + np.arange(len(income))).astype(str).tolist()
+    return [
+        {'date': day, 'income': inc, 'expense': exp, 'net': round(inc - exp, 2)}
+        for day, inc, exp in zip(dates, income.tolist(), expense.tolist())
+    ]
+
+
+def get_monthly_totals(months=6, end_month=None):
+    """
+    截止月（含）往前 months 个月每月的收入、支出合计（读月汇总表）
+    :param end_month: YYYY-MM，默认当月
+    :return: [{month, income, expense}]，按月份升序，没有交易的月份为0
+    """
+    last = np.datetime64(end_month or date.today().strftime('%Y-%m'), 'M')
+    month_list = (last - np.arange(max(months, 1) - 1, -1, -1)).astype(str).tolist()
+
+    conn = get_db_connection()
+    rows = conn.execute('''
+        SELECT month,
+               SUM(CASE WHEN type = '收入' THEN total ELSE 0 END) as income,
+               SUM(CASE WHEN type = '支出' THEN total ELSE 0 END) as expense
+        FROM transaction_monthly
+        WHERE month BETWEEN ? AND ? AND type IN ('收入', '支出')
+        GROUP BY month
+    ''', (month_list[0], month_list[-1])).fetchall()
+    conn.close()
+
+    totals = {row['month']: row for row in rows}
+    return [
+        {
+            'month': month,
+            'income': totals[month]['income'] if month in totals else 0,
+            'expense': totals[month]['expense'] if month in totals else 0,
+        }
+        for month in month_list
+    ]
+
+
+def get_month_income_expense(month):
+    """
+    某月的收入、支出合计
+    :param month: YYYY-MM
+    :return: {'total_income', 'total_expense'}
+    """
+    totals = get_monthly_totals(1, month)[0]
+    return {'total_income': totals['income'], 'total_expense': totals['expense']}
+
+
+@versioned_cache('accounts', 'categories', 'transactions')
 def calculate_financial_ratios():
     """计算财务比率"""
     summary = get_asset_summary()
@@ -320,4 +605,30 @@ def calculate_financial_ratios():
         'savings_rate': round(savings_rate, 2),
         'expense_ratio': round(expense_ratio, 2),
         'emergency_fund_months': round(emergency_fund_months, 1)
-    }
\ No newline at end of file
+    }
+
+
+class AnalyticsService:
+    """
+    分析服务的对象接口，供图表服务使用，方法委托给本模块的函数
+    应用只有一个用户，user_id 参数仅为接口兼容而保留
+    """
+
+    def get_asset_summary(self, user_id=None):
+        """资产汇总，以字典返回"""
+        summary = get_asset_summary()
+        return {
+            'total_assets': summary.total_assets,
+            'total_liquid': summary.total_liquid,
+            'total_investment': summary.total_investment,
+            'total_fixed': summary.total_fixed,
+            'total_other': summary.total_other,
+        }
+
+    def get_monthly_stats(self, user_id=None, months=6):
+        """最近 months 个月每月的收入、支出合计"""
+        return get_monthly_totals(months)
+
+    def get_monthly_income_expense(self, user_id, year, month):
+        """某年某月的收入、支出合计"""
+        return get_month_income_expense(f'{year:04d}-{month:02d}')
\ No newline at end of file
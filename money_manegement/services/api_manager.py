@@ -6,24 +6,29 @@ API管理器
 from flask import request, current_app
 from datetime import datetime
 from utils.api_response import APIResponse
+from utils.cache import create_cache
 from utils.chart_config import ChartConfig
+from services.chart_registry import ChartRegistry
 from services.chart_service import ChartService
+from services.data_version import version_key
+from config import CACHE_BACKEND, CACHE_PATH, CHART_CACHE_MAX_ENTRIES, CHART_CACHE_MAX_MB
 import functools
-import time
 
 
 class APIManager:
     """API管理器类，负责处理所有API请求"""
 
     def __init__(self):
-        self.chart_service = None
-        self._cache = {}
-        self._cache_timestamps = {}
+        # 启动时编译全部图表的执行计划，配置错误在此处抛出
+        self.chart_service = ChartService()
+        self.registry = ChartRegistry(self.chart_service)
+        self.warmer = None  # 由 services.chart_warmup.start_warmup() 设置
+        self.cache = create_cache(CACHE_BACKEND, CACHE_PATH, namespace='charts',
+                                  max_entries=CHART_CACHE_MAX_ENTRIES,
+                                  max_bytes=CHART_CACHE_MAX_MB * 1024 * 1024)
 
     def get_chart_service(self):
-        """延迟初始化图表服务"""
-        if not self.chart_service:
-            self.chart_service = ChartService()
+        """获取图表服务"""
         return self.chart_service
 
     def handle_chart_request(self, chart_name):
@@ -34,51 +39,33 @@ class APIManager:
         """
         try:
             # 验证图表类型
-            if not ChartConfig.is_valid_chart(chart_name):
+            plan = self.registry.get(chart_name)
+            if plan is None:
                 return APIResponse.error(
                     message=f"不支持的图表类型: {chart_name}",
                     code=404,
                     error_code="INVALID_CHART_TYPE"
                 )
 
-            # 获取图表配置
-            config = ChartConfig.get_config(chart_name)
-
-            # 构建参数
-            params = self._build_params(config)
-
-            # 检查缓存
-            cache_key = self._generate_cache_key(chart_name, params)
-            cached_data = self._get_cached_data(cache_key, config['cache_duration'])
-            if cached_data is not None:
-                return APIResponse.chart_data(
-                    chart_type=config['type'],
-                    data=cached_data,
-                    metadata={'from_cache': True}
+            # 按参数定义解析请求参数
+            try:
+                params = self._build_params(plan)
+            except ValueError as e:
+                return APIResponse.error(
+                    message=str(e),
+                    code=400,
+                    error_code="INVALID_CHART_PARAMS"
                 )
 
-            # 调用服务方法获取数据
-            service = self.get_chart_service()
-            method = getattr(service, config['service_method'])
-            data = method(**params)
-
-            # 缓存数据
-            self._cache_data(cache_key, data)
+            data, from_cache = self.compute_chart(chart_name, params)
 
             # 返回响应
             return APIResponse.chart_data(
-                chart_type=config['type'],
+                chart_type=plan.type,
                 data=data,
-                metadata={'from_cache': False}
+                metadata={'from_cache': from_cache}
             )
 
-        except AttributeError as e:
-            return APIResponse.error(
-                message="服务方法未实现",
-                code=500,
-                error_code="SERVICE_METHOD_NOT_FOUND",
-                details=str(e)
-            )
         except Exception as e:
             current_app.logger.error(f"图表数据请求失败: {str(e)}")
             return APIResponse.error(
@@ -88,22 +75,31 @@ class APIManager:
                 details=str(e) if current_app.debug else None
             )
 
-    def _build_params(self, config):
-        """构建请求参数"""
-        params = config['default_params'].copy()
-
-        # 从请求中获取参数
-        for key in params.keys():
-            if key in request.args:
-                # 类型转换
-                value = request.args.get(key)
-                if value.lower() in ['true', 'false']:
-                    params[key] = value.lower() == 'true'
-                elif value.isdigit():
-                    params[key] = int(value)
-                else:
-                    params[key] = value
-
+    def compute_chart(self, chart_name, params):
+        """
+        读取图表数据缓存，未命中时按执行计划计算
+        同一参数的并发请求只计算一次，其余等待其结果；缓存键包含依赖表的版本号，数据写入后自动失效
+        :return: (图表数据, 是否命中缓存)
+        """
+        plan = self.registry.get(chart_name)
+        versions = version_key(plan.depends_on)
+        return self.cache.get_or_compute(
+            self._generate_cache_key(chart_name, params, versions),
+            lambda: plan.execute(**params),
+            ttl=plan.cache_duration,
+            tag=chart_name
+        )
+
+    def default_params(self, chart_name):
+        """不带查询参数请求图表时使用的参数，预热时按此参数计算"""
+        return self._resolve_params(self.registry.get(chart_name).defaults)
+
+    def _build_params(self, plan):
+        """按图表的参数定义解析请求参数，类型或取值不合法时抛出 ValueError"""
+        return self._resolve_params(plan.parse(request.args))
+
+    def _resolve_params(self, params):
+        """填充运行时才能确定的参数"""
         # 特殊处理某些参数
         if 'month' in params and params['month'] is None:
             params['month'] = datetime.now().strftime('%Y-%m')
@@ -119,43 +115,32 @@ class APIManager:
         # 暂时返回默认值1
         return 1
 
-    def _generate_cache_key(self, chart_name, params):
+    def _generate_cache_key(self, chart_name, params, versions=()):
         """生成缓存键"""
-        param_str = "_".join(f"{k}={v}" for k, v in sorted(params.items()))
-        return f"{chart_name}_{param_str}"
-
-    def _get_cached_data(self, cache_key, duration):
-        """获取缓存数据"""
-        if cache_key in self._cache:
-            timestamp = self._cache_timestamps.get(cache_key, 0)
-            if time.time() - timestamp < duration:
-                return self._cache[cache_key]
-        return None
-
-    def _cache_data(self, cache_key, data):
-        """缓存数据"""
-        self._cache[cache_key] = data
-        self._cache_timestamps[cache_key] = time.time()
+        # 默认参数取当前日期的图表跨天后需要重新计算
+        return (chart_name, tuple(sorted(params.items())), datetime.now().strftime('%Y-%m-%d'), versions)
 
     def clear_cache(self, chart_name=None):
         """清除缓存"""
         if chart_name:
             # 清除特定图表的缓存
-            keys_to_remove = [k for k in self._cache.keys() if k.startswith(chart_name)]
-            for key in keys_to_remove:
-                del self._cache[key]
-                del self._cache_timestamps[key]
+            self.cache.invalidate_tag(chart_name)
         else:
             # 清除所有缓存
-            self._cache.clear()
-            self._cache_timestamps.clear()
+            self.cache.clear()
+
+    def get_cache_stats(self):
+        """获取缓存命中、淘汰等统计信息"""
+        return self.cache.stats()
 
     def get_api_info(self):
         """获取API信息"""
         charts = []
+        costs = self.registry.costs()
         for chart_name in ChartConfig.get_all_charts():
             info = ChartConfig.get_chart_info(chart_name)
             if info:
+                info['cost'] = costs.get(chart_name)
                 charts.append(info)
 
         return {
@@ -164,7 +149,9 @@ class APIManager:
                 'charts': '/api/charts/<chart_name>',
                 'api_info': '/api/info'
             },
-            'available_charts': charts
+            'available_charts': charts,
+            'cache': self.get_cache_stats(),
+            'warmup': self.warmer.stats() if self.warmer else None
         }
 
 
@@ -0,0 +1,215 @@
+# services/balance_service.py
+"""
+交易后余额（balance_after）重算
+以账户当前余额为终点倒推：某笔交易的 balance_after = 账户余额 - 其后所有交易的余额变动之和，
+"其后"按 (date, id) 顺序。任何写入之后，只需重算受影响账户中最早变动日期及之后的交易，
+更早的交易不受影响
+每个账户每天最后一笔交易的 balance_after 同步写入 account_daily_balances，
+按 (账户, 日期) 主键即可查询任意日期的余额
+
+用法: python -m services.balance_service [--account ID] [--check]
+"""
+
+import argparse
+from bisect import bisect_right
+from datetime import date
+
+from database.database import get_db_connection
+
+# 交易对余额的影响，与 transaction_service.balance_delta() 一致
+DELTA_SQL = "CASE type WHEN '收入' THEN amount WHEN '支出' THEN -amount ELSE 0 END"
+
+# 一次查询最多的日期数
+MAX_AS_OF_DATES = 1000
+
+
+def recompute_balances(conn, account_id, from_date=None):
+    """
+    在调用方的事务中重算一个账户自 from_date 所在日起的 balance_after，from_date 为空时重算整个账户
+    窗口函数沿 idx_transactions_account_date 倒序累加其后交易的变动，只改写值发生变化的行，
+    随后刷新该账户自 from_date 所在日起的日终余额
+    :return: 被改写的行数
+    """
+    balance = conn.execute('SELECT balance FROM accounts WHERE id = ?', (account_id,)).fetchone()
+    if balance is None:
+        return 0
+
+    # 不以 WITH 开头，cursor.rowcount 即本语句改写的行数，不含 data_versions 等触发器写入的行
+    changed = conn.execute(f'''
+        UPDATE transactions
+        SET balance_after = later.balance_after
+        FROM (
+            SELECT
+                id,
+                ? - COALESCE(SUM({DELTA_SQL}) OVER (
+                    ORDER BY date DESC, id DESC
+                    ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+                ), 0) as balance_after
+            FROM transactions
+            WHERE account_id = ? AND date >= ?
+        ) as later
+        WHERE transactions.id = later.id
+          AND transactions.balance_after IS NOT later.balance_after
+    ''', (balance[0], account_id, (from_date or '')[:10])).rowcount
+
+    refresh_daily_balances(conn, account_id, from_date)
+    return changed
+
+
+def refresh_daily_balances(conn, account_id, from_date=None):
+    """
+    在调用方的事务中重写账户自 from_date 所在日起的日终余额（取当天最后一笔交易的 balance_after），
+    并更新期初余额；from_date 为空时重写整个账户
+    """
+    from_day = (from_date or '')[:10]
+    conn.execute('DELETE FROM account_daily_balances WHERE account_id = ? AND day >= ?',
+                 (account_id, from_day))
+    # 按 (date, id) 顺序与下一笔交易比较日期，沿索引顺序读取，无需排序
+    conn.execute('''
+        INSERT INTO account_daily_balances (account_id, day, balance)
+        SELECT ?, day, balance_after FROM (
+            SELECT
+                substr(date, 1, 10) as day,
+                balance_after,
+                LEAD(substr(date, 1, 10)) OVER (ORDER BY date, id) as next_day
+            FROM transactions
+            WHERE account_id = ? AND date >= ?
+        )
+        WHERE next_day IS NOT day
+    ''', (account_id, account_id, from_day))
+
+    # 变动晚于第一笔交易时期初余额不变；没有交易时期初余额即账户余额
+    conn.execute(f'''
+        INSERT OR REPLACE INTO account_daily_balances (account_id, day, balance)
+        SELECT ?, '', COALESCE(
+            (SELECT balance_after - {DELTA_SQL} FROM transactions
+             WHERE account_id = ? ORDER BY date, id LIMIT 1),
+            (SELECT balance FROM accounts WHERE id = ?)
+        )
+        WHERE ? <= COALESCE((SELECT MIN(date) FROM transactions WHERE account_id = ?), '9999')
+    ''', (account_id, account_id, account_id, from_day, account_id))
+
+
+def _resolve_accounts(conn, account_ids):
+    """账户ID为空时取全部启用账户，返回 {账户ID: 当前余额}，不存在的账户忽略"""
+    if account_ids is None:
+        rows = conn.execute('SELECT id, balance FROM accounts WHERE is_active = 1 ORDER BY id')
+    else:
+        account_ids = list(account_ids)
+        if not account_ids:
+            return {}
+        placeholders = ','.join('?' * len(account_ids))
+        rows = conn.execute(f'SELECT id, balance FROM accounts WHERE id IN ({placeholders}) ORDER BY id',
+                            account_ids)
+    return {row['id']: row['balance'] for row in rows}
+
+
+def balance_as_of(account_ids=None, as_of_date=None):
+    """
+    查询账户在某天日终的余额，每个账户一次主键定位
+    :param account_ids: 账户ID列表，默认全部启用账户
+    :param as_of_date: YYYY-MM-DD，默认今天
+    :return: {'date', 'accounts': {账户ID: 余额}, 'total'}
+    """
+    day = date.fromisoformat(as_of_date).isoformat() if as_of_date else date.today().isoformat()
+
+    conn = get_db_connection()
+    accounts = _resolve_accounts(conn, account_ids)
+    balances = {}
+    for aid, current in accounts.items():
+        row = conn.execute('''
+            SELECT balance FROM account_daily_balances
+            WHERE account_id = ? AND day <= ?
+            ORDER BY day DESC LIMIT 1
+        ''', (aid, day)).fetchone()
+        # 从未有过交易的账户余额不变
+        balances[aid] = round(row[0] if row else current, 2)
+    conn.close()
+
+    return {'date': day, 'accounts': balances, 'total': round(sum(balances.values()), 2)}
+
+
+def balances_as_of_dates(account_ids=None, dates=()):
+    """
+    查询账户在多个日期日终的余额
+    每个账户读取一次覆盖全部日期的日终余额区间，再逐个日期二分查找
+    :return: {'dates': [...], 'accounts': {账户ID: [余额, ...]}, 'total': [...]}，顺序与 dates 一致
+    """
+    days = [date.fromisoformat(d).isoformat() for d in dates]
+    if not days:
+        raise ValueError("缺少查询日期")
+    if len(days) > MAX_AS_OF_DATES:
+        raise ValueError(f"一次最多查询 {MAX_AS_OF_DATES} 个日期")
+    first, last = min(days), max(days)
+
+    conn = get_db_connection()
+    accounts = _resolve_accounts(conn, account_ids)
+    result = {}
+    for aid, current in accounts.items():
+        start = conn.execute(
+            'SELECT MAX(day) FROM account_daily_balances WHERE account_id = ? AND day <= ?', (aid, first)
+        ).fetchone()[0]
+        rows = conn.execute('''
+            SELECT day, balance FROM account_daily_balances
+            WHERE account_id = ? AND day BETWEEN ? AND ?
+            ORDER BY day
+        ''', (aid, start or '', last)).fetchall()
+        keys = [row[0] for row in rows]
+
+        series = []
+        for day in days:
+            index = bisect_right(keys, day) - 1
+            series.append(round(rows[index][1] if index >= 0 else current, 2))
+        result[aid] = series
+    conn.close()
+
+    totals = [round(sum(column), 2) for column in zip(*result.values())] if result else [0] * len(days)
+    return {'dates': days, 'accounts': result, 'total': totals}
+
+
+def rebuild_all_balances(account_id=None, dry_run=False):
+    """
+    全量重算所有账户（或指定账户）的 balance_after，用于修复历史数据
+    :param dry_run: 只统计不一致的行数，不写入
+    :return: {账户ID: 不一致（已修复）的行数}，只包含有差异的账户
+    """
+    conn = get_db_connection()
+    try:
+        if account_id is None:
+            account_ids = [row['id'] for row in conn.execute('SELECT id FROM accounts')]
+        else:
+            account_ids = [account_id]
+
+        result = {}
+        for aid in account_ids:
+            changed = recompute_balances(conn, aid)
+            if changed:
+                result[aid] = changed
+
+        if dry_run:
+            conn.rollback()
+        else:
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='重算交易后余额')
+    parser.add_argument('--account', type=int, help='只处理指定账户')
+    parser.add_argument('--check', action='store_true', help='只检查不一致的行数，不写入')
+    args = parser.parse_args()
+
+    result = rebuild_all_balances(args.account, dry_run=args.check)
+    for aid, count in sorted(result.items()):
+        print(f"账户 {aid}: {count} 条交易的余额{'不一致' if args.check else '已修复'}")
+    total = sum(result.values())
+    if args.check:
+        print(f"共 {total} 条交易的余额不一致" if total else "所有交易余额一致")
+    else:
+        print(f"重算完成，共修复 {total} 条交易")
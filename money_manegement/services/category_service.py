@@ -75,11 +75,10 @@ def get_categories_with_stats():
     categories = conn.execute('''
         SELECT 
             c.*,
-            COUNT(DISTINCT a.id) as account_count,
-            COALESCE(SUM(a.balance), 0) as total_balance
+            COALESCE(s.account_count, 0) as account_count,
+            COALESCE(s.total_balance, 0) as total_balance
         FROM categories c
-        LEFT JOIN accounts a ON c.id = a.category_id AND a.is_active = 1
-        GROUP BY c.id
+        LEFT JOIN category_summary s ON s.category_id = c.id
         ORDER BY 
             CASE c.type 
                 WHEN '流动资产' THEN 1 
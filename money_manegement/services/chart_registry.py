@@ -0,0 +1,128 @@
+# services/chart_registry.py
+"""
+图表注册表
+启动时按 ChartConfig.CHART_MAPPING 为每个图表编译一次执行计划：绑定服务方法、
+核对方法签名与参数定义、校验默认值和依赖表，配置错误在启动时即报出；
+请求时直接按计划解析参数并调用，不再做反射查找和字符串类型猜测，
+同时按图表记录实际计算（未命中缓存）的次数与耗时
+"""
+
+import inspect
+import threading
+import time
+
+from services.data_version import TABLES
+from utils.chart_config import ChartConfig
+
+
+class ChartPlan:
+    """单个图表编译后的执行计划"""
+
+    def __init__(self, name, chart_type, func, params, depends_on, cache_duration):
+        self.name = name
+        self.type = chart_type
+        self.func = func
+        self.params = params
+        self.depends_on = depends_on
+        self.cache_duration = cache_duration
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.last_ms = 0.0
+
+    @property
+    def defaults(self):
+        return {name: param.default for name, param in self.params.items()}
+
+    def parse(self, args):
+        """
+        按参数定义解析查询参数，缺省的使用默认值，未定义的参数忽略
+        :param args: 查询参数映射，如 request.args
+        :raises ValueError: 参数类型或取值不合法
+        """
+        params = self.defaults
+        for name, param in self.params.items():
+            raw = args.get(name)
+            if raw is not None and raw != '':
+                params[name] = param.parse(name, raw)
+        return params
+
+    def execute(self, **params):
+        """调用服务方法并记录耗时"""
+        started = time.perf_counter()
+        try:
+            return self.func(**params)
+        except Exception:
+            with self._lock:
+                self.errors += 1
+            raise
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            with self._lock:
+                self.calls += 1
+                self.total_ms += elapsed
+                self.max_ms = max(self.max_ms, elapsed)
+                self.last_ms = elapsed
+
+    def cost(self):
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'errors': self.errors,
+                'avg_ms': round(self.total_ms / self.calls, 2) if self.calls else 0,
+                'max_ms': round(self.max_ms, 2),
+                'last_ms': round(self.last_ms, 2),
+                'total_ms': round(self.total_ms, 2),
+            }
+
+
+def compile_plan(name, config, service):
+    """
+    校验图表配置并生成执行计划
+    :raises ValueError: 服务方法不存在、签名与参数定义不符、默认值不合法或依赖表未知
+    """
+    if config['type'] not in ChartConfig.CHART_TYPES.values():
+        raise ValueError(f"图表 {name} 的类型 {config['type']} 未定义")
+
+    func = getattr(service, config['service_method'], None)
+    if not callable(func):
+        raise ValueError(f"图表 {name} 的服务方法 {config['service_method']} 不存在")
+
+    params = config['params']
+    for param_name, param in params.items():
+        if param.default is not None:
+            try:
+                param.validate(param_name, param.default)
+            except ValueError as e:
+                raise ValueError(f"图表 {name} 的默认参数不合法: {e}")
+
+    # 服务方法必须接受全部参数以及 user_id，且没有参数定义之外的必填参数
+    signature = inspect.signature(func)
+    try:
+        signature.bind(user_id=None, **{param_name: None for param_name in params})
+    except TypeError as e:
+        raise ValueError(f"图表 {name} 的参数定义与服务方法 {config['service_method']} 不符: {e}")
+
+    unknown = set(config.get('depends_on', ())) - set(TABLES)
+    if unknown:
+        raise ValueError(f"图表 {name} 依赖的表没有版本号: {', '.join(sorted(unknown))}")
+
+    return ChartPlan(name, config['type'], func, params,
+                     tuple(config.get('depends_on', ())), config['cache_duration'])
+
+
+class ChartRegistry:
+    """全部图表的执行计划"""
+
+    def __init__(self, service, mapping=None):
+        mapping = ChartConfig.CHART_MAPPING if mapping is None else mapping
+        self.plans = {name: compile_plan(name, config, service) for name, config in mapping.items()}
+
+    def get(self, chart_name):
+        return self.plans.get(chart_name)
+
+    def costs(self):
+        """各图表实际计算的次数与耗时"""
+        return {name: plan.cost() for name, plan in self.plans.items()}
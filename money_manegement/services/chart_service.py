@@ -4,10 +4,33 @@
 """
 
 from datetime import datetime, timedelta
-from collections import defaultdict
 from services.analytics_service import AnalyticsService
 from services.account_service import AccountService
 from services.transaction_service import TransactionService
+from utils.downsample import downsample_series
+
+# 现金流桑基图每侧最多保留的分类数，以及并入“其他”的占比阈值
+SANKEY_MAX_LINKS = 10
+SANKEY_MIN_SHARE = 0.01
+SANKEY_OTHER = '其他'
+
+# 收入预测的期数，同时也是移动平均的窗口；按周/月聚合时按周/月预测
+FORECAST_PERIODS = {'day': 7, 'week': 4, 'month': 3}
+
+
+def _forecast_labels(end_date, step, count, short=False):
+    """end_date 所在周期之后 count 个周期的标签，格式与 downsample.aggregate() 的周期标签一致"""
+    labels = []
+    for i in range(1, count + 1):
+        if step == 'week':
+            labels.append((end_date - timedelta(days=end_date.weekday()) + timedelta(weeks=i)).isoformat())
+        elif step == 'month':
+            month = end_date.year * 12 + end_date.month - 1 + i
+            labels.append(f'{month // 12:04d}-{month % 12 + 1:02d}')
+        else:
+            day = end_date + timedelta(days=i)
+            labels.append(day.strftime('%m-%d') if short else day.isoformat())
+    return labels
 
 
 class ChartService:
@@ -21,7 +44,7 @@ class ChartService:
     def get_expense_distribution(self, user_id, period='month', category_type='all'):
         """获取支出分布数据"""
         # 计算日期范围
-        end_date = datetime.now()
+        end_date = datetime.now().date()
         if period == 'week':
             start_date = end_date - timedelta(days=7)
         elif period == 'month':
@@ -31,26 +54,19 @@ class ChartService:
         else:
             start_date = end_date - timedelta(days=30)
 
-        # 获取支出数据
-        transactions = self.transaction_service.get_transactions_by_type(
-            user_id, '支出', start_date, end_date
+        # 按账户分类汇总支出，只取金额最大的10个分类
+        distribution = self.transaction_service.get_category_totals(
+            '支出', start_date.isoformat(), end_date.isoformat(),
+            category_type=None if category_type == 'all' else category_type,
+            limit=10
         )
 
-        # 按分类聚合
-        distribution = defaultdict(float)
-        for trans in transactions:
-            if category_type == 'all' or trans.account.category.type == category_type:
-                category_name = trans.account.category.name
-                distribution[category_name] += trans.amount
-
         # 格式化为图表数据
         data = []
         colors = ['#3b82f6', '#ef4444', '#10b981', '#f59e0b', '#8b5cf6',
                   '#ec4899', '#06b6d4', '#84cc16', '#f97316', '#6366f1']
 
-        for i, (category, amount) in enumerate(sorted(distribution.items(),
-                                                      key=lambda x: x[1],
-                                                      reverse=True)[:10]):
+        for i, (category, amount) in enumerate(distribution):
             data.append({
                 'label': category,
                 'value': float(amount),
@@ -65,21 +81,19 @@ class ChartService:
             }]
         }
 
-    def get_income_trend(self, user_id, days=30, include_forecast=False):
-        """获取收入趋势数据"""
+    def get_income_trend(self, user_id, days=30, include_forecast=False, resolution='auto'):
+        """
+        获取收入趋势数据
+        :param resolution: auto / day / week / month，长区间按此聚合或降采样，见 utils.downsample
+        """
         end_date = datetime.now().date()
         start_date = end_date - timedelta(days=days)
 
-        # 获取收入数据
-        transactions = self.transaction_service.get_transactions_by_type(
-            user_id, '收入', start_date, end_date
+        # 每日收入合计
+        daily_income = self.transaction_service.get_daily_totals(
+            '收入', start_date.isoformat(), end_date.isoformat()
         )
 
-        # 按日期聚合
-        daily_income = defaultdict(float)
-        for trans in transactions:
-            daily_income[trans.date] += trans.amount
-
         # 生成日期序列
         date_list = []
         current_date = start_date
@@ -88,11 +102,13 @@ class ChartService:
             current_date += timedelta(days=1)
 
         # 格式化数据
-        labels = []
-        values = []
-        for date in date_list:
-            labels.append(date.strftime('%m-%d'))
-            values.append(float(daily_income.get(date, 0)))
+        daily_values = [float(daily_income.get(date.isoformat(), 0)) for date in date_list]
+        points, series = downsample_series([date.isoformat() for date in date_list],
+                                           {'income': daily_values}, resolution)
+        values = series['income']
+        # 一年以内的按天数据只显示月-日，其余保留完整的日期或周期
+        short_labels = days <= 365 and len(points[0]) == 10 and resolution != 'week'
+        labels = [point[5:] for point in points] if short_labels else points
 
         result = {
             'labels': labels,
@@ -105,13 +121,14 @@ class ChartService:
             }]
         }
 
-        # 添加预测数据
+        # 添加预测数据，按与历史数据相同的分辨率预测，周/月坐标上不混入按天的预测点
         if include_forecast:
-            forecast_values = self._generate_forecast(values, 7)
-            forecast_labels = []
-            for i in range(7):
-                future_date = end_date + timedelta(days=i + 1)
-                forecast_labels.append(future_date.strftime('%m-%d'))
+            step = resolution if resolution in ('week', 'month') else 'day'
+            periods = FORECAST_PERIODS[step]
+            # 当前周/月尚未结束，合计偏小，不参与平均
+            basis = daily_values if step == 'day' else values[:-1]
+            forecast_values = self._generate_forecast(basis, periods, window=periods)
+            forecast_labels = _forecast_labels(end_date, step, periods, short_labels)
 
             result['datasets'].append({
                 'label': '预测收入',
@@ -124,13 +141,13 @@ class ChartService:
 
         return result
 
-    def _generate_forecast(self, historical_data, days):
+    def _generate_forecast(self, historical_data, days, window=7):
         """简单的移动平均预测"""
-        if len(historical_data) < 7:
+        if len(historical_data) < window:
             return [0] * days
 
-        # 计算7天移动平均
-        recent_values = historical_data[-7:]
+        # 计算最近 window 期的移动平均
+        recent_values = historical_data[-window:]
         avg = sum(recent_values) / len(recent_values)
 
         # 生成预测值（添加随机波动）
@@ -222,63 +239,87 @@ class ChartService:
             }]
         }
 
-    def get_cash_flow(self, user_id, month):
-        """获取现金流数据"""
-        # 解析月份
-        year, month_num = map(int, month.split('-'))
-
-        # 获取月度数据
-        monthly_data = self.analytics.get_monthly_income_expense(user_id, year, month_num)
-
-        # 构建桑基图数据
-        nodes = [
-            {'name': '总收入', 'category': 'income'},
-            {'name': '工资收入', 'category': 'income_source'},
-            {'name': '其他收入', 'category': 'income_source'},
-            {'name': '支出', 'category': 'expense'},
-            {'name': '生活支出', 'category': 'expense_category'},
-            {'name': '娱乐支出', 'category': 'expense_category'},
-            {'name': '储蓄', 'category': 'savings'}
-        ]
-
-        # 模拟数据链接
-        total_income = monthly_data.get('total_income', 10000)
-        total_expense = monthly_data.get('total_expense', 7000)
-
-        links = [
-            {'source': 1, 'target': 0, 'value': total_income * 0.8},
-            {'source': 2, 'target': 0, 'value': total_income * 0.2},
-            {'source': 0, 'target': 3, 'value': total_expense},
-            {'source': 0, 'target': 6, 'value': total_income - total_expense},
-            {'source': 3, 'target': 4, 'value': total_expense * 0.6},
-            {'source': 3, 'target': 5, 'value': total_expense * 0.4}
-        ]
+    def get_cash_flow(self, user_id, month, max_links=SANKEY_MAX_LINKS, min_share=SANKEY_MIN_SHARE):
+        """
+        获取现金流桑基图数据：收入分类 → 总收入 → 支出分类 / 储蓄
+        一次分组查询取出当月各收支分类的合计，金额较小的分类合并为“其他”，节点数与分类数无关
+        :param month: YYYY-MM
+        :param max_links: 收入、支出两侧各自最多保留的分类数
+        :param min_share: 占该侧合计比例低于此值的分类并入“其他”
+        """
+        datetime.strptime(month, '%Y-%m')
+
+        income, expense = {}, {}
+        for ttype, category, total in self.transaction_service.get_month_category_totals(month):
+            side = income if ttype == '收入' else expense
+            name = category or '未分类'
+            side[name] = side.get(name, 0) + total
+
+        total_income = round(sum(income.values()), 2)
+        total_expense = round(sum(expense.values()), 2)
+
+        # 节点 category 决定绘制的列：source 在左，target 在右，其余居中
+        nodes = [{'name': '总收入', 'category': 'income'}]
+        links = []
+
+        def add_node(name, category):
+            nodes.append({'name': name, 'category': category})
+            return len(nodes) - 1
+
+        for name, value in self._fold_small_flows(income, max_links, min_share):
+            links.append({'source': add_node(name, 'source'), 'target': 0, 'value': value})
+        # 支出超过收入时差额由存款补足，保证流入流出平衡
+        if total_expense > total_income:
+            links.append({'source': add_node('动用储蓄', 'source'), 'target': 0,
+                          'value': round(total_expense - total_income, 2)})
+
+        for name, value in self._fold_small_flows(expense, max_links, min_share):
+            links.append({'source': 0, 'target': add_node(name, 'target'), 'value': value})
+        if total_income > total_expense:
+            links.append({'source': 0, 'target': add_node('储蓄', 'target'),
+                          'value': round(total_income - total_expense, 2)})
 
         return {
             'nodes': nodes,
-            'links': links
+            'links': links,
+            'total_income': total_income,
+            'total_expense': total_expense
         }
 
+    def _fold_small_flows(self, totals, max_links, min_share):
+        """按金额从大到小保留至多 max_links 个分类，其余以及占比低于 min_share 的合并为“其他”"""
+        flows = sorted(((value, name) for name, value in totals.items() if value > 0), reverse=True)
+        threshold = sum(value for value, _ in flows) * min_share
+
+        kept = []
+        other = 0
+        for value, name in flows:
+            # 名为“其他”的分类本身也并入合并项，避免出现两个“其他”节点
+            if len(kept) < max_links and value >= threshold and name != SANKEY_OTHER:
+                kept.append((name, round(value, 2)))
+            else:
+                other += value
+        if other > 0:
+            kept.append((SANKEY_OTHER, round(other, 2)))
+        return kept
+
     def get_spending_heatmap(self, user_id, weeks=12):
         """获取支出热力图数据"""
+        # 最近 weeks 周，最后一周截止到今天
         end_date = datetime.now().date()
-        start_date = end_date - timedelta(weeks=weeks * 7)
+        start_date = end_date - timedelta(days=weeks * 7 - 1)
 
-        # 获取支出数据
-        transactions = self.transaction_service.get_transactions_by_type(
-            user_id, '支出', start_date, end_date
+        # 按 (周序号, 星期) 汇总支出
+        totals = self.transaction_service.get_weekday_totals(
+            '支出', start_date.isoformat(), end_date.isoformat()
         )
 
         # 创建热力图矩阵
         matrix = [[0 for _ in range(7)] for _ in range(weeks)]
 
-        for trans in transactions:
-            days_diff = (trans.date - start_date).days
-            week_index = days_diff // 7
-            day_index = trans.date.weekday()
-
+        for week_index, day_index, amount in totals:
             if 0 <= week_index < weeks:
-                matrix[week_index][day_index] += float(trans.amount)
+                matrix[week_index][day_index] = float(amount)
 
         return {
             'data': matrix,
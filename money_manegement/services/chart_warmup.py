@@ -0,0 +1,168 @@
+# services/chart_warmup.py
+"""
+图表缓存预热
+启动时以及数据写入后，按 ChartConfig.CHART_MAPPING 中各图表的默认参数计算图表数据并写入缓存，
+首次打开仪表盘时不必在请求中逐个计算全部图表
+
+- 通过轮询 data_versions 发现写入，其他进程或后台任务（导入、快照）的写入同样会触发预热
+- 防抖：版本号变化后等待 CHART_WARMUP_DELAY 秒内不再变化才开始计算，连续写入只预热一次
+- 多个图表最多 CHART_WARMUP_CONCURRENCY 个并行计算；计算耗时由图表执行计划统一记录，
+  见 /api/info 中各图表的 cost，这里只记录预热的次数与失败
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import threading
+import time
+
+from config import (CHART_WARMUP_CONCURRENCY, CHART_WARMUP_DELAY,
+                    CHART_WARMUP_POLL_INTERVAL)
+from services.api_manager import api_manager
+from services.data_version import TABLES, version_key
+from utils.chart_config import ChartConfig
+
+logger = logging.getLogger(__name__)
+
+
+class ChartWarmer:
+    """后台线程在数据版本号变化后预热全部图表"""
+
+    def __init__(self, manager=api_manager, concurrency=CHART_WARMUP_CONCURRENCY,
+                 delay=CHART_WARMUP_DELAY, poll_interval=CHART_WARMUP_POLL_INTERVAL):
+        self.manager = manager
+        self.concurrency = max(concurrency, 1)
+        self.delay = delay
+        self.poll_interval = poll_interval
+        self._stop_event = threading.Event()
+        self._wake_event = threading.Event()
+        self._thread = None
+        self._pool = None
+        self._lock = threading.Lock()
+        self.metrics = {}
+        self.runs = 0
+        self.last_run = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop_event.clear()
+        self._pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='chart-warmup')
+        self._thread = threading.Thread(target=self._run, name='chart-warmer', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop_event.set()
+        self._wake_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+    def notify(self):
+        """写入后调用，立即检查版本号而不必等到下次轮询"""
+        self._wake_event.set()
+
+    def _wait_until_quiet(self, versions):
+        """等到 delay 秒内版本号不再变化，返回最终的版本号；停止时返回 None"""
+        while True:
+            if self._stop_event.wait(self.delay):
+                return None
+            latest = version_key(TABLES)
+            if latest == versions:
+                return versions
+            versions = latest
+
+    def _run(self):
+        warmed = None
+        while not self._stop_event.is_set():
+            try:
+                versions = version_key(TABLES)
+                if versions != warmed:
+                    # 启动时立即预热，之后的写入先防抖
+                    if warmed is not None:
+                        versions = self._wait_until_quiet(versions)
+                        if versions is None:
+                            return
+                    self.warm_all()
+                    warmed = versions
+            except Exception:
+                logger.exception("图表预热失败")
+            self._wake_event.wait(self.poll_interval)
+            self._wake_event.clear()
+
+    def warm_all(self):
+        """按默认参数计算全部图表，返回计算（未命中缓存）的图表数"""
+        started = time.perf_counter()
+        pool = self._pool or ThreadPoolExecutor(max_workers=self.concurrency)
+        try:
+            computed = sum(pool.map(self.warm_chart, ChartConfig.get_all_charts()))
+        finally:
+            if pool is not self._pool:
+                pool.shutdown()
+        with self._lock:
+            self.runs += 1
+            self.last_run = {
+                'finished_at': time.time(),
+                'duration_ms': round((time.perf_counter() - started) * 1000, 1),
+                'computed': computed,
+            }
+        return computed
+
+    def warm_chart(self, chart_name):
+        """计算单个图表，返回是否实际执行了计算"""
+        error = None
+        from_cache = False
+        try:
+            _, from_cache = self.manager.compute_chart(chart_name, self.manager.default_params(chart_name))
+        except Exception as e:
+            error = str(e)
+            logger.warning("图表 %s 预热失败: %s", chart_name, e)
+
+        with self._lock:
+            metric = self.metrics.setdefault(chart_name, {
+                'runs': 0, 'computed': 0, 'errors': 0, 'last_error': None,
+            })
+            metric['runs'] += 1
+            if error is not None:
+                metric['errors'] += 1
+                metric['last_error'] = error
+            elif not from_cache:
+                metric['computed'] += 1
+        return error is None and not from_cache
+
+    def stats(self):
+        with self._lock:
+            charts = {name: dict(metric) for name, metric in self.metrics.items()}
+            return {
+                'running': self.running,
+                'concurrency': self.concurrency,
+                'delay': self.delay,
+                'runs': self.runs,
+                'last_run': self.last_run,
+                'charts': charts,
+            }
+
+
+_warmer = None
+
+
+def start_warmup(**options):
+    """启动全局图表预热线程，重复调用不会启动多个线程"""
+    global _warmer
+    if _warmer is None:
+        _warmer = ChartWarmer(**options)
+        _warmer.manager.warmer = _warmer
+    _warmer.start()
+    return _warmer
+
+
+def notify_write():
+    """数据写入后唤醒预热线程，未启动时不做任何事"""
+    if _warmer is not None:
+        _warmer.notify()
@@ -0,0 +1,61 @@
+# services/data_version.py
+"""
+按表的数据版本号
+data_versions 由触发器在每次写入时递增，缓存键带上所依赖表的版本号，
+数据变化后旧键不再命中，缓存可以长期保留而不会返回过期数据；
+只修改账户不会使只依赖交易表的缓存失效
+"""
+
+from datetime import date
+import functools
+
+from config import CACHE_BACKEND, CACHE_PATH, RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_TTL
+from database.database import get_db_connection
+from utils.cache import create_cache
+
+TABLES = ('accounts', 'categories', 'transactions', 'asset_snapshots')
+
+# 分析函数结果缓存，后端由 CACHE_BACKEND 决定
+response_cache = create_cache(CACHE_BACKEND, CACHE_PATH, namespace='analytics',
+                              max_entries=RESPONSE_CACHE_MAX_ENTRIES, default_ttl=RESPONSE_CACHE_TTL)
+
+
+def get_data_versions(tables=TABLES):
+    """
+    读取各表当前的版本号
+    :return: {表名: 版本号}，只包含 tables 中的表
+    """
+    conn = get_db_connection()
+    rows = conn.execute('SELECT table_name, version FROM data_versions').fetchall()
+    conn.close()
+    versions = {row['table_name']: row['version'] for row in rows}
+    return {table: versions.get(table, 0) for table in tables}
+
+
+def version_key(tables):
+    """由依赖表版本号组成的缓存键片段，按表名排序"""
+    return tuple(sorted(get_data_versions(tables).items()))
+
+
+def versioned_cache(*tables):
+    """
+    按参数、当天日期与依赖表版本号缓存函数结果的装饰器
+    当天日期参与缓存键，默认取“今天”或“最近N天”的函数跨天后自动重新计算
+    :param tables: 函数读取的数据表
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (func.__module__, func.__qualname__, args, tuple(sorted(kwargs.items())),
+                   date.today().isoformat(), version_key(tables))
+            try:
+                hash(key)
+            except TypeError:
+                return func(*args, **kwargs)
+            value, _ = response_cache.get_or_compute(key, lambda: func(*args, **kwargs), tag=func.__qualname__)
+            return value
+
+        return wrapper
+
+    return decorator
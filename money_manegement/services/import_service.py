@@ -0,0 +1,519 @@
+# services/import_service.py
+"""
+账单文件导入
+以生成器流水线逐条处理 CSV / OFX / QIF 账单：解码 → 解析 → 映射列 → 规范化 → 校验 → 分块写入
+内存占用只与分块大小有关；每个分块单独提交并记录进度，中断后从最后提交的分块继续；
+每行计算内容哈希，重复导入同一账单不会产生重复交易
+
+用法: python -m services.import_service 账单文件 --account-id 1 [--format csv] [--chunk-size 1000]
+"""
+
+import argparse
+import csv
+import hashlib
+import io
+import os
+import re
+from datetime import datetime
+
+from database.database import get_db_connection
+from services.balance_service import recompute_balances
+from services.transaction_service import balance_delta, validate_import_row
+
+SUPPORTED_FORMATS = ('csv', 'ofx', 'qif')
+
+# 每个分块处理的账单行数，每个分块提交一次
+IMPORT_CHUNK_SIZE = 1000
+
+# 导入结果中最多返回的错误明细条数
+MAX_REPORTED_ERRORS = 100
+
+# CSV 表头别名，键为标准字段名
+CSV_COLUMN_ALIASES = {
+    'date': ['date', '日期', '交易日期', '记账日期', '交易时间'],
+    'amount': ['amount', '金额', '交易金额', '金额(元)'],
+    'type': ['type', '类型', '收/支', '收支类型', '交易类型'],
+    'description': ['description', '说明', '摘要', '交易说明', '商品', '交易对方', 'payee'],
+    'category': ['category', '分类', '交易分类'],
+    'note': ['note', '备注', 'memo'],
+    'income': ['income', '收入', '收入金额', '贷方金额', 'credit'],
+    'expense': ['expense', '支出', '支出金额', '借方金额', 'debit'],
+}
+
+# 各种写法的收支类型
+TYPE_ALIASES = {
+    '收入': '收入', '收': '收入', 'income': '收入', 'credit': '收入', 'dep': '收入',
+    '支出': '支出', '支': '支出', 'expense': '支出', 'debit': '支出', 'payment': '支出',
+    '转账': '转账', 'transfer': '转账', 'xfer': '转账',
+}
+
+DATE_FORMATS = ('%Y-%m-%d', '%Y/%m/%d', '%Y.%m.%d', '%Y%m%d', '%m/%d/%Y', '%m/%d/%y')
+
+OFX_TAG = re.compile(r'<(/?)([A-Za-z0-9.]+)>([^<\r\n]*)')
+
+QIF_FIELDS = {'D': 'date', 'T': 'amount', 'U': 'amount', 'P': 'description',
+              'M': 'note', 'L': 'category', 'N': 'reference'}
+
+
+# ===== 文件识别 =====
+
+def detect_format(filename, head):
+    """根据扩展名或文件开头内容判断账单格式"""
+    extension = os.path.splitext(filename or '')[1].lower().lstrip('.')
+    if extension in SUPPORTED_FORMATS:
+        return extension
+
+    text = head.lstrip(b'\xef\xbb\xbf').lstrip()
+    if text.startswith(b'OFXHEADER') or b'<OFX>' in text[:4096].upper():
+        return 'ofx'
+    if text.startswith(b'!Type'):
+        return 'qif'
+    return 'csv'
+
+
+def detect_encoding(head):
+    """UTF-8 解码失败时按国内银行常用的 GB18030 处理"""
+    try:
+        head.decode('utf-8')
+    except UnicodeDecodeError as e:
+        # 读取的开头片段可能截断在多字节字符中间
+        if e.start < len(head) - 3:
+            return 'gb18030'
+    return 'utf-8-sig'
+
+
+def file_digest(stream):
+    """计算文件内容的 SHA-256，完成后把读取位置恢复到开头"""
+    digest = hashlib.sha256()
+    for block in iter(lambda: stream.read(65536), b''):
+        digest.update(block)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+# ===== 流水线各阶段 =====
+
+def decode_lines(stream, encoding):
+    """把二进制流逐行解码为文本"""
+    text = io.TextIOWrapper(stream, encoding=encoding, errors='replace', newline='')
+    try:
+        # 不用 yield from：提前关闭生成器时它会调用 text.close()，连同调用方的流一起关闭
+        for line in text:
+            yield line
+    finally:
+        text.detach()  # 不关闭调用方传入的流
+
+
+def parse_csv(lines):
+    """解析 CSV，每行产出 {表头: 值}"""
+    for row in csv.DictReader(lines):
+        yield {(key or '').strip(): (value or '').strip() for key, value in row.items()
+               if not isinstance(value, list)}
+
+
+def parse_ofx(lines):
+    """解析 OFX（SGML 与 XML 写法均可）中的 STMTTRN 交易记录"""
+    record = None
+    for line in lines:
+        for closing, tag, value in OFX_TAG.findall(line):
+            tag = tag.upper()
+            if tag == 'STMTTRN':
+                if closing and record is not None:
+                    yield {
+                        'date': record.get('DTPOSTED', '')[:8],
+                        'amount': record.get('TRNAMT', ''),
+                        'description': record.get('NAME') or record.get('PAYEE', ''),
+                        'note': record.get('MEMO'),
+                        'reference': record.get('FITID'),
+                    }
+                record = None if closing else {}
+            elif record is not None and not closing:
+                record[tag] = value.strip()
+
+
+def parse_qif(lines):
+    """解析 QIF，以 ^ 结束一条记录"""
+    record = {}
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if not line or line.startswith('!'):
+            continue
+        if line.startswith('^'):
+            if record:
+                yield record
+            record = {}
+            continue
+
+        field = QIF_FIELDS.get(line[0])
+        if field and field not in record:
+            record[field] = line[1:].strip()
+    if record:
+        yield record
+
+
+def map_columns(rows, mapping=None):
+    """按表头别名（或调用方指定的 mapping: {标准字段: 表头}）把 CSV 行映射为标准字段"""
+    columns = None
+    for row in rows:
+        if columns is None:
+            headers = {header.lower(): header for header in row}
+            columns = {}
+            for field, aliases in CSV_COLUMN_ALIASES.items():
+                if mapping and field in mapping:
+                    columns[field] = mapping[field]
+                    continue
+                for alias in aliases:
+                    if alias.lower() in headers:
+                        columns[field] = headers[alias.lower()]
+                        break
+
+        yield {field: row.get(column) for field, column in columns.items()}
+
+
+def parse_date(value):
+    """把常见日期写法规范为 YYYY-MM-DD"""
+    value = (value or '').strip().split(' ')[0].split('T')[0].replace("'", '/')
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).strftime('%Y-%m-%d')
+        except ValueError:
+            continue
+    raise ValueError(f"无法识别的日期: {value}")
+
+
+def parse_amount(value):
+    """解析金额，去掉货币符号与千分位，括号表示负数"""
+    text = re.sub(r'[¥￥$,\s]', '', value or '')
+    negative = text.startswith('(') and text.endswith(')')
+    if negative:
+        text = text[1:-1]
+    if not text:
+        raise ValueError("金额为空")
+    amount = float(text)
+    return -amount if negative else amount
+
+
+def normalize_record(record):
+    """规范化一条账单记录的日期、金额与收支类型"""
+    income = record.get('income')
+    expense = record.get('expense')
+    if income or expense:
+        # 收入、支出分两列的账单
+        income_amount = parse_amount(income) if income else 0
+        expense_amount = parse_amount(expense) if expense else 0
+        if income_amount:
+            ttype, amount = '收入', abs(income_amount)
+        else:
+            ttype, amount = '支出', abs(expense_amount)
+    else:
+        amount = parse_amount(record.get('amount'))
+        raw_type = (record.get('type') or '').strip()
+        if raw_type:
+            ttype = TYPE_ALIASES.get(raw_type.lower())
+            if ttype is None:
+                raise ValueError(f"无效的交易类型: {raw_type}")
+        else:
+            ttype = '支出' if amount < 0 else '收入'
+        amount = abs(amount)
+
+    return {
+        'date': parse_date(record.get('date')),
+        'type': ttype,
+        'amount': amount,
+        'description': record.get('description') or '',
+        'category': record.get('category') or None,
+        'note': record.get('note') or None,
+        'reference': record.get('reference') or None,
+    }
+
+
+def iter_records(stream, fmt, encoding, mapping=None):
+    """按格式组装解码与解析阶段，产出原始记录"""
+    lines = decode_lines(stream, encoding)
+    if fmt == 'csv':
+        return map_columns(parse_csv(lines), mapping)
+    if fmt == 'ofx':
+        return parse_ofx(lines)
+    return parse_qif(lines)
+
+
+class UngroupedDates(Exception):
+    """账单中同一日期的行不连续，按日期清空的出现次数已不可用"""
+
+
+class RowHasher:
+    """
+    计算导入行的内容哈希
+    同一账单中完全相同的多行（如同一天两笔相同金额的消费）按出现次序区分，
+    因此重复导入同一账单会得到相同的哈希序列。
+    相同的行日期必然相同，账单按日期排列（升序或降序）时日期变化后即可清空出现次数，
+    内存只与单日的行数有关；已结束的日期再次出现时抛出 UngroupedDates，
+    由调用方改用 grouped=False 在整个文件范围内累计后重新处理
+    """
+
+    def __init__(self, account_id, grouped=True):
+        self.account_id = account_id
+        self.grouped = grouped
+        self._date = None
+        self._finished_dates = set()
+        self._seen = {}
+
+    def __call__(self, row):
+        if self.grouped and row['date'] != self._date:
+            if row['date'] in self._finished_dates:
+                raise UngroupedDates(row['date'])
+            if self._date is not None:
+                self._finished_dates.add(self._date)
+            self._date = row['date']
+            self._seen.clear()
+
+        key = (row['date'], row['type'], f"{row['amount']:.2f}",
+               row['description'], row['reference'] or '')
+        raw = '\x1f'.join([str(self.account_id), *key])
+        digest = hashlib.sha1(raw.encode('utf-8')).digest()
+        occurrence = self._seen.get(digest, 0)
+        self._seen[digest] = occurrence + 1
+
+        raw = '\x1f'.join([raw, str(occurrence)])
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+# ===== 写入 =====
+
+def _start_job(conn, file_hash, account_id, filename, fmt):
+    """创建或恢复导入任务；已完成的任务重新从头处理（由行哈希去重）"""
+    job = conn.execute(
+        'SELECT * FROM import_jobs WHERE file_hash = ? AND account_id = ?',
+        (file_hash, account_id)
+    ).fetchone()
+
+    if job is None:
+        conn.execute('''
+            INSERT INTO import_jobs (file_hash, account_id, filename, format)
+            VALUES (?, ?, ?, ?)
+        ''', (file_hash, account_id, filename, fmt))
+    elif job['status'] == 'completed':
+        conn.execute('''
+            UPDATE import_jobs
+            SET status = 'running', rows_committed = 0, inserted = 0, skipped = 0,
+                error_count = 0, message = NULL, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', (job['id'],))
+    else:
+        conn.execute('''
+            UPDATE import_jobs SET status = 'running', message = NULL, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', (job['id'],))
+    conn.commit()
+
+    return dict(conn.execute(
+        'SELECT * FROM import_jobs WHERE file_hash = ? AND account_id = ?',
+        (file_hash, account_id)
+    ).fetchone())
+
+
+def _write_chunk(conn, job_id, account_id, rows, rows_committed, error_count):
+    """写入一个分块并更新任务进度，二者在同一事务中提交；返回 (写入数, 跳过数)"""
+    unique_rows = list({row['import_hash']: row for row in rows}.values())
+    hashes = [row['import_hash'] for row in unique_rows]
+
+    existing = set()
+    if hashes:
+        placeholders = ','.join('?' * len(hashes))
+        existing = {r[0] for r in conn.execute(
+            f'SELECT import_hash FROM transactions WHERE import_hash IN ({placeholders})', hashes
+        )}
+    new_rows = [row for row in unique_rows if row['import_hash'] not in existing]
+
+    # 账单行不一定按日期排列，balance_after 留待整个任务完成时从 first_date 起统一重算，
+    # 避免倒序账单的每个分块都改写之前导入的全部行
+    conn.executemany('''
+        INSERT INTO transactions
+        (account_id, date, description, type, amount, category, note, import_hash)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', [(account_id, row['date'], row['description'], row['type'], row['amount'],
+           row['category'], row['note'], row['import_hash']) for row in new_rows])
+
+    net_change = sum(balance_delta(row['type'], row['amount']) for row in new_rows)
+    if net_change:
+        conn.execute(
+            'UPDATE accounts SET balance = balance + ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?',
+            (net_change, account_id)
+        )
+
+    skipped = len(rows) - len(new_rows)
+    first_date = min((row['date'] for row in new_rows), default=None)
+    conn.execute('''
+        UPDATE import_jobs
+        SET rows_committed = ?, inserted = inserted + ?, skipped = skipped + ?,
+            error_count = error_count + ?, first_date = COALESCE(MIN(first_date, ?), first_date, ?),
+            updated_at = CURRENT_TIMESTAMP
+        WHERE id = ?
+    ''', (rows_committed, len(new_rows), skipped, error_count,
+          first_date, first_date, job_id))
+    conn.commit()
+
+    return len(new_rows), skipped
+
+
+def _recompute_job_balances(conn, job_id, account_id):
+    """从导入任务写入的最早日期起重算余额，包括之前中断的运行所写入的行"""
+    first_date = conn.execute('SELECT first_date FROM import_jobs WHERE id = ?',
+                              (job_id,)).fetchone()['first_date']
+    if first_date:
+        recompute_balances(conn, account_id, first_date)
+
+
+def import_statement(stream, account_id, fmt=None, filename=None, mapping=None,
+                     encoding=None, chunk_size=IMPORT_CHUNK_SIZE, progress=None):
+    """
+    流式导入账单文件
+    :param stream: 可 seek 的二进制文件流
+    :param account_id: 导入到的账户
+    :param fmt: csv / ofx / qif，为空时自动识别
+    :param mapping: CSV 列映射 {标准字段: 表头}
+    :param progress: 每提交一个分块后调用 progress(结果字典)
+    :return: 导入结果，errors 与 batch_import_transactions() 的格式相同
+    """
+    head = stream.read(65536)
+    stream.seek(0)
+    fmt = (fmt or detect_format(filename, head)).lower()
+    if fmt not in SUPPORTED_FORMATS:
+        raise ValueError(f"不支持的账单格式: {fmt}")
+    encoding = encoding or detect_encoding(head)
+    file_hash = file_digest(stream)
+
+    conn = get_db_connection()
+    try:
+        if conn.execute('SELECT 1 FROM accounts WHERE id = ?', (account_id,)).fetchone() is None:
+            raise ValueError(f"账户不存在: {account_id}")
+
+        job = _start_job(conn, file_hash, account_id, filename, fmt)
+        resume_from = job['rows_committed']
+        result = {
+            'job_id': job['id'],
+            'format': fmt,
+            'resumed_from': resume_from,
+            'rows_processed': resume_from,
+            'inserted': job['inserted'],
+            'skipped': job['skipped'],
+            'error_count': job['error_count'],
+            'errors': [],
+        }
+
+        hasher = RowHasher(account_id)
+        pending = []
+        pending_errors = 0
+        processed = 0
+
+        def flush():
+            nonlocal pending, pending_errors
+            inserted, skipped = _write_chunk(conn, job['id'], account_id, pending,
+                                             processed, pending_errors)
+            result['rows_processed'] = processed
+            result['inserted'] += inserted
+            result['skipped'] += skipped
+            result['error_count'] += pending_errors
+            pending, pending_errors = [], 0
+            if progress:
+                progress(result)
+
+        try:
+            while True:
+                records = iter_records(stream, fmt, encoding, mapping)
+                try:
+                    for index, record in enumerate(records):
+                        processed = index + 1
+                        try:
+                            row = normalize_record(record)
+                            validate_import_row(dict(row, account_id=account_id), {account_id})
+                            row['import_hash'] = hasher(row)
+                        except UngroupedDates:
+                            raise
+                        except Exception as e:
+                            if index >= resume_from:
+                                pending_errors += 1
+                                if len(result['errors']) < MAX_REPORTED_ERRORS:
+                                    result['errors'].append({'index': index, 'data': record, 'error': str(e)})
+                            continue
+
+                        # 已提交过的行只需参与哈希序号计算
+                        if index < resume_from:
+                            continue
+
+                        pending.append(row)
+                        if len(pending) + pending_errors >= chunk_size:
+                            flush()
+                    break
+                except UngroupedDates:
+                    # 已提交分块的哈希不受影响：丢弃未提交的行，改为在整个文件范围内累计出现次数，
+                    # 从头计算哈希序号并从最后提交的位置继续写入
+                    hasher = RowHasher(account_id, grouped=False)
+                    resume_from = result['rows_processed']
+                    pending, pending_errors = [], 0
+                    result['errors'] = [error for error in result['errors'] if error['index'] < resume_from]
+                finally:
+                    records.close()
+                stream.seek(0)
+
+            if pending or pending_errors or processed > result['rows_processed']:
+                flush()
+
+        except Exception as e:
+            conn.rollback()
+            # 已提交的分块中 balance_after 为空，失败时同样重算，账户余额不必等到重新导入
+            try:
+                _recompute_job_balances(conn, job['id'], account_id)
+            except Exception as recompute_error:
+                conn.rollback()
+                print(f"导入失败后重算余额失败: {recompute_error}")
+            conn.execute('''
+                UPDATE import_jobs SET status = 'failed', message = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (str(e), job['id']))
+            conn.commit()
+            raise
+
+        _recompute_job_balances(conn, job['id'], account_id)
+        conn.execute('''
+            UPDATE import_jobs SET status = 'completed', updated_at = CURRENT_TIMESTAMP WHERE id = ?
+        ''', (job['id'],))
+        conn.commit()
+        result['status'] = 'completed'
+        return result
+
+    finally:
+        conn.close()
+
+
+def get_import_job(job_id):
+    """获取导入任务进度"""
+    conn = get_db_connection()
+    job = conn.execute('SELECT * FROM import_jobs WHERE id = ?', (job_id,)).fetchone()
+    conn.close()
+    return job
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='导入 CSV / OFX / QIF 账单')
+    parser.add_argument('path', help='账单文件路径')
+    parser.add_argument('--account-id', type=int, required=True, help='导入到的账户ID')
+    parser.add_argument('--format', choices=SUPPORTED_FORMATS, help='账单格式，默认按扩展名识别')
+    parser.add_argument('--encoding', help='文件编码，默认自动识别 UTF-8 / GB18030')
+    parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE, help='每次提交的行数')
+    args = parser.parse_args()
+
+    def print_progress(result):
+        print(f"\r已处理 {result['rows_processed']:,} 行，新增 {result['inserted']:,}，"
+              f"跳过重复 {result['skipped']:,}，错误 {result['error_count']:,}", end='', flush=True)
+
+    with open(args.path, 'rb') as f:
+        summary = import_statement(f, args.account_id, fmt=args.format,
+                                   filename=os.path.basename(args.path), encoding=args.encoding,
+                                   chunk_size=args.chunk_size, progress=print_progress)
+    print()
+    if summary['resumed_from']:
+        print(f"从第 {summary['resumed_from']:,} 行继续导入")
+    for error in summary['errors']:
+        print(f"  第 {error['index'] + 1} 行: {error['error']}")
+    print(f"导入完成（任务 #{summary['job_id']}）")
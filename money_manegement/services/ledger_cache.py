@@ -0,0 +1,336 @@
+# services/ledger_cache.py
+"""
+交易表的进程内列式缓存
+按 id 顺序把交易保存为 NumPy 列（日期序数、账户ID、类型编码、分类编码、金额），
+分析函数在列上做向量化的区间过滤、分组汇总与滚动求和，不再逐行构造 sqlite3.Row
+
+- 启动时在后台线程加载，加载完成前以及超出内存预算时返回 None，调用方回退到SQL
+- 新增的交易在下次读取时按 id 增量追加；修改、删除交易后缓存作废并在后台重新加载
+- 缓存属于单个进程，读取时用 ledger_stats 中由触发器维护的交易数与修改计数核对，
+  其他进程的增删改同样会被发现
+"""
+
+import threading
+
+import numpy as np
+
+from config import LEDGER_CACHE, LEDGER_CACHE_MAX_MB
+from database.database import get_db_connection
+
+# 每行占用的字节数：id + 日期 + 账户 + 类型 + 分类 + 金额
+ROW_BYTES = 8 + 4 + 4 + 1 + 4 + 8
+LOAD_CHUNK_SIZE = 100000
+EPOCH = np.datetime64('1970-01-01', 'D')
+
+
+def day_ordinal(value):
+    """YYYY-MM-DD 转为 1970-01-01 起的天数"""
+    return int((np.datetime64(value[:10], 'D') - EPOCH).astype(np.int64))
+
+
+class Vocabulary:
+    """字符串与紧凑整数编码的双向映射，NULL 与空串编码为 0"""
+
+    def __init__(self):
+        self.names = ['']
+        self.codes = {'': 0}
+
+    def encode(self, name):
+        name = name or ''
+        code = self.codes.get(name)
+        if code is None:
+            code = self.codes[name] = len(self.names)
+            self.names.append(name)
+        return code
+
+    def code(self, name):
+        """已有名称的编码，不存在时为 -1"""
+        return self.codes.get(name or '', -1)
+
+
+class LedgerColumns:
+    """某一时刻缓存内容的只读视图"""
+
+    def __init__(self, ids, day, account, type_code, category, amount, types, categories):
+        self.ids = ids
+        self.day = day
+        self.account = account
+        self.type_code = type_code
+        self.category = category
+        self.amount = amount
+        self.types = types
+        self.categories = categories
+
+    def __len__(self):
+        return len(self.ids)
+
+    def between(self, start_date=None, end_date=None):
+        """日期在 [start_date, end_date] 内的行掩码"""
+        mask = np.ones(len(self.ids), dtype=bool)
+        if start_date:
+            mask &= self.day >= day_ordinal(start_date)
+        if end_date:
+            mask &= self.day <= day_ordinal(end_date)
+        return mask
+
+    def type_mask(self, *type_names):
+        return np.isin(self.type_code, [self.types.code(name) for name in type_names])
+
+    def signed_amount(self):
+        """收入为正、支出为负、其他类型为0的余额变动"""
+        signs = np.zeros(len(self.types.names))
+        for name, sign in (('收入', 1), ('支出', -1)):
+            code = self.types.code(name)
+            if code > 0:
+                signs[code] = sign
+        return self.amount * signs[self.type_code]
+
+    def _field(self, field, mask):
+        if field == 'day':
+            return self.day[mask].astype(np.int64)
+        if field == 'month':
+            days = self.day[mask]
+            if not len(days):
+                return days.astype(np.int64)
+            # 区间内每天所属月份的查找表，避免逐行做日期换算
+            first = int(days.min())
+            months = (EPOCH + np.arange(first, int(days.max()) + 1)).astype('datetime64[M]').astype(np.int64)
+            return months[days - first]
+        if field == 'type':
+            return self.type_code[mask].astype(np.int64)
+        if field == 'category':
+            return self.category[mask].astype(np.int64)
+        if field == 'account':
+            return self.account[mask].astype(np.int64)
+        raise ValueError(f"不支持的分组字段: {field}")
+
+    def group_by(self, mask, *fields):
+        """
+        按字段分组汇总金额
+        各字段平移到从0开始后按混合进制合成一个整数键，键空间不大时直接 bincount，否则排序去重
+        :param fields: day / month / type / category / account
+        :return: ([各分组字段的取值数组], 合计数组, 笔数数组)，按分组字段排序
+        """
+        values = [self._field(field, mask) for field in fields]
+        amounts = self.amount[mask]
+        if not len(amounts):
+            return [np.array([], dtype=np.int64) for _ in fields], np.array([]), np.array([], dtype=np.int64)
+
+        lows, spans = [], []
+        key = np.zeros(len(amounts), dtype=np.int64)
+        for column in values:
+            low = int(column.min())
+            span = int(column.max()) - low + 1
+            key = key * span + (column - low)
+            lows.append(low)
+            spans.append(span)
+
+        size = int(np.prod(spans, dtype=np.float64))
+        if size <= max(4 * len(amounts), 1 << 20):
+            counts = np.bincount(key, minlength=size)
+            totals = np.bincount(key, weights=amounts, minlength=size)
+            present = np.flatnonzero(counts)
+            counts, totals = counts[present], totals[present]
+        else:
+            present, inverse = np.unique(key, return_inverse=True)
+            counts = np.bincount(inverse, minlength=len(present))
+            totals = np.bincount(inverse, weights=amounts, minlength=len(present))
+
+        groups = []
+        for low, span in zip(reversed(lows), reversed(spans)):
+            groups.append(present % span + low)
+            present = present // span
+        return groups[::-1], totals, counts
+
+    def decode(self, field, values):
+        """把 group_by() 返回的分组取值转回字符串"""
+        if field == 'day':
+            return (EPOCH + np.asarray(values)).astype(str).tolist()
+        if field == 'month':
+            return np.asarray(values).astype('datetime64[M]').astype(str).tolist()
+        if field == 'type':
+            return [self.types.names[v] for v in values]
+        if field == 'category':
+            return [self.categories.names[v] for v in values]
+        return np.asarray(values).tolist()
+
+
+class LedgerCache:
+    """列式缓存，容量按倍数增长以便追加；读取方拿到的视图在重新加载后仍然有效"""
+
+    def __init__(self, enabled=LEDGER_CACHE, max_bytes=LEDGER_CACHE_MAX_MB * 1024 * 1024):
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._loader = None
+        self._reset()
+        self.loads = 0
+        self.fallbacks = 0
+        self.over_budget = False
+
+    def _reset(self):
+        self._size = 0
+        self._max_id = 0
+        self._modification_count = None
+        self._columns = None
+        self._types = Vocabulary()
+        self._categories = Vocabulary()
+        self.loaded = False
+
+    @property
+    def nbytes(self):
+        if self._columns is None:
+            return 0
+        return sum(column.nbytes for column in self._columns)
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'loaded': self.loaded,
+            'rows': self._size,
+            'bytes': self.nbytes,
+            'max_bytes': self.max_bytes,
+            'over_budget': self.over_budget,
+            'loads': self.loads,
+            'fallbacks': self.fallbacks,
+        }
+
+    def _allocate(self, capacity):
+        columns = (
+            np.empty(capacity, dtype=np.int64),    # id
+            np.empty(capacity, dtype=np.int32),    # 日期序数
+            np.empty(capacity, dtype=np.int32),    # 账户ID
+            np.empty(capacity, dtype=np.int8),     # 类型编码
+            np.empty(capacity, dtype=np.int32),    # 分类编码
+            np.empty(capacity, dtype=np.float64),  # 金额
+        )
+        if self._columns is not None:
+            for new, old in zip(columns, self._columns):
+                new[:self._size] = old[:self._size]
+        self._columns = columns
+
+    def _fits(self, rows):
+        return rows * ROW_BYTES <= self.max_bytes
+
+    def _append_rows(self, rows):
+        """在持有锁时追加一批 (id, date, account_id, type, category, amount)"""
+        if not rows:
+            return
+        needed = self._size + len(rows)
+        capacity = len(self._columns[0]) if self._columns is not None else 0
+        if needed > capacity:
+            # 按倍数扩容，但不超过预算
+            capacity = max(needed, min(capacity * 2, self.max_bytes // ROW_BYTES))
+            self._allocate(capacity)
+
+        ids, dates, account_ids, type_names, category_names, amounts = zip(*rows)
+        end = self._size + len(rows)
+        columns = self._columns
+        columns[0][self._size:end] = ids
+        columns[1][self._size:end] = (np.array([d[:10] for d in dates], dtype='datetime64[D]')
+                                      - EPOCH).astype(np.int32)
+        columns[2][self._size:end] = account_ids
+        columns[3][self._size:end] = [self._types.encode(name) for name in type_names]
+        columns[4][self._size:end] = [self._categories.encode(name) for name in category_names]
+        columns[5][self._size:end] = amounts
+        self._size = end
+        self._max_id = ids[-1]
+
+    def _read_stats(self, conn):
+        """:return: (交易数, 修改计数)，ledger_stats 为空时为 (0, 0)"""
+        row = conn.execute(
+            'SELECT transaction_count, modification_count FROM ledger_stats WHERE id = 1'
+        ).fetchone()
+        return (row[0], row[1]) if row else (0, 0)
+
+    def _read_rows(self, conn, after_id):
+        cursor = conn.execute('''
+            SELECT id, date, account_id, type, category, amount
+            FROM transactions WHERE id > ? ORDER BY id
+        ''', (after_id,))
+        while True:
+            rows = cursor.fetchmany(LOAD_CHUNK_SIZE)
+            if not rows:
+                break
+            yield [tuple(row) for row in rows]
+
+    def load(self):
+        """从数据库完整加载，超出预算时保持未加载状态"""
+        conn = get_db_connection()
+        try:
+            with self._lock:
+                # 先读修改计数再读行，加载期间发生的修改会在下次读取时触发重新加载
+                count, modification_count = self._read_stats(conn)
+                self._reset()
+                self.over_budget = not self._fits(count)
+                if self.over_budget:
+                    print(f"交易缓存超出内存预算（{count} 条交易），分析查询使用SQL")
+                    return False
+
+                self._allocate(max(count, 1024))
+                for rows in self._read_rows(conn, 0):
+                    if not self._fits(self._size + len(rows)):
+                        self._reset()
+                        self.over_budget = True
+                        return False
+                    self._append_rows(rows)
+                self._modification_count = modification_count
+                self.loaded = True
+                self.loads += 1
+                return True
+        finally:
+            conn.close()
+
+    def load_async(self):
+        """在后台线程加载，已有加载线程在运行时不重复启动"""
+        if not self.enabled or (self._loader is not None and self._loader.is_alive()):
+            return
+        self._loader = threading.Thread(target=self.load, name='ledger-cache-loader', daemon=True)
+        self._loader.start()
+
+    def invalidate(self):
+        """交易被修改或删除后调用，缓存作废并在后台重新加载"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.loaded = False
+        self.load_async()
+
+    def columns(self, conn):
+        """
+        返回与数据库一致的只读视图，追加期间新增的交易
+        未启用、未加载完成、超出预算或正在加载时返回 None，调用方应回退到SQL
+        """
+        if not self.enabled or not self.loaded or not self._lock.acquire(blocking=False):
+            if self.enabled:
+                self.fallbacks += 1
+            return None
+        try:
+            # 按 id 追加新交易，再核对交易总数与修改计数，任何修改或删除都需要重新加载
+            for rows in self._read_rows(conn, self._max_id):
+                if not self._fits(self._size + len(rows)):
+                    self._reset()
+                    self.over_budget = True
+                    self.fallbacks += 1
+                    return None
+                self._append_rows(rows)
+            count, modification_count = self._read_stats(conn)
+            if count != self._size or modification_count != self._modification_count:
+                self.loaded = False
+                self.fallbacks += 1
+                reload = True
+            else:
+                reload = False
+                size = self._size
+                view = LedgerColumns(*(column[:size] for column in self._columns),
+                                     types=self._types, categories=self._categories)
+        finally:
+            self._lock.release()
+
+        if reload:
+            self.load_async()
+            return None
+        return view
+
+
+ledger_cache = LedgerCache()
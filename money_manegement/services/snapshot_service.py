@@ -0,0 +1,314 @@
+# services/snapshot_service.py
+"""
+资产快照的定时生成、历史补齐与账户明细读取
+asset_snapshots 每天至多一条（snapshot_date 唯一），趋势查询直接按日期区间读取；
+缺失的历史快照由交易记录一次性倒推重建，批量写入；补录或修改历史交易后，
+snapshot_state.stale_from 之后的自动快照在下次补齐时原地重建，手动快照保持不变
+各账户余额按关键帧加增量保存在 snapshot_items，存储格式见 database/snapshot_items.py
+
+用法: python -m services.snapshot_service backfill [--start YYYY-MM-DD] [--end YYYY-MM-DD]
+      python -m services.snapshot_service run
+"""
+
+import argparse
+import threading
+from collections import defaultdict
+from datetime import date, timedelta
+
+from config import SNAPSHOT_BACKFILL_DAYS, SNAPSHOT_INTERVAL
+from database.database import create_snapshot, get_db_connection, init_db
+from database.snapshot_items import (diff_items, is_keyframe_due, load_snapshot_state,
+                                     rebase_next, write_items)
+from services.analytics_service import ASSET_TYPES
+
+
+def get_snapshot_breakdown(snapshot_date=None):
+    """
+    获取不晚于 snapshot_date（默认今天）的最近一个快照的账户明细
+    :return: {'snapshot_date', 'total_assets', 'is_manual', 'stale', 'accounts': [{account_id, name, category, type, balance}]}，
+             stale 表示历史交易变动后尚未重建；没有快照时为 None
+    """
+    snapshot_date = date.fromisoformat(snapshot_date).isoformat() if snapshot_date else date.today().isoformat()
+    conn = get_db_connection()
+    snapshot = conn.execute('''
+        SELECT snapshot_date, total_assets, is_manual FROM asset_snapshots
+        WHERE snapshot_date <= ? ORDER BY snapshot_date DESC LIMIT 1
+    ''', (snapshot_date,)).fetchone()
+    if snapshot is None:
+        conn.close()
+        return None
+    stale_from = get_stale_from(conn)
+
+    state = load_snapshot_state(conn, snapshot['snapshot_date'])
+    accounts = []
+    if state:
+        placeholders = ','.join('?' * len(state))
+        for row in conn.execute(f'''
+            SELECT a.id, a.name, c.name as category, c.type
+            FROM accounts a
+            LEFT JOIN categories c ON a.category_id = c.id
+            WHERE a.id IN ({placeholders})
+        ''', list(state)):
+            accounts.append({
+                'account_id': row['id'],
+                'name': row['name'],
+                'category': row['category'],
+                'type': row['type'],
+                'balance': state[row['id']],
+            })
+    conn.close()
+
+    accounts.sort(key=lambda a: (a['type'] or '', -a['balance']))
+    return {
+        'snapshot_date': snapshot['snapshot_date'],
+        'total_assets': snapshot['total_assets'],
+        'is_manual': bool(snapshot['is_manual']),
+        'stale': (not snapshot['is_manual'] and stale_from is not None
+                  and snapshot['snapshot_date'] >= stale_from),
+        'accounts': accounts,
+    }
+
+
+def get_stale_from(conn):
+    """自动快照开始过期的日期，没有过期快照时为 None"""
+    row = conn.execute('SELECT stale_from FROM snapshot_state WHERE id = 1').fetchone()
+    return row[0] if row else None
+
+
+def backfill_snapshots(start_date=None, end_date=None):
+    """
+    补齐 [start_date, end_date] 内缺失的每日快照，并原地重建已过期的自动快照
+    有过期标记时区间起点提前到 stale_from；未过期的快照与手动快照保持不变
+    从区间起点的账户余额出发逐日累加按天汇总的变动，同时得到资产合计与变化的账户，
+    全部快照及明细在一个事务中批量写入
+    :param start_date: 默认最早一笔交易的日期
+    :param end_date: 默认昨天，晚于昨天时截到昨天（当天快照由 create_snapshot() 生成）
+    :return: 新写入或重建的快照数
+    """
+    yesterday = date.today() - timedelta(days=1)
+    end = min(date.fromisoformat(end_date), yesterday) if end_date else yesterday
+
+    conn = get_db_connection()
+    try:
+        if start_date is None:
+            start_date = conn.execute('SELECT MIN(day) FROM transaction_daily').fetchone()[0]
+            if start_date is None:
+                return 0
+        start = date.fromisoformat(start_date[:10])
+        if start > end:
+            return 0
+
+        # 读取与写入在同一个写事务中，避免与定时任务及交易写入交错
+        conn.execute('BEGIN IMMEDIATE')
+        stale_from = get_stale_from(conn)
+        if stale_from is not None and stale_from <= end.isoformat():
+            start = min(start, date.fromisoformat(stale_from))
+            # 重建覆盖到 end，之后的日期仍视为过期
+            conn.execute('UPDATE snapshot_state SET stale_from = ? WHERE id = 1',
+                         ((end + timedelta(days=1)).isoformat(),))
+        else:
+            stale_from = None
+
+        existing = {}
+        rebuild = []
+        for snapshot_date, is_keyframe, is_manual in conn.execute('''
+            SELECT snapshot_date, is_keyframe, is_manual FROM asset_snapshots
+            WHERE snapshot_date BETWEEN ? AND ?
+        ''', (start.isoformat(), end.isoformat())):
+            if stale_from is not None and snapshot_date >= stale_from and not is_manual:
+                rebuild.append(snapshot_date)
+            else:
+                existing[snapshot_date] = is_keyframe
+        if len(existing) == (end - start).days + 1:
+            conn.commit()
+            return 0
+
+        # 启用账户的当前余额，非资产类型的账户只记明细不计入合计
+        accounts = {}
+        for row in conn.execute('''
+            SELECT a.id, a.balance, c.type
+            FROM accounts a
+            JOIN categories c ON a.category_id = c.id
+            WHERE a.is_active = 1
+        '''):
+            type_index = ASSET_TYPES.index(row['type']) if row['type'] in ASSET_TYPES else -1
+            accounts[row['id']] = (type_index, row['balance'])
+
+        # 起点之后每天每个账户的收支合计
+        changes = defaultdict(lambda: defaultdict(float))
+        later = defaultdict(float)
+        for day, account_id, amount in conn.execute('''
+            SELECT day, account_id, SUM(CASE type WHEN '收入' THEN total ELSE -total END)
+            FROM transaction_daily
+            WHERE day > ? AND type IN ('收入', '支出')
+            GROUP BY day, type, account_id
+        ''', (start.isoformat(),)):
+            if account_id in accounts:
+                later[account_id] += amount
+                changes[day][account_id] += amount
+
+        state = {aid: round(balance - later[aid], 2) for aid, (_, balance) in accounts.items()}
+        totals = [0.0] * len(ASSET_TYPES)
+        for aid, (type_index, _) in accounts.items():
+            if type_index >= 0:
+                totals[type_index] += state[aid]
+
+        previous_date = conn.execute(
+            'SELECT MAX(snapshot_date) FROM asset_snapshots WHERE snapshot_date < ?', (start.isoformat(),)
+        ).fetchone()[0]
+        keyframe_date = conn.execute('''
+            SELECT MAX(snapshot_date) FROM asset_snapshots
+            WHERE is_keyframe = 1 AND snapshot_date < ?
+        ''', (start.isoformat(),)).fetchone()[0]
+
+        snapshot_rows = []
+        item_rows = []
+        rebased = []
+        inserted_before = False  # 前一天是否为本次补齐的快照
+        day = start
+        while day <= end:
+            day_str = day.isoformat()
+            changed = {}
+            old_values = {}
+            if day > start:
+                for aid, amount in changes.get(day_str, {}).items():
+                    old = state[aid]
+                    new = round(old + amount, 2)
+                    if new != old:
+                        state[aid] = new
+                        changed[aid] = new
+                        old_values[aid] = old
+                        type_index = accounts[aid][0]
+                        if type_index >= 0:
+                            totals[type_index] += new - old
+
+            if day_str in existing:
+                # 未过期的快照与手动快照保持原有余额
+                if existing[day_str]:
+                    keyframe_date = day_str
+                elif inserted_before:
+                    # 已有快照的基准变为刚补齐的前一天
+                    base = {**state, **old_values}
+                    rebased.append((day_str, diff_items(base, load_snapshot_state(conn, day_str))))
+                previous_date = day_str
+                inserted_before = False
+            else:
+                is_keyframe = is_keyframe_due(day, keyframe_date)
+                if is_keyframe:
+                    items = list(state.items())
+                    keyframe_date = day_str
+                elif inserted_before:
+                    items = list(changed.items())
+                else:
+                    items = diff_items(load_snapshot_state(conn, previous_date), state)
+
+                rounded = [round(total, 2) for total in totals]
+                snapshot_rows.append((day_str, round(sum(rounded), 2), rounded[0], rounded[1], rounded[2],
+                                      int(is_keyframe)))
+                item_rows.extend((day_str, aid, balance) for aid, balance in items)
+                inserted_before = True
+            day += timedelta(days=1)
+
+        # 区间之后的第一个快照同样要换到新基准
+        rebase = rebase_next(conn, end.isoformat(), state) if inserted_before else None
+
+        # 所有读取（包括被重建快照之后的手动快照原有余额）都已完成，开始写入
+        conn.executemany('DELETE FROM snapshot_items WHERE snapshot_date = ?', [(d,) for d in rebuild])
+        conn.executemany('''
+            INSERT INTO asset_snapshots
+            (snapshot_date, total_assets, total_liquid, total_investment, total_fixed, is_keyframe)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (snapshot_date) DO UPDATE SET
+                total_assets = excluded.total_assets,
+                total_liquid = excluded.total_liquid,
+                total_investment = excluded.total_investment,
+                total_fixed = excluded.total_fixed,
+                is_keyframe = excluded.is_keyframe
+        ''', snapshot_rows)
+        conn.executemany('INSERT INTO snapshot_items (snapshot_date, account_id, balance) VALUES (?, ?, ?)',
+                         item_rows)
+        for snapshot_date, items in rebased:
+            write_items(conn, snapshot_date, False, items)
+        if rebase is not None:
+            rebase()
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    return len(snapshot_rows)
+
+
+def run_snapshot_job(backfill_days=SNAPSHOT_BACKFILL_DAYS):
+    """补齐最近 backfill_days 天缺失的快照并生成（覆盖）当天快照"""
+    start = date.today() - timedelta(days=backfill_days)
+    filled = backfill_snapshots(start.isoformat())
+    create_snapshot()
+    return filled
+
+
+class SnapshotScheduler:
+    """后台线程按固定间隔执行 run_snapshot_job()，启动时立即执行一次"""
+
+    def __init__(self, interval=SNAPSHOT_INTERVAL):
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='snapshot-scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                filled = run_snapshot_job()
+                if filled:
+                    print(f"已补齐 {filled} 个历史快照")
+            except Exception as e:
+                print(f"资产快照任务失败: {e}")
+            self._stop_event.wait(self.interval)
+
+
+_scheduler = None
+
+
+def start_scheduler(interval=SNAPSHOT_INTERVAL):
+    """启动全局快照定时任务，重复调用不会启动多个线程"""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = SnapshotScheduler(interval)
+    _scheduler.start()
+    return _scheduler
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='资产快照生成与历史补齐')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    backfill_parser = subparsers.add_parser('backfill', help='按交易记录补齐缺失的历史快照')
+    backfill_parser.add_argument('--start', help='起始日期，默认最早一笔交易的日期')
+    backfill_parser.add_argument('--end', help='结束日期，默认昨天')
+    subparsers.add_parser('run', help='执行一次定时任务：补齐最近的快照并生成当天快照')
+    args = parser.parse_args()
+
+    init_db()
+    if args.command == 'backfill':
+        filled = backfill_snapshots(args.start, args.end)
+    else:
+        filled = run_snapshot_job()
+    print(f"补齐完成，共写入 {filled} 个快照")
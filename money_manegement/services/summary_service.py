@@ -0,0 +1,148 @@
+# services/summary_service.py
+"""
+资产汇总表一致性检查
+category_summary / platform_summary / ledger_stats 由触发器维护，
+本模块从账户和交易表重新聚合，与汇总表逐项比较，并可按基础表重建汇总表
+
+用法: python -m services.summary_service [--repair]
+"""
+
+import argparse
+
+from database.database import get_db_connection, init_db
+
+# 余额合计允许的浮点误差
+BALANCE_TOLERANCE = 0.005
+
+
+def _expected_rows(conn):
+    """从基础表聚合出汇总表应有的内容，返回 {(表名, 键): (数量, 金额)}"""
+    expected = {}
+    for row in conn.execute('''
+        SELECT category_id, COUNT(*) as count, SUM(balance) as total
+        FROM accounts WHERE is_active = 1 AND category_id IS NOT NULL
+        GROUP BY category_id
+    '''):
+        expected[('category_summary', row['category_id'])] = (row['count'], row['total'])
+
+    for row in conn.execute('''
+        SELECT COALESCE(platform, '未分类') as platform, COUNT(*) as count, SUM(balance) as total
+        FROM accounts WHERE is_active = 1
+        GROUP BY COALESCE(platform, '未分类')
+    '''):
+        expected[('platform_summary', row['platform'])] = (row['count'], row['total'])
+
+    stats = conn.execute('''
+        SELECT
+            (SELECT COUNT(*) FROM accounts WHERE is_active = 1) as account_count,
+            (SELECT COUNT(*) FROM transactions) as transaction_count,
+            (SELECT MAX(updated_at) FROM accounts) as last_update
+    ''').fetchone()
+    expected[('ledger_stats', 'account_count')] = (stats['account_count'], None)
+    expected[('ledger_stats', 'transaction_count')] = (stats['transaction_count'], None)
+    expected[('ledger_stats', 'last_update')] = (stats['last_update'], None)
+    return expected
+
+
+def _stored_rows(conn):
+    """读取汇总表当前内容，格式同 _expected_rows()，数量为0的行视为不存在"""
+    stored = {}
+    for row in conn.execute('SELECT * FROM category_summary WHERE account_count > 0'):
+        stored[('category_summary', row['category_id'])] = (row['account_count'], row['total_balance'])
+    for row in conn.execute('SELECT * FROM platform_summary WHERE account_count > 0'):
+        stored[('platform_summary', row['platform'])] = (row['account_count'], row['total_balance'])
+
+    stats = conn.execute('SELECT * FROM ledger_stats WHERE id = 1').fetchone()
+    if stats is not None:
+        for key in ('account_count', 'transaction_count', 'last_update'):
+            stored[('ledger_stats', key)] = (stats[key], None)
+    return stored
+
+
+def _differs(a, b):
+    if a is None or b is None:
+        return a != b
+    if a[0] != b[0]:
+        return True
+    if a[1] is None or b[1] is None:
+        return a[1] != b[1]
+    return abs(a[1] - b[1]) > BALANCE_TOLERANCE
+
+
+def rebuild_summary(conn):
+    """在调用方的事务中按基础表重建全部汇总表"""
+    conn.execute('DELETE FROM category_summary')
+    conn.execute('''
+        INSERT INTO category_summary (category_id, account_count, total_balance)
+        SELECT category_id, COUNT(*), SUM(balance)
+        FROM accounts WHERE is_active = 1 AND category_id IS NOT NULL
+        GROUP BY category_id
+    ''')
+    conn.execute('DELETE FROM platform_summary')
+    conn.execute('''
+        INSERT INTO platform_summary (platform, account_count, total_balance)
+        SELECT COALESCE(platform, '未分类'), COUNT(*), SUM(balance)
+        FROM accounts WHERE is_active = 1
+        GROUP BY COALESCE(platform, '未分类')
+    ''')
+    conn.execute('''
+        INSERT INTO ledger_stats (id, account_count, transaction_count, last_update)
+        VALUES (1,
+                (SELECT COUNT(*) FROM accounts WHERE is_active = 1),
+                (SELECT COUNT(*) FROM transactions),
+                (SELECT MAX(updated_at) FROM accounts))
+        ON CONFLICT (id) DO UPDATE SET
+            account_count = excluded.account_count,
+            transaction_count = excluded.transaction_count,
+            last_update = excluded.last_update
+    ''')
+
+
+def check_summary(repair=False):
+    """
+    检查汇总表与基础表是否一致
+    :param repair: 存在差异时重建汇总表
+    :return: 差异列表 [{'table', 'key', 'expected', 'stored'}]
+    """
+    conn = get_db_connection()
+    try:
+        expected = _expected_rows(conn)
+        stored = _stored_rows(conn)
+
+        differences = []
+        for key in sorted(expected.keys() | stored.keys(), key=str):
+            if _differs(expected.get(key), stored.get(key)):
+                differences.append({
+                    'table': key[0],
+                    'key': key[1],
+                    'expected': expected.get(key),
+                    'stored': stored.get(key),
+                })
+
+        if differences and repair:
+            rebuild_summary(conn)
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    return differences
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='资产汇总表一致性检查')
+    parser.add_argument('--repair', action='store_true', help='发现差异时按基础表重建汇总表')
+    args = parser.parse_args()
+
+    init_db()
+    differences = check_summary(args.repair)
+    for diff in differences:
+        print(f"{diff['table']}[{diff['key']}]: 应为 {diff['expected']}，实际 {diff['stored']}")
+    if not differences:
+        print("汇总表与基础表一致")
+    elif args.repair:
+        print(f"发现 {len(differences)} 处差异，已重建汇总表")
+    else:
+        print(f"发现 {len(differences)} 处差异，可使用 --repair 重建")
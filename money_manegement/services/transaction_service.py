@@ -1,13 +1,69 @@
 # services/transaction_service.py
 from database.database import get_db_connection
+from services.balance_service import recompute_balances
+from services.ledger_cache import ledger_cache
 from datetime import datetime
+import base64
+import html
+import math
+import re
+
+# app.py 以 import * 引入本模块，只导出交易服务接口；
+# balance_delta、validate_import_row 等供其他服务显式导入的辅助函数不在其中
+__all__ = [
+    'TRANSACTION_TYPES', 'DEFAULT_PAGE_SIZE', 'MAX_PAGE_SIZE',
+    'encode_cursor', 'decode_cursor',
+    'list_transactions', 'get_transaction', 'list_transactions_page', 'search_transactions',
+    'add_transaction', 'update_transaction', 'delete_transaction',
+    'get_transaction_categories', 'get_category_totals', 'get_daily_totals',
+    'get_weekday_totals', 'get_month_category_totals',
+    'batch_import_transactions', 'transfer_between_accounts',
+    'TransactionService',
+]
+
+TRANSACTION_TYPES = ('收入', '支出', '转账')
+
+# 批量导入时每次 executemany 写入的行数
+IMPORT_CHUNK_SIZE = 5000
+
+# 交易列表分页的默认与最大每页条数
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# 全文索引使用 trigram 分词，短于三个字符的搜索词无法走索引；两个字符的词走二元组索引
+SEARCH_MIN_TERM_LENGTH = 3
+SEARCH_BIGRAM_LENGTH = 2
+# 两个字符的词命中的交易达到该数量时不走二元组索引，按日期倒序扫描很快就能凑满一页
+SEARCH_BIGRAM_SCAN_THRESHOLD = 10000
+HIGHLIGHT_OPEN = '<mark>'
+HIGHLIGHT_CLOSE = '</mark>'
+
+
+def encode_cursor(date, tx_id):
+    """把交易的 (date, id) 编码为不透明的分页游标"""
+    return base64.urlsafe_b64encode(f'{date}|{tx_id}'.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """解析分页游标，返回 (date, id)"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        date, tx_id = base64.urlsafe_b64decode(padded).decode('utf-8').split('|')
+        return date, int(tx_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError(f"无效的分页游标: {cursor}")
 
 
 def list_transactions(account_id=None, start_date=None, end_date=None,
-                      transaction_type=None, limit=None):
-    """获取交易列表，支持多种筛选条件"""
+                      transaction_type=None, limit=None, cursor=None, direction='next'):
+    """
+    获取交易列表，支持多种筛选条件
+    传入 cursor 时按 (date, id) 键集分页：direction='next' 取游标之后（更早）的交易，
+    'prev' 取游标之前（更新）的交易；结果始终按 date DESC, id DESC 排列
+    """
     conn = get_db_connection()
 
+    # CROSS JOIN 固定以交易表为外层循环，保证按 (date, id) 索引顺序输出而不是先遍历账户再排序
     query = '''
         SELECT 
             t.*,
@@ -17,8 +73,8 @@ def list_transactions(account_id=None, start_date=None, end_date=None,
             c.icon as category_icon,
             c.color as category_color
         FROM transactions t
-        JOIN accounts a ON t.account_id = a.id
-        JOIN categories c ON a.category_id = c.id
+        CROSS JOIN accounts a ON t.account_id = a.id
+        CROSS JOIN categories c ON a.category_id = c.id
         WHERE 1=1
     '''
     params = []
@@ -39,7 +95,12 @@ def list_transactions(account_id=None, start_date=None, end_date=None,
         query += ' AND t.type = ?'
         params.append(transaction_type)
 
-    query += ' ORDER BY t.date DESC, t.id DESC'
+    backward = cursor is not None and direction == 'prev'
+    if cursor is not None:
+        query += ' AND (t.date, t.id) > (?, ?)' if backward else ' AND (t.date, t.id) < (?, ?)'
+        params.extend(decode_cursor(cursor))
+
+    query += ' ORDER BY t.date, t.id' if backward else ' ORDER BY t.date DESC, t.id DESC'
 
     if limit:
         query += ' LIMIT ?'
@@ -47,9 +108,226 @@ def list_transactions(account_id=None, start_date=None, end_date=None,
 
     transactions = conn.execute(query, params).fetchall()
     conn.close()
+
+    if backward:
+        transactions.reverse()
     return transactions
 
 
+def get_transaction(tx_id):
+    """按主键获取单条交易"""
+    conn = get_db_connection()
+    transaction = conn.execute('''
+        SELECT 
+            t.*,
+            a.name as account_name,
+            a.platform,
+            a.updated_at as account_updated_at,
+            c.name as account_category,
+            c.icon as category_icon,
+            c.color as category_color
+        FROM transactions t
+        JOIN accounts a ON t.account_id = a.id
+        JOIN categories c ON a.category_id = c.id
+        WHERE t.id = ?
+    ''', (tx_id,)).fetchone()
+    conn.close()
+    return transaction
+
+
+def list_transactions_page(account_id=None, start_date=None, end_date=None,
+                           transaction_type=None, per_page=DEFAULT_PAGE_SIZE, cursor=None,
+                           direction='next'):
+    """
+    按游标获取一页交易，无论翻到多深都只读取 per_page + 1 行
+    :return: {'items', 'next_cursor', 'prev_cursor', 'has_next', 'has_prev'}
+    """
+    rows = list_transactions(account_id, start_date, end_date, transaction_type,
+                             limit=per_page + 1, cursor=cursor, direction=direction)
+
+    # 多取的一行用于判断该方向上是否还有数据
+    has_more = len(rows) > per_page
+    if direction == 'prev' and cursor is not None:
+        items = rows[-per_page:] if has_more else rows
+        has_prev, has_next = has_more, True
+    else:
+        items = rows[:per_page]
+        has_prev, has_next = cursor is not None, has_more
+
+    return {
+        'items': items,
+        'next_cursor': encode_cursor(items[-1]['date'], items[-1]['id']) if items and has_next else None,
+        'prev_cursor': encode_cursor(items[0]['date'], items[0]['id']) if items and has_prev else None,
+        'has_next': bool(items) and has_next,
+        'has_prev': bool(items) and has_prev,
+    }
+
+
+def _split_search_terms(query):
+    """
+    把搜索词按空白拆分，返回 (全部搜索词, FTS 匹配表达式, 短词列表)
+    trigram 分词至少需要三个字符，更短的词（如"外卖"）无法使用全文索引，改用二元组索引加 LIKE 匹配
+    """
+    terms = list(dict.fromkeys(query.split()))
+    long_terms = [t for t in terms if len(t) >= SEARCH_MIN_TERM_LENGTH]
+    short_terms = [t for t in terms if len(t) < SEARCH_MIN_TERM_LENGTH]
+    # 每个词作为短语加引号，避免用户输入被解析为 FTS 查询语法
+    match = ' AND '.join('"{}"'.format(t.replace('"', '""')) for t in long_terms)
+    return terms, match, short_terms
+
+
+def _bigram_is_selective(conn, term):
+    """两个字符的词命中的交易是否少到值得先由二元组索引取出再排序"""
+    count = conn.execute('''
+        SELECT COUNT(*) FROM (
+            SELECT 1 FROM transaction_bigrams WHERE gram IN (lower(?), '') LIMIT ?
+        )
+    ''', (term, SEARCH_BIGRAM_SCAN_THRESHOLD)).fetchone()[0]
+    return count < SEARCH_BIGRAM_SCAN_THRESHOLD
+
+
+def _highlight(text, terms):
+    """
+    转义文本中的 HTML 后用标记包裹出现的搜索词，结果可直接作为 HTML 插入页面
+    trigram 的匹配就是子串匹配，在 Python 中只处理当前页即可，不必让 SQLite 为全部命中行调用 highlight()
+    """
+    if not text:
+        return text
+    # 在原文中一次匹配所有词，长词优先，与全文索引、LIKE 一样不区分大小写；
+    # 匹配片段与其余片段分别转义，词不会命中转义产生的实体（如 &amp; 中的 amp）
+    pattern = '|'.join(re.escape(t) for t in sorted(terms, key=len, reverse=True))
+    parts = re.split(f'({pattern})', text, flags=re.IGNORECASE)
+    return ''.join(f'{HIGHLIGHT_OPEN}{html.escape(part)}{HIGHLIGHT_CLOSE}' if i % 2 else html.escape(part)
+                   for i, part in enumerate(parts))
+
+
+def search_transactions(query, account_id=None, start_date=None, end_date=None,
+                        transaction_type=None, per_page=DEFAULT_PAGE_SIZE, cursor=None,
+                        order='relevance'):
+    """
+    全文搜索交易的说明、备注和分类，可与账户、日期、类型筛选组合
+    含三个字符以上的词时走 FTS5 索引：order='relevance' 按 bm25 相关度排序，游标为 (rank, id)，
+    需要为全部命中行计算相关度；order='date' 按 (date, id) 倒序，命中行很多时更快
+    两个字符的词命中不多时先由二元组索引取出候选交易再 LIKE 过滤；其余短词按 (date, id) 倒序扫描
+    并逐行 LIKE 过滤，凑满一页即停止
+    :return: 同 list_transactions_page()，每条记录附带 description_highlight、note_highlight
+    """
+    if order not in ('relevance', 'date'):
+        raise ValueError(f"无效的排序方式: {order}")
+
+    terms, match, short_terms = _split_search_terms(query)
+    if not terms:
+        raise ValueError("搜索关键词不能为空")
+    by_rank = bool(match) and order == 'relevance'
+
+    conn = get_db_connection()
+
+    # 第一步只按筛选条件选出当前页的键，排序时只需搬运 (rank/date, id)；
+    # 第二步再按主键取出这一页的整行与账户信息
+    if by_rank and not (short_terms or account_id or start_date or end_date or transaction_type):
+        # 没有行级筛选时只在全文索引内排序，不必为每个命中行回表
+        page_sql = '''
+            SELECT rowid as id, rank FROM transactions_fts
+            WHERE transactions_fts MATCH ?
+        '''
+        params = [match]
+    elif match:
+        # 只有按相关度排序时才读取 rank，否则 SQLite 会为每个命中行计算 bm25
+        page_sql = '''
+            SELECT t.id, t.date{}
+            FROM transactions_fts
+            CROSS JOIN transactions t ON t.id = transactions_fts.rowid
+            WHERE transactions_fts MATCH ?
+        '''.format(', transactions_fts.rank as rank' if by_rank else '')
+        params = [match]
+    else:
+        page_sql = 'SELECT t.id, t.date FROM transactions t WHERE 1=1'
+        params = []
+
+    for term in short_terms:
+        if len(term) == SEARCH_BIGRAM_LENGTH and _bigram_is_selective(conn, term):
+            # 空二元组标记超长的文本，其中超出索引范围的部分只能由 LIKE 判断
+            page_sql += ''' AND t.id IN (SELECT transaction_id FROM transaction_bigrams
+                                         WHERE gram IN (lower(?), ''))'''
+            params.append(term)
+        pattern = '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        page_sql += r''' AND (t.description LIKE ? ESCAPE '\' OR t.note LIKE ? ESCAPE '\'
+                              OR t.category LIKE ? ESCAPE '\')'''
+        params.extend([pattern] * 3)
+
+    if account_id:
+        page_sql += ' AND t.account_id = ?'
+        params.append(account_id)
+
+    if start_date:
+        page_sql += ' AND t.date >= ?'
+        params.append(start_date)
+
+    if end_date:
+        page_sql += ' AND t.date <= ?'
+        params.append(end_date)
+
+    if transaction_type:
+        page_sql += ' AND t.type = ?'
+        params.append(transaction_type)
+
+    if cursor is not None:
+        key, tx_id = decode_cursor(cursor)
+        if by_rank:
+            page_sql += ' AND (transactions_fts.rank, transactions_fts.rowid) > (?, ?)'
+            params.extend([float(key), tx_id])
+        else:
+            page_sql += ' AND (t.date, t.id) < (?, ?)'
+            params.extend([key, tx_id])
+
+    order_by = 'rank, id' if by_rank else 'date DESC, id DESC'
+    page_sql += f' ORDER BY {order_by} LIMIT ?'
+    params.append(per_page + 1)
+
+    keys = conn.execute(page_sql, params).fetchall()
+
+    # 多取的一行用于判断是否还有下一页
+    has_next = len(keys) > per_page
+    keys = keys[:per_page]
+
+    rows = {}
+    if keys:
+        rows = {row['id']: row for row in conn.execute(f'''
+            SELECT
+                t.*,
+                a.name as account_name,
+                a.platform,
+                c.name as account_category,
+                c.icon as category_icon,
+                c.color as category_color
+            FROM transactions t
+            JOIN accounts a ON t.account_id = a.id
+            JOIN categories c ON a.category_id = c.id
+            WHERE t.id IN ({', '.join('?' * len(keys))})
+        ''', [key['id'] for key in keys])}
+    conn.close()
+
+    items = []
+    for key in keys:
+        item = dict(rows[key['id']])
+        item['description_highlight'] = _highlight(item['description'], terms)
+        item['note_highlight'] = _highlight(item['note'], terms)
+        items.append(item)
+
+    next_cursor = None
+    if items and has_next:
+        last = keys[-1]
+        next_cursor = encode_cursor(repr(last['rank']) if by_rank else last['date'], last['id'])
+
+    return {
+        'items': items,
+        'next_cursor': next_cursor,
+        'prev_cursor': None,
+        'has_next': has_next,
+        'has_prev': cursor is not None,
+    }
+
+
 def add_transaction(account_id, date, description, ttype, amount,
                     category=None, note=None):
     """添加交易记录"""
@@ -61,7 +339,7 @@ def add_transaction(account_id, date, description, ttype, amount,
         (account_id,)
     ).fetchone()['balance']
 
-    # 计算交易后余额
+    # 计算交易后余额（补录的历史交易由下方重算修正）
     if ttype == '收入':
         new_balance = current_balance + amount
     elif ttype == '支出':
@@ -85,6 +363,9 @@ def add_transaction(account_id, date, description, ttype, amount,
             (new_balance, account_id)
         )
 
+    # 补录历史日期的交易时，其后交易的 balance_after 随之变化
+    recompute_balances(conn, account_id, date)
+
     conn.commit()
     conn.close()
 
@@ -119,7 +400,7 @@ def update_transaction(tx_id, account_id, date, description, ttype, amount,
         conn.execute('''
             UPDATE transactions 
             SET account_id = ?, date = ?, description = ?, type = ?, 
-                amount = ?, category = ?, note = ?
+                amount = ?, category = ?, note = ?, updated_at = CURRENT_TIMESTAMP
             WHERE id = ?
         ''', (account_id, date, description, ttype, amount, category, note, tx_id))
 
@@ -135,8 +416,16 @@ def update_transaction(tx_id, account_id, date, description, ttype, amount,
                 (amount, account_id)
             )
 
+        # 原账户从原日期起、新账户从新日期起重算；同一账户时从较早的日期起
+        if old_tx['account_id'] == account_id:
+            recompute_balances(conn, account_id, min(old_tx['date'], date))
+        else:
+            recompute_balances(conn, old_tx['account_id'], old_tx['date'])
+            recompute_balances(conn, account_id, date)
+
     conn.commit()
     conn.close()
+    ledger_cache.invalidate()
 
 
 def delete_transaction(tx_id):
@@ -164,18 +453,21 @@ def delete_transaction(tx_id):
 
         # 删除交易记录
         conn.execute('DELETE FROM transactions WHERE id = ?', (tx_id,))
+        recompute_balances(conn, tx['account_id'], tx['date'])
 
     conn.commit()
     conn.close()
+    if tx:
+        ledger_cache.invalidate()
 
 
 def get_transaction_categories():
     """获取所有交易分类"""
     conn = get_db_connection()
     categories = conn.execute('''
-        SELECT DISTINCT category, type, COUNT(*) as count
-        FROM transactions
-        WHERE category IS NOT NULL
+        SELECT category, type, SUM(count) as count
+        FROM transaction_monthly
+        WHERE category != ''
         GROUP BY category, type
         ORDER BY count DESC
     ''').fetchall()
@@ -183,42 +475,179 @@ def get_transaction_categories():
     return categories
 
 
+def get_category_totals(ttype, start_date, end_date, category_type=None, limit=None):
+    """
+    区间内某类型交易按账户分类汇总（读日汇总表）
+    :param category_type: 只统计该资产类型（流动资产等）下账户的交易，None 表示全部
+    :return: [(分类名称, 合计)]，按合计从大到小
+    """
+    conn = get_db_connection()
+    query = '''
+        SELECT c.name, SUM(d.total) as total
+        FROM transaction_daily d
+        JOIN accounts a ON a.id = d.account_id
+        JOIN categories c ON c.id = a.category_id
+        WHERE d.type = ? AND d.day BETWEEN ? AND ?
+    '''
+    params = [ttype, start_date, end_date]
+    if category_type:
+        query += ' AND c.type = ?'
+        params.append(category_type)
+    query += ' GROUP BY c.name ORDER BY total DESC'
+    if limit:
+        query += ' LIMIT ?'
+        params.append(limit)
+
+    rows = conn.execute(query, params).fetchall()
+    conn.close()
+    return [(row['name'], row['total']) for row in rows]
+
+
+def get_daily_totals(ttype, start_date, end_date):
+    """
+    区间内某类型交易的每日合计（读日汇总表）
+    :return: {YYYY-MM-DD: 合计}，没有交易的日期不出现
+    """
+    conn = get_db_connection()
+    rows = conn.execute('''
+        SELECT day, SUM(total) as total
+        FROM transaction_daily
+        WHERE type = ? AND day BETWEEN ? AND ?
+        GROUP BY day
+    ''', (ttype, start_date, end_date)).fetchall()
+    conn.close()
+    return {row['day']: row['total'] for row in rows}
+
+
+def get_weekday_totals(ttype, start_date, end_date):
+    """
+    区间内某类型交易按 (周序号, 星期) 汇总（读日汇总表）
+    周序号从 start_date 起每7天加1，星期 0 为周一
+    :return: [(周序号, 星期, 合计)]
+    """
+    conn = get_db_connection()
+    rows = conn.execute('''
+        SELECT CAST(julianday(day) - julianday(?) AS INTEGER) / 7 as week,
+               (CAST(strftime('%w', day) AS INTEGER) + 6) % 7 as weekday,
+               SUM(total) as total
+        FROM transaction_daily
+        WHERE type = ? AND day BETWEEN ? AND ?
+        GROUP BY week, weekday
+    ''', (start_date, ttype, start_date, end_date)).fetchall()
+    conn.close()
+    return [(row['week'], row['weekday'], row['total']) for row in rows]
+
+
+def get_month_category_totals(month):
+    """
+    某月收入、支出按交易分类的合计（读月汇总表，一次分组查询）
+    :param month: YYYY-MM
+    :return: [(类型, 分类, 合计)]，未分类的交易分类为空字符串
+    """
+    conn = get_db_connection()
+    rows = conn.execute('''
+        SELECT type, category, SUM(total) as total
+        FROM transaction_monthly
+        WHERE month = ? AND type IN ('收入', '支出')
+        GROUP BY type, category
+    ''', (month,)).fetchall()
+    conn.close()
+    return [(row['type'], row['category'], row['total']) for row in rows]
+
+
+def balance_delta(ttype, amount):
+    """交易对账户余额的影响"""
+    if ttype == '收入':
+        return amount
+    if ttype == '支出':
+        return -amount
+    return 0  # 转账等其他类型不改变余额
+
+
+def validate_import_row(tx, account_ids):
+    """校验并规范化一条导入记录，返回 (account_id, date, description, type, amount, category, note)"""
+    required_fields = ['account_id', 'date', 'type', 'amount']
+    if not all(field in tx for field in required_fields):
+        raise ValueError("缺少必要字段")
+
+    account_id = int(tx['account_id'])
+    if account_id not in account_ids:
+        raise ValueError(f"账户不存在: {account_id}")
+
+    date = datetime.fromisoformat(str(tx['date'])).date().isoformat()
+
+    if tx['type'] not in TRANSACTION_TYPES:
+        raise ValueError(f"无效的交易类型: {tx['type']}")
+
+    amount = float(tx['amount'])
+    if not math.isfinite(amount):
+        raise ValueError(f"无效的金额: {tx['amount']}")
+
+    return (account_id, date, tx.get('description', ''), tx['type'],
+            amount, tx.get('category'), tx.get('note'))
+
+
 def batch_import_transactions(transactions_data):
-    """批量导入交易记录"""
+    """
+    批量导入交易记录
+    先整体校验，再在单个事务中分块插入；每个账户只执行一次余额更新，
+    再由 recompute_balances() 从该账户最早的导入日期起写入 balance_after
+    """
     conn = get_db_connection()
-    success_count = 0
     error_records = []
 
-    for idx, tx in enumerate(transactions_data):
-        try:
-            # 验证必要字段
-            required_fields = ['account_id', 'date', 'type', 'amount']
-            if not all(field in tx for field in required_fields):
-                raise ValueError("缺少必要字段")
-
-            # 添加交易
-            add_transaction(
-                account_id=tx['account_id'],
-                date=tx['date'],
-                description=tx.get('description', ''),
-                ttype=tx['type'],
-                amount=float(tx['amount']),
-                category=tx.get('category'),
-                note=tx.get('note')
-            )
-            success_count += 1
+    try:
+        account_ids = {row['id'] for row in conn.execute('SELECT id FROM accounts')}
+
+        # 校验所有记录
+        valid_rows = []
+        for idx, tx in enumerate(transactions_data):
+            try:
+                valid_rows.append((idx, validate_import_row(tx, account_ids)))
+            except Exception as e:
+                error_records.append({
+                    'index': idx,
+                    'data': tx,
+                    'error': str(e)
+                })
+
+        # 每个账户的余额变动与最早的导入日期
+        net_changes = {}
+        first_dates = {}
+        insert_rows = []
+        for _, (account_id, date, description, ttype, amount, category, note) in valid_rows:
+            first_dates[account_id] = min(date, first_dates.get(account_id, date))
+            net_changes[account_id] = net_changes.get(account_id, 0) + balance_delta(ttype, amount)
+            insert_rows.append((account_id, date, description, ttype, amount, category, note))
+
+        # 按日期顺序写入可以让日期相关索引顺序追加，减少B树页分裂
+        insert_rows.sort(key=lambda row: row[1])
+
+        # 分块写入，所有块处于同一个隐式事务中，最后统一提交
+        for start in range(0, len(insert_rows), IMPORT_CHUNK_SIZE):
+            conn.executemany('''
+                INSERT INTO transactions 
+                (account_id, date, description, type, amount, category, note)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', insert_rows[start:start + IMPORT_CHUNK_SIZE])
+
+        conn.executemany(
+            'UPDATE accounts SET balance = balance + ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?',
+            [(delta, account_id) for account_id, delta in net_changes.items() if delta]
+        )
+        for account_id, first_date in first_dates.items():
+            recompute_balances(conn, account_id, first_date)
+        conn.commit()
 
-        except Exception as e:
-            error_records.append({
-                'index': idx,
-                'data': tx,
-                'error': str(e)
-            })
+    except Exception:
+        conn.rollback()
+        raise
 
-    conn.close()
+    finally:
+        conn.close()
 
     return {
-        'success_count': success_count,
+        'success_count': len(insert_rows),
         'error_count': len(error_records),
         'errors': error_records
     }
@@ -261,4 +690,24 @@ def transfer_between_accounts(from_account_id, to_account_id, amount,
         raise e
 
     finally:
-        conn.close()
\ No newline at end of file
+        conn.close()
+
+
+class TransactionService:
+    """
+    交易服务的对象接口，供图表服务使用，方法委托给本模块的函数
+    应用只有一个用户，user_id 参数仅为接口兼容而保留
+    """
+
+    get_transaction = staticmethod(get_transaction)
+    list_transactions = staticmethod(list_transactions)
+    get_category_totals = staticmethod(get_category_totals)
+    get_daily_totals = staticmethod(get_daily_totals)
+    get_weekday_totals = staticmethod(get_weekday_totals)
+    get_month_category_totals = staticmethod(get_month_category_totals)
+
+    def get_transactions_by_type(self, user_id, ttype, start_date=None, end_date=None):
+        """某类型在日期区间内的交易明细，日期可以是 date 对象或字符串"""
+        return list_transactions(start_date=start_date and str(start_date)[:10],
+                                 end_date=end_date and str(end_date)[:10],
+                                 transaction_type=ttype)
\ No newline at end of file
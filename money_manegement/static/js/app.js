@@ -367,7 +367,7 @@ async function loadDashboard() {
 
         // 加载最近交易
         const transactionsRes = await fetch('/api/transactions?limit=5');
-        const transactions = await transactionsRes.json();
+        const transactions = (await transactionsRes.json()).data;
         updateRecentTransactions(transactions);
 
         // 加载趋势数据
@@ -525,16 +525,25 @@ function renderAccountCard(account) {
     `;
 }
 
-// 加载交易列表
-async function loadTransactions() {
+// 交易列表下一页的游标
+let transactionsNextCursor = null;
+
+// 加载交易列表（loadMore 为 true 时按游标追加下一页）
+async function loadTransactions(loadMore = false) {
     try {
-        const res = await fetch('/api/transactions');
-        const transactions = await res.json();
+        const params = new URLSearchParams({ limit: 50 });
+        if (loadMore && transactionsNextCursor) {
+            params.set('cursor', transactionsNextCursor);
+        }
+        const res = await fetch(`/api/transactions?${params}`);
+        const result = await res.json();
+        const transactions = result.data;
+        transactionsNextCursor = result.pagination.next_cursor;
 
         const container = document.getElementById('transactions-container');
         if (!container) return;
 
-        if (transactions.length === 0) {
+        if (!loadMore && transactions.length === 0) {
             container.innerHTML = `
                 <div class="empty-state">
                     <div class="empty-state-icon">💸</div>
@@ -548,44 +557,56 @@ async function loadTransactions() {
             return;
         }
 
-        // 创建交易表格
-        container.innerHTML = `
-            <div class="table-container">
-                <table class="data-table">
-                    <thead>
-                        <tr>
-                            <th>日期</th>
-                            <th>账户</th>
-                            <th>类型</th>
-                            <th>金额</th>
-                            <th>说明</th>
-                            <th>操作</th>
-                        </tr>
-                    </thead>
-                    <tbody>
-                        ${transactions.map(tx => `
+        const rows = transactions.map(tx => `
+            <tr>
+                <td>${formatDate(tx.date)}</td>
+                <td>${tx.account_name || '-'}</td>
+                <td><span class="type-badge ${tx.type === '收入' ? 'income' : 'expense'}">${tx.type}</span></td>
+                <td class="amount ${tx.type === '收入' ? 'income' : 'expense'}">
+                    ${tx.type === '收入' ? '+' : '-'}${formatCurrency(tx.amount)}
+                </td>
+                <td>${tx.description || '-'}</td>
+                <td class="actions">
+                    <button class="btn btn-sm btn-icon btn-secondary" onclick="editTransaction(${tx.id})">
+                        <i class="bi bi-pencil"></i>
+                    </button>
+                    <button class="btn btn-sm btn-icon btn-danger" onclick="deleteTransaction(${tx.id})">
+                        <i class="bi bi-trash"></i>
+                    </button>
+                </td>
+            </tr>
+        `).join('');
+
+        if (loadMore) {
+            document.getElementById('transactions-tbody').insertAdjacentHTML('beforeend', rows);
+        } else {
+            // 创建交易表格
+            container.innerHTML = `
+                <div class="table-container">
+                    <table class="data-table">
+                        <thead>
                             <tr>
-                                <td>${formatDate(tx.date)}</td>
-                                <td>${tx.account_name || '-'}</td>
-                                <td><span class="type-badge ${tx.type === '收入' ? 'income' : 'expense'}">${tx.type}</span></td>
-                                <td class="amount ${tx.type === '收入' ? 'income' : 'expense'}">
-                                    ${tx.type === '收入' ? '+' : '-'}${formatCurrency(tx.amount)}
-                                </td>
-                                <td>${tx.description || '-'}</td>
-                                <td class="actions">
-                                    <button class="btn btn-sm btn-icon btn-secondary" onclick="editTransaction(${tx.id})">
-                                        <i class="bi bi-pencil"></i>
-                                    </button>
-                                    <button class="btn btn-sm btn-icon btn-danger" onclick="deleteTransaction(${tx.id})">
-                                        <i class="bi bi-trash"></i>
-                                    </button>
-                                </td>
+                                <th>日期</th>
+                                <th>账户</th>
+                                <th>类型</th>
+                                <th>金额</th>
+                                <th>说明</th>
+                                <th>操作</th>
                             </tr>
-                        `).join('')}
-                    </tbody>
-                </table>
-            </div>
-        `;
+                        </thead>
+                        <tbody id="transactions-tbody">${rows}</tbody>
+                    </table>
+                </div>
+                <div class="text-center mt-3">
+                    <button id="transactions-load-more" class="btn btn-secondary" onclick="loadTransactions(true)">
+                        加载更多
+                    </button>
+                </div>
+            `;
+        }
+
+        document.getElementById('transactions-load-more').style.display =
+            transactionsNextCursor ? '' : 'none';
 
     } catch (error) {
         console.error('Error loading transactions:', error);
@@ -795,7 +816,7 @@ async function showAccountDetails(accountId) {
 
         // 获取账户交易记录
         const transactionsRes = await fetch(`/api/transactions?account_id=${accountId}&limit=20`);
-        const transactions = await transactionsRes.json();
+        const transactions = (await transactionsRes.json()).data;
 
         // 显示详情模态框
         showAccountDetailModal(account, transactions);
@@ -3,8 +3,9 @@ API响应格式化工具
 提供统一的API响应格式，确保前后端数据交互的一致性
 """
 
-from flask import jsonify
-from datetime import datetime
+from flask import jsonify, request
+from datetime import datetime, timezone
+import hashlib
 
 class APIResponse:
     """API响应类，提供标准化的响应格式"""
@@ -72,28 +73,64 @@ class APIResponse:
         return jsonify(response), 200
 
     @staticmethod
-    def paginated(data, page, per_page, total, **kwargs):
+    def conditional(data, last_modified=None):
+        """
+        支持条件请求的单条记录响应
+        以响应内容的哈希作为 ETag，客户端缓存仍有效时返回 304 且不带响应体
+        :param data: 返回的数据
+        :param last_modified: 记录最后修改时间（SQLite 的 UTC 时间字符串）
+        :return: Flask响应对象
+        """
+        response = jsonify(data)
+        response.set_etag(hashlib.sha1(response.get_data()).hexdigest())
+        if last_modified:
+            response.last_modified = datetime.strptime(
+                last_modified, '%Y-%m-%d %H:%M:%S'
+            ).replace(tzinfo=timezone.utc)
+
+        # 要求浏览器每次使用缓存前都向服务器验证
+        response.cache_control.no_cache = True
+        response.cache_control.private = True
+        return response.make_conditional(request)
+
+    @staticmethod
+    def paginated(data, page=None, per_page=None, total=None, next_cursor=None,
+                  prev_cursor=None, **kwargs):
         """
         分页响应
         :param data: 当前页数据
-        :param page: 当前页码
+        :param page: 当前页码（游标分页时为空）
         :param per_page: 每页数量
-        :param total: 总数量
+        :param total: 总数量（游标分页时为空，不统计总数）
+        :param next_cursor: 下一页游标
+        :param prev_cursor: 上一页游标
         :param kwargs: 其他参数
         :return: Flask响应对象
         """
-        response = {
-            "status": "success",
-            "code": 200,
-            "data": data,
-            "pagination": {
+        if total is None:
+            # 游标分页
+            pagination = {
+                "per_page": per_page,
+                "next_cursor": next_cursor,
+                "prev_cursor": prev_cursor,
+                "has_prev": prev_cursor is not None,
+                "has_next": next_cursor is not None
+            }
+        else:
+            pagination = {
                 "page": page,
                 "per_page": per_page,
                 "total": total,
                 "pages": (total + per_page - 1) // per_page,
                 "has_prev": page > 1,
                 "has_next": page < (total + per_page - 1) // per_page
-            },
+            }
+
+        response = {
+            "status": "success",
+            "code": 200,
+            "data": data,
+            "pagination": pagination,
             "timestamp": datetime.now().isoformat()
         }
         response.update(kwargs)
@@ -0,0 +1,466 @@
+"""
+缓存组件
+CacheBackend 定义缓存后端接口，并在其上提供命中统计和 single-flight：
+同一个键的并发未命中只有一个调用方执行计算，其余等待结果
+- TTLCache: 进程内的 LRU + TTL 缓存，限制条目数和总字节数
+- SQLiteCache: 同一主机上多个进程共享的缓存，保存在单独的 SQLite 文件中
+两者都支持按标签批量失效
+"""
+
+from collections import OrderedDict
+import json
+import logging
+import pickle
+import sqlite3
+import threading
+import time
+
+# 过期条目的全量清扫间隔（秒），两次清扫之间过期条目在访问时惰性删除
+PURGE_INTERVAL = 60
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_size(value):
+    """按JSON序列化后的长度估算缓存值占用的字节数"""
+    try:
+        return len(json.dumps(value, ensure_ascii=False, default=str).encode('utf-8'))
+    except (TypeError, ValueError):
+        return 0
+
+
+class _Entry:
+    __slots__ = ('value', 'expires_at', 'size', 'tag')
+
+    def __init__(self, value, expires_at, size, tag):
+        self.value = value
+        self.expires_at = expires_at
+        self.size = size
+        self.tag = tag
+
+
+class _Flight:
+    """正在计算中的键，等待者在 event 上阻塞"""
+    __slots__ = ('event', 'value', 'error', 'tag')
+
+    def __init__(self, tag):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+        self.tag = tag
+
+
+class CacheBackend:
+    """
+    缓存后端接口
+    子类实现 _load / _save / _delete / _invalidate_tag / _clear / _storage_stats，
+    本类负责统计与进程内的 single-flight
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._flight_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.write_errors = 0
+
+    def _load(self, key):
+        """:return: (是否命中, 值)"""
+        raise NotImplementedError
+
+    def _save(self, key, value, ttl, tag):
+        raise NotImplementedError
+
+    def _delete(self, key):
+        raise NotImplementedError
+
+    def _invalidate_tag(self, tag):
+        raise NotImplementedError
+
+    def _clear(self):
+        raise NotImplementedError
+
+    def _storage_stats(self):
+        raise NotImplementedError
+
+    def get(self, key, default=None):
+        found, value = self._load(key)
+        if found:
+            self.hits += 1
+            return value
+        self.misses += 1
+        return default
+
+    def set(self, key, value, ttl=None, tag=None):
+        """
+        :param ttl: 过期秒数，默认 default_ttl
+        :param tag: 分组标签，可用 invalidate_tag() 批量删除
+        """
+        self._save(key, value, ttl, tag)
+
+    def get_or_compute(self, key, compute, ttl=None, tag=None):
+        """
+        读取缓存，未命中时调用 compute() 计算并写入
+        同一个键同时只有一个调用方执行 compute()，其他调用方等待并共享其结果或异常
+        :return: (值, 是否命中缓存)
+        """
+        found, value = self._load(key)
+        if found:
+            self.hits += 1
+            return value, True
+
+        with self._flight_lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                # 加锁后再查一次，避免与刚结束的计算擦肩而过
+                found, value = self._load(key)
+                if found:
+                    self.hits += 1
+                    return value, True
+                flight = self._flights[key] = _Flight(tag)
+            else:
+                self.waits += 1
+            self.misses += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value, False
+
+        try:
+            value = compute()
+        except BaseException as e:
+            flight.error = e
+            raise
+        else:
+            flight.value = value
+            self._save_flight(key, flight, value, ttl, tag)
+            return value, False
+        finally:
+            with self._flight_lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            flight.event.set()
+
+    def _save_flight(self, key, flight, value, ttl, tag):
+        """
+        写入计算结果；写入可能等待其他进程的锁，不持有 _flight_lock，以免阻塞其他键的读取与失效
+        写入失败只记录日志，已算出的结果照常返回
+        """
+        with self._flight_lock:
+            # 计算期间键被失效时不写入旧结果
+            if self._flights.get(key) is not flight:
+                return
+        try:
+            self._save(key, value, ttl, tag)
+        except Exception as e:
+            self.write_errors += 1
+            logger.warning("缓存写入失败 %r: %s", key, e)
+            return
+        with self._flight_lock:
+            invalidated = self._flights.get(key) is not flight
+        if invalidated:
+            # 写入期间键被失效，删除刚写入的旧结果
+            try:
+                self._delete(key)
+            except Exception as e:
+                self.write_errors += 1
+                logger.warning("缓存删除失败 %r: %s", key, e)
+
+    def delete(self, key):
+        with self._flight_lock:
+            self._flights.pop(key, None)
+        self._delete(key)
+
+    def invalidate_tag(self, tag):
+        """删除某个标签下的全部条目，返回删除的条目数"""
+        with self._flight_lock:
+            # 正在计算的同标签键完成后不再写入
+            for key in [key for key, flight in self._flights.items() if flight.tag == tag]:
+                del self._flights[key]
+        return self._invalidate_tag(tag)
+
+    def clear(self):
+        with self._flight_lock:
+            self._flights.clear()
+        self._clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        stats = {
+            'backend': type(self).__name__,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0,
+            'waits': self.waits,
+            'write_errors': self.write_errors,
+            'in_flight': len(self._flights),
+        }
+        stats.update(self._storage_stats())
+        return stats
+
+
+class TTLCache(CacheBackend):
+    """进程内带过期时间、容量上限的 LRU 缓存"""
+
+    def __init__(self, max_entries=256, max_bytes=None, default_ttl=300, sizeof=estimate_size):
+        """
+        :param max_entries: 最多保留的条目数
+        :param max_bytes: 所有条目估算字节数的上限，None 表示不限制
+        :param default_ttl: 未指定 ttl 时的过期秒数
+        :param sizeof: 估算缓存值字节数的函数，只在设置了 max_bytes 时调用
+        """
+        super().__init__()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.sizeof = sizeof
+        self._entries = OrderedDict()
+        self._tags = {}
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._last_purge = time.monotonic()
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+        if entry.tag is not None:
+            keys = self._tags.get(entry.tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[entry.tag]
+        return entry
+
+    def _load(self, key):
+        """查找未过期的条目，命中时移到 LRU 队尾"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            if entry.expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                return False, None
+            self._entries.move_to_end(key)
+            return True, entry.value
+
+    def _purge_expired(self, now):
+        expired = [key for key, entry in self._entries.items() if entry.expires_at <= now]
+        for key in expired:
+            self._remove(key)
+        self.expirations += len(expired)
+        self._last_purge = now
+
+    def _save(self, key, value, ttl, tag):
+        size = self.sizeof(value) if self.max_bytes is not None else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            # 单个值超过总上限时不缓存
+            return
+
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_purge >= PURGE_INTERVAL:
+                self._purge_expired(now)
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = _Entry(value, now + (self.default_ttl if ttl is None else ttl), size, tag)
+            self._bytes += size
+            if tag is not None:
+                self._tags.setdefault(tag, set()).add(key)
+
+            # 超出条目数或字节数时从最久未使用的一端淘汰
+            while len(self._entries) > self.max_entries or (
+                    self.max_bytes is not None and self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _delete(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def _invalidate_tag(self, tag):
+        with self._lock:
+            keys = list(self._tags.get(tag, ()))
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def _clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+            self._bytes = 0
+
+    def _storage_stats(self):
+        return {
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'max_entries': self.max_entries,
+            'max_bytes': self.max_bytes,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
+
+
+class SQLiteCache(CacheBackend):
+    """
+    同一主机上多个进程共享的缓存
+    值以 pickle 保存在单独的 SQLite 文件中（WAL，不做同步刷盘，丢失只会导致重新计算），
+    过期时间使用墙上时钟以便跨进程比较；超出容量时优先淘汰最早过期的条目，
+    读取不写库，因此淘汰顺序近似按写入时间而非访问时间
+    single-flight 只在进程内生效，不同进程可能同时计算同一个键
+    """
+
+    def __init__(self, path, namespace='default', max_entries=1024, max_bytes=None, default_ttl=300):
+        """
+        :param path: 缓存数据库文件路径
+        :param namespace: 同一文件中相互隔离的命名空间
+        """
+        super().__init__()
+        self.path = path
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.evictions = 0
+        self._local = threading.local()
+
+        conn = self._conn()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                tag TEXT,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            ) WITHOUT ROWID
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_cache_entries_tag ON cache_entries(namespace, tag)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_cache_entries_expires ON cache_entries(namespace, expires_at)')
+
+    def _conn(self):
+        """每个线程一个自动提交的连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _encode_key(key):
+        # 缓存键由字符串、数字、布尔值和 None 组成的元组构成，repr 在各进程间一致
+        return repr(key)
+
+    def _load(self, key):
+        row = self._conn().execute(
+            'SELECT value FROM cache_entries WHERE namespace = ? AND key = ? AND expires_at > ?',
+            (self.namespace, self._encode_key(key), time.time())
+        ).fetchone()
+        if row is None:
+            return False, None
+        try:
+            return True, pickle.loads(row[0])
+        except Exception:
+            return False, None
+
+    def _save(self, key, value, ttl, tag):
+        try:
+            blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            return
+        if self.max_bytes is not None and len(blob) > self.max_bytes:
+            return
+
+        now = time.time()
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('''
+                INSERT OR REPLACE INTO cache_entries (namespace, key, tag, value, size, expires_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (self.namespace, self._encode_key(key), tag, blob, len(blob),
+                  now + (self.default_ttl if ttl is None else ttl)))
+            conn.execute('DELETE FROM cache_entries WHERE namespace = ? AND expires_at <= ?',
+                         (self.namespace, now))
+
+            count, total = conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries WHERE namespace = ?',
+                (self.namespace,)
+            ).fetchone()
+            excess = 0
+            if count > self.max_entries or (self.max_bytes is not None and total > self.max_bytes):
+                # 按过期时间从早到晚累计，直到条目数和字节数都回到上限以内
+                for (size,) in conn.execute(
+                        'SELECT size FROM cache_entries WHERE namespace = ? ORDER BY expires_at',
+                        (self.namespace,)):
+                    if count - excess <= self.max_entries and (
+                            self.max_bytes is None or total <= self.max_bytes):
+                        break
+                    total -= size
+                    excess += 1
+            if excess > 0:
+                conn.execute('''
+                    DELETE FROM cache_entries WHERE namespace = ? AND key IN (
+                        SELECT key FROM cache_entries WHERE namespace = ? ORDER BY expires_at LIMIT ?
+                    )
+                ''', (self.namespace, self.namespace, excess))
+                self.evictions += excess
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def _delete(self, key):
+        self._conn().execute('DELETE FROM cache_entries WHERE namespace = ? AND key = ?',
+                             (self.namespace, self._encode_key(key)))
+
+    def _invalidate_tag(self, tag):
+        return self._conn().execute('DELETE FROM cache_entries WHERE namespace = ? AND tag = ?',
+                                    (self.namespace, tag)).rowcount
+
+    def _clear(self):
+        self._conn().execute('DELETE FROM cache_entries WHERE namespace = ?', (self.namespace,))
+
+    def _storage_stats(self):
+        count, total = self._conn().execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries WHERE namespace = ? AND expires_at > ?',
+            (self.namespace, time.time())
+        ).fetchone()
+        return {
+            'entries': count,
+            'bytes': total,
+            'max_entries': self.max_entries,
+            'max_bytes': self.max_bytes,
+            'evictions': self.evictions,
+            'path': self.path,
+        }
+
+
+def create_cache(backend='memory', path=None, namespace='default', **options):
+    """
+    按名称创建缓存后端
+    :param backend: memory（进程内）或 sqlite（同一主机多进程共享，需要 path）
+    :param options: max_entries / max_bytes / default_ttl
+    """
+    if backend == 'memory':
+        return TTLCache(**options)
+    if backend == 'sqlite':
+        if not path:
+            raise ValueError("sqlite 缓存后端需要指定文件路径")
+        return SQLiteCache(path, namespace, **options)
+    raise ValueError(f"不支持的缓存后端: {backend}")
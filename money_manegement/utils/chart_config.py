@@ -1,8 +1,80 @@
 """
 图表配置映射
-定义图表类型与数据处理方法的映射关系
+定义图表类型与数据处理方法的映射关系，以及各图表参数的类型、默认值和取值范围
 """
 
+from datetime import datetime
+
+from utils.downsample import RESOLUTIONS
+
+
+def boolean(value):
+    """true/false/1/0 转为布尔值"""
+    lowered = str(value).lower()
+    if lowered in ('true', '1'):
+        return True
+    if lowered in ('false', '0'):
+        return False
+    raise ValueError(value)
+
+
+def year_month(value):
+    """校验 YYYY-MM 格式的月份"""
+    datetime.strptime(value, '%Y-%m')
+    return value
+
+
+# 参数类型在错误信息与接口说明中的名称
+TYPE_NAMES = {int: 'integer', float: 'number', str: 'string', boolean: 'boolean', year_month: 'month'}
+
+
+class Param:
+    """图表参数定义：类型转换函数、默认值与取值范围"""
+
+    def __init__(self, converter=str, default=None, choices=None, minimum=None, maximum=None):
+        """
+        :param converter: 把查询字符串转为参数值的函数，如 int、boolean、year_month
+        :param default: 默认值，None 表示由服务方法或运行时决定
+        """
+        self.converter = converter
+        self.default = default
+        self.choices = tuple(choices) if choices is not None else None
+        self.minimum = minimum
+        self.maximum = maximum
+
+    @property
+    def type_name(self):
+        return TYPE_NAMES.get(self.converter, getattr(self.converter, '__name__', str(self.converter)))
+
+    def validate(self, name, value):
+        """检查取值范围，不合法时抛出 ValueError"""
+        if self.choices is not None and value not in self.choices:
+            raise ValueError(f"参数 {name} 只能取 {', '.join(map(str, self.choices))}: {value}")
+        if self.minimum is not None and value < self.minimum:
+            raise ValueError(f"参数 {name} 不能小于 {self.minimum}: {value}")
+        if self.maximum is not None and value > self.maximum:
+            raise ValueError(f"参数 {name} 不能大于 {self.maximum}: {value}")
+        return value
+
+    def parse(self, name, raw):
+        """把查询字符串转为参数值并校验"""
+        try:
+            value = self.converter(raw)
+        except (TypeError, ValueError):
+            raise ValueError(f"参数 {name} 应为 {self.type_name}: {raw}")
+        return self.validate(name, value)
+
+    def describe(self):
+        info = {'type': self.type_name, 'default': self.default}
+        if self.choices is not None:
+            info['choices'] = list(self.choices)
+        if self.minimum is not None:
+            info['min'] = self.minimum
+        if self.maximum is not None:
+            info['max'] = self.maximum
+        return info
+
+
 class ChartConfig:
     """图表配置类，管理所有图表类型的配置信息"""
 
@@ -23,67 +95,82 @@ class ChartConfig:
         'expense-distribution': {
             'type': 'pie',
             'service_method': 'get_expense_distribution',
-            'default_params': {
-                'period': 'month',
-                'category_type': 'all'
+            'params': {
+                'period': Param(str, 'month', choices=('week', 'month', 'year')),
+                'category_type': Param(str, 'all', choices=('all', '流动资产', '投资资产', '固定资产', '其他资产'))
             },
+            'depends_on': ('accounts', 'categories', 'transactions'),
             'cache_duration': 300  # 5分钟缓存
         },
         'income-trend': {
             'type': 'line',
             'service_method': 'get_income_trend',
-            'default_params': {
-                'days': 30,
-                'include_forecast': False
+            'params': {
+                'days': Param(int, 30, minimum=1, maximum=3650),
+                'include_forecast': Param(boolean, False),
+                'resolution': Param(str, 'auto', choices=RESOLUTIONS)
             },
+            'depends_on': ('transactions',),
             'cache_duration': 600
         },
         'asset-allocation': {
             'type': 'donut',
             'service_method': 'get_asset_allocation',
-            'default_params': {},
+            'params': {},
+            'depends_on': ('accounts', 'categories'),
             'cache_duration': 3600  # 1小时缓存
         },
         'cash-flow': {
             'type': 'sankey',
             'service_method': 'get_cash_flow',
-            'default_params': {
-                'month': None  # 将在运行时设置为当前月份
+            'params': {
+                'month': Param(year_month, None)  # 将在运行时设置为当前月份
             },
+            'depends_on': ('transactions',),
             'cache_duration': 1800
         },
         'monthly-comparison': {
             'type': 'bar',
             'service_method': 'get_monthly_comparison',
-            'default_params': {
-                'months': 6
+            'params': {
+                'months': Param(int, 6, minimum=1, maximum=120)
             },
+            'depends_on': ('transactions',),
             'cache_duration': 3600
         },
         'financial-health': {
             'type': 'radar',
             'service_method': 'get_financial_health',
-            'default_params': {},
+            'params': {},
+            'depends_on': ('accounts', 'categories', 'transactions'),
             'cache_duration': 3600
         },
         'spending-heatmap': {
             'type': 'heatmap',
             'service_method': 'get_spending_heatmap',
-            'default_params': {
-                'weeks': 12
+            'params': {
+                'weeks': Param(int, 12, minimum=1, maximum=104)
             },
+            'depends_on': ('transactions',),
             'cache_duration': 1800
         },
         'savings-goal': {
             'type': 'gauge',
             'service_method': 'get_savings_goal_progress',
-            'default_params': {
-                'goal_id': None
+            'params': {
+                'goal_id': Param(int, None, minimum=1)
             },
+            'depends_on': ('accounts', 'transactions'),
             'cache_duration': 600
         }
     }
 
+    @classmethod
+    def get_dependencies(cls, chart_name):
+        """图表读取的数据表，这些表的版本号参与缓存键"""
+        config = cls.get_config(chart_name)
+        return config.get('depends_on', ()) if config else ()
+
     @classmethod
     def get_config(cls, chart_name):
         """获取图表配置"""
@@ -107,7 +194,8 @@ class ChartConfig:
             return {
                 'name': chart_name,
                 'type': config['type'],
-                'parameters': list(config['default_params'].keys()),
+                'parameters': {name: param.describe() for name, param in config['params'].items()},
+                'depends_on': list(config.get('depends_on', ())),
                 'cache_duration': config['cache_duration']
             }
         return None
\ No newline at end of file
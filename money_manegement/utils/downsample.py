@@ -0,0 +1,120 @@
+"""
+时间序列降采样
+长区间的按天序列先按分辨率聚合到周/月，仍超过点数上限时用
+Largest-Triangle-Three-Buckets (LTTB) 选点，保留峰谷形状的同时限制返回的点数
+"""
+
+import numpy as np
+
+# 响应中单个序列最多返回的点数
+MAX_POINTS = 500
+
+# auto: 按天取点，超过上限时 LTTB 降采样；day: 按天返回全部点；week/month: 按自然周/月聚合
+RESOLUTIONS = ('auto', 'day', 'week', 'month')
+
+EPOCH = np.datetime64('1970-01-01', 'D')
+
+
+def validate_resolution(resolution):
+    """校验分辨率参数，None 视为 auto"""
+    resolution = resolution or 'auto'
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"不支持的分辨率: {resolution}，可选 {', '.join(RESOLUTIONS)}")
+    return resolution
+
+
+def lttb(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets 选点
+    首尾点固定保留，中间的点均分为 threshold-2 个桶，每个桶选出与上一个选中点、
+    下一个桶均值构成的三角形面积最大的点；桶内面积一次向量化算出，只按桶循环
+    :param x: 升序的横坐标
+    :return: 选中点的下标数组（升序）
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # 桶边界：第 i 个桶为 [edges[i], edges[i+1])，每个桶至少一个点
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+
+    # 各桶均值，最后一个桶之后以末点作为下一个桶
+    sum_x = np.concatenate(([0.0], np.cumsum(x)))
+    sum_y = np.concatenate(([0.0], np.cumsum(y)))
+    sizes = edges[1:] - edges[:-1]
+    next_x = np.append((sum_x[edges[2:]] - sum_x[edges[1:-1]]) / sizes[1:], x[-1])
+    next_y = np.append((sum_y[edges[2:]] - sum_y[edges[1:-1]]) / sizes[1:], y[-1])
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        areas = np.abs((x[a] - next_x[i]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (next_y[i] - y[a]))
+        a = lo + int(np.argmax(areas))
+        selected[i + 1] = a
+    return selected
+
+
+def _period_starts(days, resolution):
+    """日期所属周（周一）或月的第一天"""
+    if resolution == 'week':
+        # 1970-01-01 是周四，(序数 + 3) % 7 为距周一的天数
+        return days - (((days - EPOCH).astype(np.int64) + 3) % 7).astype('timedelta64[D]')
+    return days.astype('datetime64[M]').astype('datetime64[D]')
+
+
+def aggregate(dates, columns, resolution, how='sum'):
+    """
+    把按天的序列聚合到周或月
+    :param dates: 升序的 YYYY-MM-DD 列表
+    :param columns: {字段: 与 dates 等长的数值序列}
+    :param how: sum 适用于收支等流量，last 取周期内最后一天，适用于余额等存量
+    :return: (周期标签列表, {字段: 数组})；周标签为周一的日期，月标签为 YYYY-MM
+    """
+    days = np.array(dates, dtype='datetime64[D]')
+    if not len(days):
+        return [], {name: np.array([]) for name in columns}
+
+    periods = _period_starts(days, resolution)
+    starts = np.flatnonzero(np.concatenate(([True], periods[1:] != periods[:-1])))
+    if how == 'sum':
+        values = {name: np.add.reduceat(np.asarray(column, dtype=np.float64), starts)
+                  for name, column in columns.items()}
+    else:
+        ends = np.append(starts[1:] - 1, len(days) - 1)
+        values = {name: np.asarray(column, dtype=np.float64)[ends] for name, column in columns.items()}
+
+    labels = periods[starts]
+    if resolution == 'month':
+        labels = labels.astype('datetime64[M]')
+    return labels.astype(str).tolist(), values
+
+
+def downsample_series(dates, columns, resolution='auto', how='sum', key=None, max_points=MAX_POINTS):
+    """
+    按分辨率聚合并限制点数
+    :param dates: 升序的 YYYY-MM-DD 列表
+    :param columns: {字段: 数值序列}，所有字段选取相同的点
+    :param how: 聚合到周/月时的方式，见 aggregate()
+    :param key: LTTB 选点依据的字段，默认第一个字段
+    :return: (日期或周期标签列表, {字段: list})
+    """
+    resolution = validate_resolution(resolution)
+    if resolution in ('week', 'month'):
+        dates, values = aggregate(dates, columns, resolution, how)
+        x = np.array(dates, dtype='datetime64[D]' if resolution == 'week' else 'datetime64[M]').astype(np.int64)
+    else:
+        values = {name: np.asarray(column, dtype=np.float64) for name, column in columns.items()}
+        x = (np.array(dates, dtype='datetime64[D]') - EPOCH).astype(np.int64)
+
+    if resolution != 'day' and len(dates) > max_points and values:
+        y = values[key if key is not None else next(iter(values))]
+        index = lttb(x, y, max_points)
+        dates = [dates[i] for i in index.tolist()]
+        values = {name: column[index] for name, column in values.items()}
+
+    return dates, {name: np.asarray(column).tolist() for name, column in values.items()}
@@ -0,0 +1,62 @@
+"""
+进程锁
+多个工作进程（gunicorn 等）或调试模式的重载器各自导入应用时，
+后台任务只应在其中一个进程中运行；锁文件由操作系统在进程退出时自动释放，
+持有锁的进程崩溃后下一个启动的进程即可接手
+"""
+
+import os
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class ProcessLock:
+    """非阻塞的独占文件锁，取得后在进程生命周期内一直持有"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    @property
+    def held(self):
+        return self._file is not None
+
+    def acquire(self):
+        """尝试取得锁，已被其他进程持有时立即返回 False"""
+        if self._file is not None:
+            return True
+        f = open(self.path, 'a+')
+        try:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            f.close()
+            return False
+
+        # 记录持有锁的进程，便于排查
+        f.seek(0)
+        f.truncate()
+        f.write(str(os.getpid()))
+        f.flush()
+        self._file = f
+        return True
+
+    def release(self):
+        if self._file is None:
+            return
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            else:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self._file.close()
+            self._file = None